@@ -1,15 +1,12 @@
 import io
-import json
 import os
 import secrets
 import shutil
 import sys
-from collections import defaultdict
 from datetime import datetime
 from functools import wraps
 from urllib.parse import urljoin, urlparse
 
-import numpy as np
 from flask import (
     abort,
     Flask,
@@ -27,13 +24,62 @@ from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from werkzeug.utils import secure_filename
 
+import metrics
+from job_profiler import profile_job, profiling_requested
+from face_detection import (
+    DEFAULT_DET_SIZE,
+    DET_SIZE_STEP,
+    MAX_DET_SIZE,
+    MIN_DET_SIZE,
+    DetectionSettings,
+)
+from event_clustering import CLUSTER_MODES
+from face_cache_loader import load_face_cache
+from face_pack import SPRITE_TILE_PX, sprite_key, sprite_layout
+from face_quality import QualitySettings
+from inference_scheduler import InferenceScheduler, parse_limits
 from photo_processor import PhotoProcessor
+from photo_sources import (
+    is_photo_source,
+    open_photo,
+    photo_name,
+    photo_stat,
+    source_root,
+    split_archive_path,
+)
 
 
 app = Flask(__name__)
 
 # --- CONFIGURATION ---
 OUTPUT_DIR = "output_albums"
+# Content-addressed crops never change, so browsers may keep them for a year.
+FACE_CROP_MAX_AGE = 365 * 24 * 60 * 60
+# Face ids are reused across runs; originals are always revalidated via ETag.
+ORIGINAL_PHOTO_MAX_AGE = 0
+CLUSTER_PAGE_DEFAULT_LIMIT = 30
+CLUSTER_PAGE_MAX_LIMIT = 200
+FACE_PAGE_DEFAULT_LIMIT = 200
+FACE_PAGE_MAX_LIMIT = 1000
+SUGGESTED_MERGES_LIMIT = 20
+SUGGESTED_OUTLIERS_LIMIT = 50
+# Optional Unix socket of a shared inference worker (see inference_worker.py).
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET")
+# Model pack name or directory, e.g. an INT8 pack built by model_quantization.py.
+INSIGHTFACE_MODEL = os.environ.get("INSIGHTFACE_MODEL")
+# Total disk budget for all per-folder face caches; least recently used
+# folders are evicted beyond it. Unlimited when unset.
+CACHE_BUDGET_MB = float(os.environ["CACHE_BUDGET_MB"]) if os.environ.get("CACHE_BUDGET_MB") else None
+RECENT_LIBRARIES_LIMIT = 10
+# Faces embedded per recognition call across images during extraction; 0
+# keeps one call per face.
+RECOGNITION_BATCH = int(os.environ.get("RECOGNITION_BATCH") or 0)
+# How person search scans cached embeddings: exact, ivf-sq8 or ivf-pq.
+EMBEDDING_INDEX = os.environ.get("EMBEDDING_INDEX") or "exact"
+# Concurrent inference calls, and per-class caps such as "interactive=2,bulk=1"
+# (see inference_scheduler.py). Default: one slot per CPU for either class.
+INFERENCE_SLOTS = int(os.environ["INFERENCE_SLOTS"]) if os.environ.get("INFERENCE_SLOTS") else None
+INFERENCE_LIMITS = parse_limits(os.environ.get("INFERENCE_LIMITS"))
 app.secret_key = os.environ.get("FLASK_SECRET_KEY") or os.urandom(24)
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
@@ -88,27 +134,10 @@ def _is_safe_redirect(target: str) -> bool:
     return urlparse(redirect_url).netloc == urlparse(host_url).netloc
 
 
-def _parse_iso_timestamp(value: str):
-    """Parse ISO strings generated by the processor into datetime objects."""
-    if not value:
-        return None
-    try:
-        normalized = value.replace("Z", "+00:00")
-        return datetime.fromisoformat(normalized)
-    except ValueError:
-        return None
-
-
-def _format_day_label(dt: datetime):
-    return dt.strftime("%B %d, %Y")
-
-
-def _format_time_label(dt: datetime):
-    return dt.strftime("%H:%M:%S")
-
-
-def _allowed_photo_roots(faces_data):
-    roots = {os.path.dirname(os.path.abspath(face["original_path"])) for face in faces_data if face.get("original_path")}
+def _allowed_photo_roots(faces):
+    roots = {
+        os.path.dirname(os.path.abspath(source_root(path))) for path in faces.photo_paths if path
+    }
     roots.add(os.path.abspath(OUTPUT_DIR))
     return roots
 
@@ -137,6 +166,56 @@ def _parse_cluster_parameters(eps_raw: str, min_samples_raw: str):
     return eps_value, min_samples_value, None
 
 
+def _parse_cluster_mode(mode_raw: str):
+    """Validate the clustering mode choice from string form."""
+    mode = mode_raw or "global"
+    if mode not in CLUSTER_MODES:
+        return None, f"Error: Clustering mode must be one of {', '.join(CLUSTER_MODES)}."
+    return mode, None
+
+
+def _parse_detection_parameters(mode_raw: str, det_size_raw: str):
+    """Validate detector settings from string form."""
+    det_size = DEFAULT_DET_SIZE
+    if det_size_raw:
+        try:
+            det_size = int(det_size_raw)
+        except ValueError:
+            return None, "Error: Detector size must be an integer."
+    try:
+        return DetectionSettings(mode=mode_raw or "fixed", det_size=det_size), None
+    except ValueError as exc:
+        return None, f"Error: {exc}"
+
+
+def _parse_quality_parameters(mode_raw: str, keep_rejected_flag):
+    """Validate the face quality gate choice from string form."""
+    try:
+        return (
+            QualitySettings.for_mode(
+                mode_raw or "standard", keep_rejected=bool(keep_rejected_flag)
+            ),
+            None,
+        )
+    except ValueError as exc:
+        return None, f"Error: {exc}"
+
+
+def _index_defaults():
+    return {
+        "default_eps": PhotoProcessor.DEFAULT_CLUSTER_EPS,
+        "default_min_samples": PhotoProcessor.DEFAULT_CLUSTER_MIN_SAMPLES,
+        "default_det_size": DEFAULT_DET_SIZE,
+        "min_det_size": MIN_DET_SIZE,
+        "max_det_size": MAX_DET_SIZE,
+        "det_size_step": DET_SIZE_STEP,
+        "recent_libraries": [
+            entry["source_path"]
+            for entry in processor.libraries.list()[:RECENT_LIBRARIES_LIMIT]
+        ],
+    }
+
+
 def _resolve_output_directory(desired_name: str):
     """Determine a unique directory under OUTPUT_DIR for album export."""
     sanitized = "".join(
@@ -154,6 +233,24 @@ def _resolve_output_directory(desired_name: str):
     return os.path.join(OUTPUT_DIR, candidate), candidate
 
 
+def _parse_page_args(default_limit: int, max_limit: int):
+    """Read cursor/limit query parameters for paginated JSON endpoints."""
+    cursor_raw = request.args.get("cursor") or "0"
+    limit_raw = request.args.get("limit") or str(default_limit)
+    try:
+        offset = int(cursor_raw)
+        limit = int(limit_raw)
+    except ValueError:
+        return None, None, "cursor and limit must be integers."
+    if offset < 0 or limit < 1:
+        return None, None, "cursor must be >= 0 and limit must be >= 1."
+    return offset, min(limit, max_limit), None
+
+
+def _next_cursor(offset: int, limit: int, total: int):
+    return str(offset + limit) if offset + limit < total else None
+
+
 def login_required(view=None, *, json_response=False):
     """Gate access to authenticated users, returning JSON when requested."""
 
@@ -193,22 +290,33 @@ def inject_user():
 
 
 # --- INITIALIZATION ---
-print("Loading InsightFace model, this may take a moment...")
-# Pass the output directory to the processor so it knows where to create the .cache
-processor = PhotoProcessor(output_path_base=OUTPUT_DIR)
-print("Model loaded successfully.")
+# Pass the output directory to the processor so it knows where to create the .cache.
+# The InsightFace model loads lazily on the first request that needs inference;
+# set PHOTO_PROCESSOR_WARMUP=1 to load it in the background right away instead.
+processor = PhotoProcessor(
+    output_path_base=OUTPUT_DIR,
+    inference_address=INFERENCE_SOCKET,
+    model=INSIGHTFACE_MODEL,
+    cache_budget_mb=CACHE_BUDGET_MB,
+    recognition_batch=RECOGNITION_BATCH,
+    embedding_index=EMBEDDING_INDEX,
+    scheduler=InferenceScheduler(INFERENCE_SLOTS, INFERENCE_LIMITS),
+)
+if os.environ.get("PHOTO_PROCESSOR_WARMUP", "").lower() in ("1", "true", "yes"):
+    processor.warm_up(background=True)
+
+
+@app.before_request
+def _follow_active_library():
+    """Another worker may have switched folders; read from the same cache."""
+    processor.sync_active_library()
 
 
 # --- ROUTES ---
 @app.route("/")
 def index():
     """Serves the main page where the user provides the input folder."""
-    return render_template(
-        "index.html",
-        form_values={},
-        default_eps=PhotoProcessor.DEFAULT_CLUSTER_EPS,
-        default_min_samples=PhotoProcessor.DEFAULT_CLUSTER_MIN_SAMPLES,
-    )
+    return render_template("index.html", form_values={}, **_index_defaults())
 
 
 @app.route("/search")
@@ -223,13 +331,15 @@ def run_search():
     sample_files = request.files.getlist("sample_files")
     search_path = request.form.get("search_path")
     album_name = request.form.get("album_name")
+    profile_enabled = profiling_requested(request.form.get("profile"))
+    rescan = request.form.get("rescan") == "1"
 
     if not all([sample_files, search_path, album_name]):
         return render_template(
             "search.html", status_message="Error: All fields are required."
         )
 
-    if not os.path.isdir(search_path):
+    if not is_photo_source(search_path):
         return render_template(
             "search.html", status_message=f"Error: Search directory not found."
         )
@@ -255,7 +365,13 @@ def run_search():
     sys.stdout = captured_output = io.StringIO()
 
     try:
-        processor.search_for_person(sample_paths, search_path, album_name)
+        with metrics.track_job("search"), profile_job(
+            "run_search",
+            processor.profiles_path,
+            enabled=profile_enabled,
+            details={"search_path": search_path, "samples": len(sample_paths)},
+        ):
+            processor.search_for_person(sample_paths, search_path, album_name, rescan=rescan)
         status_message = captured_output.getvalue()
     except Exception as e:  # pylint: disable=broad-except
         status_message = f"An unexpected error occurred: {e}\n"
@@ -276,22 +392,40 @@ def process():
     folder_path = request.form.get("folder_path")
     eps_raw = (request.form.get("eps") or "").strip()
     min_samples_raw = (request.form.get("min_samples") or "").strip()
+    cluster_mode_raw = (request.form.get("cluster_mode") or "").strip()
+    detection_mode_raw = (request.form.get("detection_mode") or "").strip()
+    det_size_raw = (request.form.get("det_size") or "").strip()
+    quality_mode_raw = (request.form.get("quality_mode") or "").strip()
+    keep_rejected_flag = request.form.get("keep_rejected")
+    profile_flag = request.form.get("profile")
 
     form_values = {
         "folder_path": folder_path or "",
         "eps": eps_raw,
         "min_samples": min_samples_raw,
+        "cluster_mode": cluster_mode_raw,
+        "detection_mode": detection_mode_raw,
+        "det_size": det_size_raw,
+        "quality_mode": quality_mode_raw,
+        "keep_rejected": keep_rejected_flag,
+        "profile": profile_flag,
     }
 
-    default_context = {
-        "form_values": form_values,
-        "default_eps": PhotoProcessor.DEFAULT_CLUSTER_EPS,
-        "default_min_samples": PhotoProcessor.DEFAULT_CLUSTER_MIN_SAMPLES,
-    }
+    default_context = {"form_values": form_values, **_index_defaults()}
 
     eps_value, min_samples_value, param_error = _parse_cluster_parameters(
         eps_raw, min_samples_raw
     )
+    if not param_error:
+        cluster_mode, param_error = _parse_cluster_mode(cluster_mode_raw)
+    if not param_error:
+        detection, param_error = _parse_detection_parameters(
+            detection_mode_raw, det_size_raw
+        )
+    if not param_error:
+        quality, param_error = _parse_quality_parameters(
+            quality_mode_raw, keep_rejected_flag
+        )
     if param_error:
         return render_template(
             "index.html",
@@ -299,14 +433,40 @@ def process():
             **default_context,
         )
 
-    if not folder_path or not os.path.isdir(folder_path):
+    if not is_photo_source(folder_path):
         return render_template(
             "index.html",
             status_message="Error: Invalid folder path.",
             **default_context,
         )
 
-    all_faces = processor.extract_faces(folder_path)
+    with profile_job(
+        "process",
+        processor.profiles_path,
+        enabled=profiling_requested(profile_flag),
+        details={
+            "folder_path": folder_path,
+            "eps": eps_value,
+            "min_samples": min_samples_value,
+            "cluster_mode": cluster_mode,
+            "detection": detection.describe(),
+            "quality": quality.describe(),
+        },
+    ):
+        # Pinned for the whole job: other requests may switch the active
+        # library, and other jobs' budget checks must not evict this one.
+        with processor.library_job(folder_path) as library:
+            all_faces = processor.extract_faces(
+                folder_path, detection=detection, quality=quality, library=library
+            )
+            if all_faces:
+                labels = processor.cluster_faces(
+                    all_faces, eps=eps_value, min_samples=min_samples_value, mode=cluster_mode
+                )
+                cluster_data = processor.generate_cluster_ui_data(
+                    all_faces, labels, library=library
+                )
+
     if not all_faces:
         return render_template(
             "index.html",
@@ -314,12 +474,176 @@ def process():
             **default_context,
         )
 
-    labels = processor.cluster_faces(
-        all_faces, eps=eps_value, min_samples=min_samples_value
+    return render_template(
+        "gallery.html",
+        cluster_count=len(cluster_data),
+        face_count=len(all_faces),
+        cluster_page_limit=CLUSTER_PAGE_DEFAULT_LIMIT,
+        face_page_limit=FACE_PAGE_DEFAULT_LIMIT,
+    )
+
+
+@app.route("/api/clusters")
+def api_clusters():
+    """Return one cursor-paginated page of cluster summaries for the gallery."""
+    offset, limit, error = _parse_page_args(
+        CLUSTER_PAGE_DEFAULT_LIMIT, CLUSTER_PAGE_MAX_LIMIT
+    )
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+
+    assignments = processor.load_cluster_assignments()
+    page = assignments[offset : offset + limit]
+    return jsonify(
+        {
+            "clusters": [
+                {
+                    "cluster_id": item["cluster_id"],
+                    "name": item.get("name") or f"Person {item['cluster_id'] + 1}",
+                    "face_count": len(item.get("face_ids", [])),
+                    "timeline_url": url_for(
+                        "timeline_detail", cluster_id=item["cluster_id"]
+                    ),
+                }
+                for item in page
+            ],
+            "next_cursor": _next_cursor(offset, limit, len(assignments)),
+            "total": len(assignments),
+        }
+    )
+
+
+def _cluster_face_page(cluster_id: int):
+    """
+    Resolve the cursor/limit page of a cluster's faces.
+
+    Returns ``(faces, offset, limit, total, error_response)``; the faces
+    endpoint and the page's sprite sheet share it so their tiles line up.
+    """
+    offset, limit, error = _parse_page_args(
+        FACE_PAGE_DEFAULT_LIMIT, FACE_PAGE_MAX_LIMIT
+    )
+    if error:
+        return None, offset, limit, 0, (
+            jsonify({"status": "error", "message": error}),
+            400,
+        )
+
+    assignments = processor.load_cluster_assignments()
+    cluster = next(
+        (item for item in assignments if item.get("cluster_id") == cluster_id), None
     )
-    cluster_data = processor.generate_cluster_ui_data(all_faces, labels)
+    if not cluster:
+        return None, offset, limit, 0, (
+            jsonify({"status": "error", "message": "Cluster not found."}),
+            404,
+        )
+
+    face_lookup = processor.get_face_lookup()
+    face_ids = cluster.get("face_ids", [])
+    faces = [
+        face_lookup[face_id]
+        for face_id in face_ids[offset : offset + limit]
+        if face_id in face_lookup
+    ]
+    return faces, offset, limit, len(face_ids), None
+
+
+@app.route("/api/clusters/suggestions")
+def api_cluster_suggestions():
+    """
+    Ranked merge candidates and likely outlier faces for the review gallery,
+    optionally limited to one ``cluster_id``.
+    """
+    cluster_id = request.args.get("cluster_id")
+    if cluster_id is not None:
+        try:
+            cluster_id = int(cluster_id)
+        except ValueError:
+            return jsonify({"status": "error", "message": "cluster_id must be an integer."}), 400
+
+    suggestions = processor.cluster_suggestions(
+        SUGGESTED_MERGES_LIMIT, SUGGESTED_OUTLIERS_LIMIT, cluster_id
+    )
+    face_lookup = processor.get_face_lookup()
+    for face in suggestions["outliers"]:
+        row = face_lookup.get(face["face_id"])
+        face["face_image_url"] = row["face_image_url"] if row else None
+    return jsonify(suggestions)
+
+
+@app.route("/api/clusters/<int(signed=True):cluster_id>/faces")
+def api_cluster_faces(cluster_id):
+    """Return one cursor-paginated page of faces assigned to a cluster."""
+    faces, offset, limit, total, error_response = _cluster_face_page(cluster_id)
+    if error_response:
+        return error_response
+
+    sprite = None
+    if faces:
+        columns, rows = sprite_layout(len(faces))
+        key = sprite_key(
+            [
+                os.path.basename(face.get("face_image_path") or face["face_image_url"])
+                for face in faces
+            ]
+        )
+        sprite = {
+            "url": url_for(
+                "api_cluster_sprite",
+                cluster_id=cluster_id,
+                cursor=str(offset),
+                limit=limit,
+                v=key,
+            ),
+            "columns": columns,
+            "rows": rows,
+            "tile": SPRITE_TILE_PX,
+        }
+
+    return jsonify(
+        {
+            "cluster_id": cluster_id,
+            "faces": [
+                {
+                    "face_id": face["face_id"],
+                    "face_image_url": face["face_image_url"],
+                    "sprite_index": index,
+                }
+                for index, face in enumerate(faces)
+            ],
+            "sprite": sprite,
+            "next_cursor": _next_cursor(offset, limit, total),
+            "total": total,
+        }
+    )
+
+
+@app.route("/api/clusters/<int(signed=True):cluster_id>/sprite.jpg")
+def api_cluster_sprite(cluster_id):
+    """
+    Serve one page of a cluster's faces as a single sprite sheet, tiled in
+    the order of the matching ``/faces`` page.
+    """
+    faces, _offset, _limit, _total, error_response = _cluster_face_page(cluster_id)
+    if error_response:
+        return error_response
+    if not faces:
+        abort(404)
 
-    return render_template("gallery.html", clusters=cluster_data)
+    key, sprite_path = processor.cluster_sprite(faces)
+    # A versioned URL always names the same sheet; an unversioned one follows
+    # the cluster's current faces.
+    versioned = request.args.get("v") == key
+    response = send_file(
+        os.path.abspath(sprite_path),
+        mimetype="image/jpeg",
+        conditional=True,
+        etag=key,
+        max_age=FACE_CROP_MAX_AGE if versioned else 0,
+    )
+    response.cache_control.immutable = versioned or None
+    return response
 
 
 @app.route("/reuse_faces")
@@ -338,11 +662,26 @@ def reuse_faces():
 @app.route("/run_reuse_faces", methods=["POST"])
 def run_reuse_faces():
     """Process cached faces to build grouped albums without re-running detection."""
+    with profile_job(
+        "run_reuse_faces",
+        processor.profiles_path,
+        enabled=profiling_requested(request.form.get("profile")),
+        details={
+            "photos_path": request.form.get("photos_path"),
+            "faces_path": request.form.get("faces_path"),
+        },
+    ):
+        return _run_reuse_faces()
+
+
+def _run_reuse_faces():
     photos_path = request.form.get("photos_path")
     faces_path = request.form.get("faces_path")
     output_name_raw = (request.form.get("output_name") or "").strip()
     eps_raw = (request.form.get("eps") or "").strip()
     min_samples_raw = (request.form.get("min_samples") or "").strip()
+    cluster_mode_raw = (request.form.get("cluster_mode") or "").strip()
+    profile_flag = request.form.get("profile")
 
     form_values = {
         "photos_path": photos_path or "",
@@ -350,6 +689,8 @@ def run_reuse_faces():
         "output_name": output_name_raw,
         "eps": eps_raw,
         "min_samples": min_samples_raw,
+        "cluster_mode": cluster_mode_raw,
+        "profile": profile_flag,
     }
     context = {
         "form_values": form_values,
@@ -360,6 +701,8 @@ def run_reuse_faces():
     eps_value, min_samples_value, param_error = _parse_cluster_parameters(
         eps_raw, min_samples_raw
     )
+    if not param_error:
+        cluster_mode, param_error = _parse_cluster_mode(cluster_mode_raw)
     if param_error:
         return render_template(
             "reuse_faces.html",
@@ -368,7 +711,7 @@ def run_reuse_faces():
             **context,
         )
 
-    if not photos_path or not os.path.isdir(photos_path):
+    if not is_photo_source(photos_path):
         return render_template(
             "reuse_faces.html",
             status_message="Error: Original photo folder not found.",
@@ -394,111 +737,39 @@ def run_reuse_faces():
         )
 
     try:
-        with open(faces_cache_file, "r") as cache_file:
-            cached_faces = json.load(cache_file)
-    except json.JSONDecodeError:
-        return render_template(
-            "reuse_faces.html",
-            status_message="Error: Faces cache metadata is not valid JSON.",
-            status_level="error",
-            **context,
-        )
-
-    if not isinstance(cached_faces, list) or not cached_faces:
-        return render_template(
-            "reuse_faces.html",
-            status_message="Error: Faces cache does not contain any faces to group.",
-            status_level="error",
-            **context,
-        )
-
-    photos_abs = os.path.abspath(photos_path)
-    missing_photos = []
-    outside_scope = []
-    missing_metadata = []
-    prepared_faces = []
-
-    for entry in cached_faces:
-        face_id = entry.get("face_id")
-        embedding = entry.get("embedding")
-        original_path = entry.get("original_path")
-
-        if face_id is None or embedding is None or original_path is None:
-            missing_metadata.append(face_id)
-            continue
-
-        original_abs = os.path.abspath(original_path)
-        if not os.path.exists(original_abs):
-            missing_photos.append(original_abs)
-            continue
-
-        try:
-            relative_path = os.path.relpath(original_abs, photos_abs)
-        except ValueError:
-            relative_path = None
-
-        if not relative_path or relative_path.startswith(".."):
-            outside_scope.append(original_abs)
-            continue
-
-        try:
-            embedding_array = np.array(embedding, dtype=np.float32)
-        except (TypeError, ValueError):
-            missing_metadata.append(face_id)
-            continue
-
-        face_record = dict(entry)
-        face_record["embedding"] = embedding_array
-        face_record["original_path"] = original_abs
-        prepared_faces.append(face_record)
-
-    if missing_metadata:
-        sample = next((mid for mid in missing_metadata if mid is not None), None)
-        detail = f" Example face id: {sample}" if sample is not None else ""
-        return render_template(
-            "reuse_faces.html",
-            status_message=(
-                "Error: Faces cache is missing embeddings or metadata for "
-                f"{len(missing_metadata)} face(s).{detail}"
-            ),
-            status_level="error",
-            **context,
-        )
-
-    if missing_photos:
-        sample = missing_photos[0]
+        loaded = load_face_cache(faces_cache_file, photos_path)
+    except ValueError as exc:
         return render_template(
             "reuse_faces.html",
-            status_message=(
-                "Error: The cache references photo files that no longer exist. "
-                f"Example: {sample}"
-            ),
+            status_message=f"Error: {exc}",
             status_level="error",
             **context,
         )
 
-    if outside_scope:
-        sample = outside_scope[0]
+    error_summary = loaded.error_summary()
+    if error_summary:
         return render_template(
             "reuse_faces.html",
-            status_message=(
-                "Error: The cache references photo files outside the provided "
-                f"photo directory. Example: {sample}"
-            ),
+            status_message=f"Error: The faces cache failed validation. {error_summary}",
             status_level="error",
             **context,
         )
 
+    prepared_faces = loaded.faces
     if not prepared_faces:
         return render_template(
             "reuse_faces.html",
-            status_message="Error: No valid faces remain after validation.",
+            status_message="Error: Faces cache does not contain any faces to group.",
             status_level="error",
             **context,
         )
 
     labels = processor.cluster_faces(
-        prepared_faces, eps=eps_value, min_samples=min_samples_value
+        prepared_faces,
+        eps=eps_value,
+        min_samples=min_samples_value,
+        embeddings=loaded.embeddings,
+        mode=cluster_mode,
     )
     if labels.size == 0:
         return render_template(
@@ -509,7 +780,7 @@ def run_reuse_faces():
         )
 
     clusters = {}
-    for face, label in zip(prepared_faces, labels):
+    for face_id, label in zip(prepared_faces.face_ids.tolist(), labels.tolist()):
         cluster_id = int(label)
         default_name = (
             f"Person {cluster_id + 1}" if cluster_id != -1 else "Unidentified"
@@ -520,7 +791,7 @@ def run_reuse_faces():
                 "name": default_name,
                 "faces": [],
             }
-        clusters[cluster_id]["faces"].append({"face_id": face.get("face_id")})
+        clusters[cluster_id]["faces"].append({"face_id": face_id})
 
     if not clusters:
         return render_template(
@@ -569,14 +840,16 @@ def run_reuse_faces():
 @app.route("/save_albums", methods=["POST"])
 def save_albums():
     """
-    Receives the corrected cluster data from the UI and saves the final albums.
+    Receives gallery edits from the UI and saves the final albums.
+
+    The gallery sends only its changes as ``renames``, ``moves`` and
+    ``merges``; a full ``clusters`` list is still accepted for older clients.
     """
-    corrected_clusters = request.json.get("clusters")
+    payload = request.get_json(silent=True) or {}
+    corrected_clusters = payload.get("clusters")
+    library = processor.library
 
-    try:
-        with open(os.path.join(processor.cache_path, "all_faces_data.json"), "r") as f:
-            all_faces_data = json.load(f)
-    except FileNotFoundError:
+    if not os.path.isfile(library.faces_cache_file):
         return (
             jsonify(
                 {
@@ -586,216 +859,253 @@ def save_albums():
             ),
             400,
         )
+    faces = processor.load_face_table(library)
 
-    PhotoProcessor.save_final_albums(corrected_clusters, all_faces_data, OUTPUT_DIR)
+    if corrected_clusters is None:
+        try:
+            assignments, changed_cluster_ids = processor.apply_cluster_changes(
+                payload.get("renames"),
+                payload.get("moves"),
+                payload.get("merges"),
+                library=library,
+            )
+        except ValueError as exc:
+            return jsonify({"status": "error", "message": str(exc)}), 400
+
+        PhotoProcessor.save_final_albums(
+            PhotoProcessor.album_clusters_from_assignments(assignments),
+            faces,
+            OUTPUT_DIR,
+            changed_cluster_ids,
+        )
+        return jsonify({"status": "success", "message": "Albums saved successfully!"})
+
+    PhotoProcessor.save_final_albums(corrected_clusters, faces, OUTPUT_DIR)
 
     # Keep cluster assignment names in sync with user edits
-    assignments = processor.load_cluster_assignments()
+    assignments = processor.load_cluster_assignments(library)
     if assignments:
         assignments_by_id = {
             item["cluster_id"]: item for item in assignments if "cluster_id" in item
         }
+        renamed_ids = set()
         for cluster in corrected_clusters or []:
             cluster_id = cluster.get("cluster_id")
             if cluster_id in assignments_by_id:
                 assignments_by_id[cluster_id]["name"] = cluster.get(
                     "name", assignments_by_id[cluster_id].get("name")
                 )
-        processor._persist_cluster_assignments(assignments_by_id)
+                renamed_ids.add(cluster_id)
+        processor._persist_cluster_assignments(assignments_by_id, renamed_ids, library)
 
     return jsonify({"status": "success", "message": "Albums saved successfully!"})
 
 
 @app.route("/output_albums/.cache/faces/<path:filename>")
 def serve_cached_faces(filename):
-    """Serves the cropped face images from the cache directory."""
-    return send_from_directory(processor.faces_cache_path, filename)
+    """Serves a cropped face image from the crop pack (or a legacy loose file)."""
+    digest = PhotoProcessor.face_crop_digest(filename)
+    library = processor.library
+    if not digest:
+        # Legacy face_{N}.jpg crops may be overwritten by a later run.
+        return send_from_directory(
+            library.faces_cache_path,
+            filename,
+            conditional=True,
+            max_age=0,
+        )
+
+    data = library.face_pack.read(digest)
+    if data is None:
+        # Loose crop files from caches written before crops were packed.
+        response = send_from_directory(
+            library.faces_cache_path,
+            filename,
+            conditional=True,
+            etag=digest,
+            max_age=FACE_CROP_MAX_AGE,
+        )
+    else:
+        response = app.response_class(data, mimetype="image/jpeg")
+        response.set_etag(digest)
+        response.cache_control.public = True
+        response.cache_control.max_age = FACE_CROP_MAX_AGE
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Expose pipeline metrics in the Prometheus text format."""
+    return app.response_class(
+        metrics.REGISTRY.render(), mimetype=None, content_type=metrics.CONTENT_TYPE
+    )
+
+
+def _parse_together_query():
+    """
+    Read the people and date filters of a co-occurrence query.
+
+    ``with``, ``any`` and ``without`` may repeat or hold comma-separated
+    cluster ids; ``from`` and ``to`` are ISO dates. Returns ``(query, error)``.
+    """
+    query = {}
+    for key in ("with", "any", "without"):
+        ids = []
+        for raw in request.args.getlist(key):
+            for part in raw.split(","):
+                part = part.strip()
+                if not part:
+                    continue
+                try:
+                    ids.append(int(part))
+                except ValueError:
+                    return query, f"Invalid person id: {part}"
+        query[key] = ids
+    for key in ("from", "to"):
+        value = (request.args.get(key) or "").strip() or None
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return query, f"Invalid {key} date: {value} (expected YYYY-MM-DD)."
+        query[key] = value
+    if query["from"] and query["to"] and query["from"] > query["to"]:
+        return query, "The start date must not be after the end date."
+    return query, None
+
+
+def _describe_together_query(query: dict, names: dict) -> str:
+    def people(ids, joiner):
+        labels = [names.get(cluster_id, f"Person {cluster_id + 1}") for cluster_id in ids]
+        if len(labels) <= 1:
+            return "".join(labels)
+        return f"{', '.join(labels[:-1])} {joiner} {labels[-1]}"
+
+    parts = []
+    if query["with"]:
+        parts.append(f"with {people(query['with'], 'and')}")
+    if query["any"]:
+        parts.append(f"with {people(query['any'], 'or')}")
+    if query["without"]:
+        parts.append(f"without {people(query['without'], 'or')}")
+    if query["from"] and query["to"]:
+        parts.append(f"from {query['from']} to {query['to']}")
+    elif query["from"]:
+        parts.append(f"since {query['from']}")
+    elif query["to"]:
+        parts.append(f"until {query['to']}")
+    return "Photos " + ", ".join(parts) if parts else "All photos"
 
 
 @app.route("/timeline")
 def timeline_index():
     """List available clusters and provide entry points into their timelines."""
-    assignments = processor.load_cluster_assignments()
-    faces_data = processor.load_all_faces_data()
-    face_map = {face["face_id"]: face for face in faces_data}
-
-    clusters = []
-    for cluster in assignments:
-        face_ids = cluster.get("face_ids", [])
-        originals = {
-            os.path.abspath(face_map[fid]["original_path"])
-            for fid in face_ids
-            if fid in face_map and face_map[fid].get("original_path")
-        }
-        clusters.append(
-            {
-                "cluster_id": cluster["cluster_id"],
-                "name": cluster.get("name") or f"Person {cluster['cluster_id'] + 1}",
-                "photo_count": len(originals),
-                "face_count": len(face_ids),
-            }
-        )
-
-    clusters.sort(key=lambda c: (c["cluster_id"] == -1, c["name"].lower()))
+    clusters = processor.load_timeline_views()["index"]
+    query, _error = _parse_together_query()
     return render_template(
         "timeline_index.html",
         clusters=clusters,
         has_data=bool(clusters),
+        query=query,
+    )
+
+
+@app.route("/timeline/together")
+def timeline_together():
+    """Render a timeline of the photos matching a people/date co-occurrence query."""
+    clusters = processor.load_timeline_views()["index"]
+    query, error = _parse_together_query()
+    names = {cluster["cluster_id"]: cluster["name"] for cluster in clusters}
+    if not error:
+        unknown = [
+            cluster_id
+            for key in ("with", "any", "without")
+            for cluster_id in query[key]
+            if cluster_id not in names
+        ]
+        if unknown:
+            error = f"Unknown person id: {unknown[0]}"
+        elif not (query["with"] or query["any"]):
+            error = "Pick at least one person to include."
+    if error:
+        return (
+            render_template(
+                "timeline_index.html",
+                clusters=clusters,
+                has_data=bool(clusters),
+                query=query,
+                error_message=error,
+            ),
+            400,
+        )
+
+    view = processor.query_photos(
+        query["with"], query["any"], query["without"], query["from"], query["to"]
+    )
+    timeline_groups = [
+        {
+            "day_label": group["day_label"],
+            "items": [
+                dict(
+                    item,
+                    original_url=url_for("serve_original_photo", face_id=item["face_id"]),
+                )
+                for item in group["items"]
+            ],
+        }
+        for group in view["timeline_groups"]
+    ]
+    return render_template(
+        "timeline_detail.html",
+        cluster={"cluster_id": None, "name": _describe_together_query(query, names)},
+        timeline_groups=timeline_groups,
+        photo_count=view["photo_count"],
+        date_range=view["date_range"],
+        is_query=True,
+        query_args={key: value for key, value in query.items() if value},
     )
 
 
 @app.route("/timeline/<int:cluster_id>")
 def timeline_detail(cluster_id):
     """Render a chronological gallery for a single cluster/person."""
-    assignments = processor.load_cluster_assignments()
-    cluster = next(
-        (item for item in assignments if item.get("cluster_id") == cluster_id), None
-    )
-    if not cluster:
+    view = processor.load_cluster_timeline(cluster_id)
+    if not view:
         abort(404)
 
-    faces_data = processor.load_all_faces_data()
-    face_map = {face["face_id"]: face for face in faces_data}
-
-    photos_by_path = {}
-    for face_id in cluster.get("face_ids", []):
-        face = face_map.get(face_id)
-        if not face:
-            continue
-        original_path = face.get("original_path")
-        if not original_path:
-            continue
-        key = os.path.abspath(original_path)
-        parsed_taken_at = _parse_iso_timestamp(face.get("taken_at"))
-        existing = photos_by_path.get(key)
-        if not existing:
-            photos_by_path[key] = {
-                "representative_face_id": face["face_id"],
-                "original_path": original_path,
-                "thumbnail_url": face.get("face_image_url"),
-                "taken_at": face.get("taken_at"),
-                "timestamp_source": face.get("timestamp_source") or "unknown",
-                "parsed_taken_at": parsed_taken_at,
-                "filename": os.path.basename(original_path),
-            }
-        else:
-            current_dt = existing.get("parsed_taken_at")
-            if (parsed_taken_at and not current_dt) or (
-                parsed_taken_at and current_dt and parsed_taken_at < current_dt
-            ):
-                existing.update(
-                    {
-                        "representative_face_id": face["face_id"],
-                        "taken_at": face.get("taken_at"),
-                        "timestamp_source": face.get("timestamp_source") or "unknown",
-                        "parsed_taken_at": parsed_taken_at,
-                    }
+    timeline_groups = [
+        {
+            "day_label": group["day_label"],
+            "items": [
+                dict(
+                    item,
+                    original_url=url_for("serve_original_photo", face_id=item["face_id"]),
                 )
-
-    photos = list(photos_by_path.values())
-    if not photos:
-        return render_template(
-            "timeline_detail.html",
-            cluster={
-                "cluster_id": cluster_id,
-                "name": cluster.get("name") or f"Cluster {cluster_id}",
-            },
-            timeline_groups=[],
-            photo_count=0,
-            date_range=None,
-        )
-
-    grouped = defaultdict(list)
-    unknown_group = []
-    timestamps = []
-
-    for photo in photos:
-        dt = photo.get("parsed_taken_at")
-        if dt:
-            grouped[dt.date()].append(photo)
-            timestamps.append(dt)
-        else:
-            unknown_group.append(photo)
-
-    timeline_groups = []
-    for day in sorted(grouped.keys()):
-        day_items = grouped[day]
-        day_items.sort(
-            key=lambda item: (
-                item.get("parsed_taken_at"),
-                item.get("filename"),
-            )
-        )
-        label_dt = day_items[0]["parsed_taken_at"]
-        timeline_groups.append(
-            {
-                "day_label": _format_day_label(label_dt),
-                "items": [
-                    {
-                        "face_id": item["representative_face_id"],
-                        "thumbnail_url": item["thumbnail_url"],
-                        "original_url": url_for(
-                            "serve_original_photo", face_id=item["representative_face_id"]
-                        ),
-                        "taken_at": item.get("taken_at"),
-                        "time_label": _format_time_label(item["parsed_taken_at"]),
-                        "timestamp_source": item.get("timestamp_source"),
-                        "filename": item.get("filename"),
-                    }
-                    for item in day_items
-                ],
-            }
-        )
-
-    if unknown_group:
-        unknown_group.sort(key=lambda item: item.get("filename"))
-        timeline_groups.append(
-            {
-                "day_label": "Unknown Date",
-                "items": [
-                    {
-                        "face_id": item["representative_face_id"],
-                        "thumbnail_url": item["thumbnail_url"],
-                        "original_url": url_for(
-                            "serve_original_photo", face_id=item["representative_face_id"]
-                        ),
-                        "taken_at": item.get("taken_at"),
-                        "time_label": "Unknown time",
-                        "timestamp_source": item.get("timestamp_source"),
-                        "filename": item.get("filename"),
-                    }
-                    for item in unknown_group
-                ],
-            }
-        )
-
-    date_range = None
-    if timestamps:
-        timestamps.sort()
-        start_label = _format_day_label(timestamps[0])
-        end_label = _format_day_label(timestamps[-1])
-        if start_label == end_label:
-            date_range = {"start": start_label, "end": None}
-        else:
-            date_range = {"start": start_label, "end": end_label}
+                for item in group["items"]
+            ],
+        }
+        for group in view["timeline_groups"]
+    ]
 
     return render_template(
         "timeline_detail.html",
         cluster={
             "cluster_id": cluster_id,
-            "name": cluster.get("name") or f"Cluster {cluster_id}",
+            "name": view.get("name") or f"Cluster {cluster_id}",
         },
         timeline_groups=timeline_groups,
-        photo_count=len(photos),
-        date_range=date_range,
+        photo_count=view["photo_count"],
+        date_range=view["date_range"],
     )
 
 
 @app.route("/timeline/photo/<int:face_id>")
 def serve_original_photo(face_id):
     """Serve the original photo for a face if it resides in an allowed directory."""
-    faces_data = processor.load_all_faces_data()
-    face = next((item for item in faces_data if item.get("face_id") == face_id), None)
+    faces = processor.load_face_table()
+    face = faces.by_id.get(face_id)
     if not face:
         abort(404)
 
@@ -803,9 +1113,11 @@ def serve_original_photo(face_id):
     if not original_path:
         abort(404)
 
-    real_path = os.path.realpath(original_path)
+    # Photos inside an archive are checked and served through the archive.
+    archive, _member = split_archive_path(original_path)
+    real_path = os.path.realpath(archive or original_path)
     allowed = False
-    for root in _allowed_photo_roots(faces_data):
+    for root in _allowed_photo_roots(faces):
         abs_root = os.path.abspath(root)
         try:
             if os.path.commonpath([real_path, abs_root]) == abs_root:
@@ -820,7 +1132,21 @@ def serve_original_photo(face_id):
     if not os.path.isfile(real_path):
         abort(404)
 
-    return send_file(real_path)
+    # conditional=True answers If-None-Match/If-Modified-Since with 304 and
+    # serves Range requests as 206 partial content.
+    if archive is None:
+        return send_file(real_path, conditional=True, max_age=ORIGINAL_PHOTO_MAX_AGE)
+    stat = photo_stat(original_path)
+    if stat is None:
+        abort(404)
+    return send_file(
+        open_photo(original_path),
+        download_name=photo_name(original_path),
+        conditional=True,
+        etag=f"{stat[1]:x}-{stat[0]:x}",
+        last_modified=stat[1] / 1e9,
+        max_age=ORIGINAL_PHOTO_MAX_AGE,
+    )
 
 
 @app.route("/login")
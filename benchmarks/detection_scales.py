@@ -0,0 +1,185 @@
+"""
+Speed/recall report for detector resolution policies.
+
+Runs each policy's detector passes over the same photos and reports images/sec,
+detector passes per image, escalation rate and recall.
+
+    # Offline: synthetic photos with painted faces and the stub detector.
+    python benchmarks/detection_scales.py --stub --images 100 --width 3000 --height 2000
+
+    # Real photos with the InsightFace model.
+    python benchmarks/detection_scales.py --dataset /path/to/photos --policies fixed:640 fixed:1024 adaptive:640
+
+With ``--stub`` recall is measured against the painted faces. On real photos
+there is no ground truth, so recall is relative to the union of every policy's
+detections (a face counts once, however many policies found it).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from stub_model import StubFaceAnalysis, generate_dataset, parse_range
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from face_detection import DetectionSettings, _nms, detect_boxes  # noqa: E402
+from photo_processor import create_face_analysis, list_image_files  # noqa: E402
+
+MATCH_IOU = 0.5
+
+
+def parse_policy(value):
+    mode, _, size = value.partition(":")
+    try:
+        return DetectionSettings(mode=mode, det_size=int(size or 640))
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"{value}: {exc}") from exc
+
+
+def _iou(box, boxes):
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+def count_matches(reference, detected) -> int:
+    """Reference boxes matched one-to-one by a detection with IoU >= MATCH_IOU."""
+    if len(reference) == 0 or len(detected) == 0:
+        return 0
+    unused = np.ones(len(detected), dtype=bool)
+    matched = 0
+    for box in reference:
+        overlaps = _iou(box, detected) * unused
+        best = int(np.argmax(overlaps))
+        if overlaps[best] >= MATCH_IOU:
+            unused[best] = False
+            matched += 1
+    return matched
+
+
+def run_policy(det_model, image_paths, settings):
+    from face_detection import DETECTION_ESCALATIONS, DETECTION_PASSES
+
+    def total(counter):
+        return sum(counter._values.values())
+
+    passes_before = total(DETECTION_PASSES)
+    escalations_before = total(DETECTION_ESCALATIONS)
+    detections = {}
+    seconds = 0.0
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        started = time.perf_counter()
+        bboxes, _ = detect_boxes(det_model, img, settings)
+        seconds += time.perf_counter() - started
+        detections[os.path.basename(path)] = bboxes[:, :4]
+    return {
+        "detections": detections,
+        "seconds": seconds,
+        "passes": total(DETECTION_PASSES) - passes_before,
+        "escalations": total(DETECTION_ESCALATIONS) - escalations_before,
+    }
+
+
+def union_reference(results):
+    """Per image, every policy's boxes merged by NMS: the faces any policy found."""
+    reference = {}
+    names = set().union(*(result["detections"] for result in results))
+    for name in names:
+        boxes = [
+            np.hstack([result["detections"][name], np.ones((len(result["detections"][name]), 1))])
+            for result in results
+            if name in result["detections"]
+        ]
+        stacked = np.concatenate(boxes, axis=0).astype(np.float32)
+        reference[name] = stacked[_nms(stacked, threshold=MATCH_IOU)][:, :4]
+    return reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare detector resolution policies.")
+    parser.add_argument("--dataset", help="Folder of photos (uses the InsightFace model unless --stub).")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub detector.")
+    parser.add_argument("--images", type=int, default=60, help="Synthetic images when no --dataset.")
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--faces", default="1-12", help="Synthetic faces per image, N or MIN-MAX.")
+    parser.add_argument("--face-px", default="16-240", help="Synthetic face side range in pixels.")
+    parser.add_argument("--det-latency-ms", type=float, default=30.0, help="Stub latency per 640x640 pass.")
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        type=parse_policy,
+        default=[parse_policy(p) for p in ("fixed:320", "fixed:640", "fixed:1024", "adaptive:640")],
+        help="mode:det_size entries, e.g. fixed:640 adaptive:640",
+    )
+    args = parser.parse_args()
+
+    truth = None
+    dataset = args.dataset
+    if not dataset:
+        if not args.stub:
+            parser.error("--dataset is required unless --stub is given")
+        dataset = tempfile.mkdtemp(prefix="detection_bench_")
+        print(f"Generating {args.images} {args.width}x{args.height} synthetic photos in {dataset}...")
+        painted = generate_dataset(
+            dataset, args.images, args.width, args.height, with_exif=False,
+            faces=parse_range(args.faces), face_px=parse_range(args.face_px),
+        )
+        truth = {name: np.array(boxes, dtype=np.float32).reshape(-1, 4) for name, boxes in painted.items()}
+
+    if args.stub:
+        det_model = StubFaceAnalysis(det_latency=args.det_latency_ms / 1000).det_model
+    else:
+        det_model = create_face_analysis().det_model
+
+    image_paths = sorted(list_image_files(dataset))
+    results = []
+    for settings in args.policies:
+        label = f"{settings.mode}:{settings.det_size}"
+        print(f"Running {label}...", file=sys.stderr)
+        result = run_policy(det_model, image_paths, settings)
+        result["label"] = label
+        results.append(result)
+
+    reference = truth if truth is not None else union_reference(results)
+    reference_faces = sum(len(boxes) for boxes in reference.values())
+    recall_kind = "recall" if truth is not None else "rel. recall"
+
+    header = f"{'policy':<16}{'images/s':>10}{'passes/img':>12}{'escalated':>11}{'faces':>8}{recall_kind:>13}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        images = len(result["detections"]) or 1
+        found = sum(len(boxes) for boxes in result["detections"].values())
+        matched = sum(
+            count_matches(reference.get(name, np.zeros((0, 4))), boxes)
+            for name, boxes in result["detections"].items()
+        )
+        escalated = (
+            f"{result['escalations'] / images:>10.0%}" if result["label"].startswith("adaptive") else f"{'-':>10}"
+        )
+        print(
+            f"{result['label']:<16}{images / result['seconds'] if result['seconds'] else 0:>10.2f}"
+            f"{result['passes'] / images:>12.2f} {escalated}{found:>8}"
+            f"{matched / reference_faces if reference_faces else 0:>13.1%}"
+        )
+    print(f"\nReference faces: {reference_faces} across {len(image_paths)} images.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Offline throughput benchmark for ``PhotoProcessor.extract_faces``.
+
+Generates a synthetic JPEG folder and replaces InsightFace with the
+deterministic stub from ``stub_model.py`` (configurable latency and faces per
+image), so it runs on any Linux CPU box without model weights or network access.
+
+Usage:
+    python benchmarks/extraction_throughput.py --images 200 --width 1600 --height 1200
+    python benchmarks/extraction_throughput.py --no-exif --faces 1-8 --modes serial worker:2
+
+Modes:
+    serial      in-process stub model (the default extraction path)
+    worker:N    stub model behind inference_worker.py with N pool processes,
+                served from a separate process like a real deployment
+
+Each mode runs in a fresh interpreter so peak RSS is measured per mode. The
+timed run is untraced; the Python peak comes from a second, traced run into
+a fresh cache, since tracemalloc slows every allocation.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from stub_model import generate_dataset, install_stub, parse_range
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def _range_arg(value):
+    try:
+        return parse_range(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def _serve_inference(address, processes):
+    from inference_worker import InferenceServer
+
+    # Own process group, so stopping it reaches the pool processes as Ctrl-C would.
+    os.setpgid(0, 0)
+    try:
+        InferenceServer(address, processes=processes).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------------------------------------------------------------- #
+# Single-mode run (executed in a child interpreter)
+# ---------------------------------------------------------------------- #
+def run_mode(mode, dataset, det_latency, rec_latency):
+    import metrics
+    from photo_processor import PhotoProcessor
+
+    install_stub(det_latency=det_latency, rec_latency=rec_latency)
+
+    stage_totals = defaultdict(lambda: [0.0, 0])
+
+    def record(stage, _started, elapsed):
+        stage_totals[stage][0] += elapsed
+        stage_totals[stage][1] += 1
+
+    workdir = tempfile.mkdtemp(prefix="extract_bench_")
+    server = None
+    try:
+        inference_address = None
+        if mode.startswith("worker:"):
+            # Its own process, as in production, so the service does not
+            # share this interpreter's GIL; the socket appears once the pool
+            # processes have loaded the model.
+            inference_address = os.path.join(workdir, "inference.sock")
+            server = multiprocessing.get_context("fork").Process(
+                target=_serve_inference,
+                args=(inference_address, int(mode.split(":", 1)[1])),
+            )
+            server.start()
+            while not os.path.exists(inference_address):
+                if not server.is_alive():
+                    raise SystemExit("Inference worker exited during start-up.")
+                time.sleep(0.01)
+        elif mode != "serial":
+            raise SystemExit(f"Unknown mode: {mode}")
+
+        def new_processor(output_dirname):
+            processor = PhotoProcessor(
+                output_path_base=os.path.join(workdir, output_dirname),
+                inference_address=inference_address,
+            )
+            processor.warm_up(background=False)
+            return processor
+
+        processor = new_processor("output")
+        metrics.add_stage_listener(record)
+        started = time.perf_counter()
+        all_faces = processor.extract_faces(dataset)
+        elapsed = time.perf_counter() - started
+        metrics.remove_stage_listener(record)
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        # Python peak from a separate traced run; its own cache, so it extracts too.
+        traced = new_processor("output_traced")
+        tracemalloc.start()
+        traced.extract_faces(dataset)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        crop_bytes = processor.face_pack.stats()["pack_bytes"]
+        images = len([f for f in os.listdir(dataset) if f.endswith(".jpg")])
+        crop_seconds, crop_count = stage_totals.get("crop_write", (0.0, 0))
+        return {
+            "mode": mode,
+            "images": images,
+            "faces": len(all_faces),
+            "seconds": elapsed,
+            "images_per_second": images / elapsed if elapsed else 0.0,
+            "faces_per_image": len(all_faces) / images if images else 0.0,
+            "crop_writes_per_second": crop_count / crop_seconds if crop_seconds else 0.0,
+            "crop_megabytes_per_second": (crop_bytes / 1e6) / crop_seconds if crop_seconds else 0.0,
+            "python_peak_megabytes": traced_peak / 1e6,
+            "peak_rss_megabytes": peak_rss,
+            "stages": {stage: {"seconds": s, "calls": c} for stage, (s, c) in stage_totals.items()},
+        }
+    finally:
+        if server is not None:
+            os.killpg(server.pid, signal.SIGINT)
+            server.join(timeout=10)
+            try:
+                os.killpg(server.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            server.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------- #
+# Driver
+# ---------------------------------------------------------------------- #
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face extraction offline.")
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--no-exif", action="store_true", help="Write JPEGs without EXIF.")
+    parser.add_argument("--faces", type=_range_arg, default=(1, 3), help="N or MIN-MAX faces per image.")
+    parser.add_argument("--face-px", type=_range_arg, default=(48, 160), help="Face side range in pixels.")
+    parser.add_argument("--det-latency-ms", type=float, default=0.0, help="Stub detector latency per 640x640 pass.")
+    parser.add_argument("--rec-latency-ms", type=float, default=0.0, help="Stub recognition latency per face.")
+    parser.add_argument("--modes", nargs="+", default=["serial"], help="serial and/or worker:N")
+    parser.add_argument("--dataset", help="Reuse an existing folder instead of generating one.")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        result = run_mode(
+            args.run_mode,
+            args.dataset,
+            args.det_latency_ms / 1000,
+            args.rec_latency_ms / 1000,
+        )
+        print("BENCHMARK_RESULT " + json.dumps(result))
+        return
+
+    dataset_dir = args.dataset
+    temp_dataset = None
+    if not dataset_dir:
+        temp_dataset = tempfile.mkdtemp(prefix="extract_bench_data_")
+        dataset_dir = temp_dataset
+        print(
+            f"Generating {args.images} {args.width}x{args.height} JPEGs "
+            f"({'without' if args.no_exif else 'with'} EXIF)..."
+        )
+        generate_dataset(
+            dataset_dir, args.images, args.width, args.height, not args.no_exif,
+            faces=args.faces, face_px=args.face_px,
+        )
+
+    results = []
+    try:
+        for mode in args.modes:
+            command = [
+                sys.executable, os.path.abspath(__file__),
+                "--run-mode", mode,
+                "--dataset", dataset_dir,
+                "--det-latency-ms", str(args.det_latency_ms),
+                "--rec-latency-ms", str(args.rec_latency_ms),
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                sys.exit(f"Mode {mode} failed:\n{completed.stderr.strip()}")
+            line = next(
+                l for l in completed.stdout.splitlines() if l.startswith("BENCHMARK_RESULT ")
+            )
+            results.append(json.loads(line[len("BENCHMARK_RESULT "):]))
+    finally:
+        if temp_dataset:
+            shutil.rmtree(temp_dataset, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'mode':<12}{'images/s':>10}{'faces/img':>11}{'crops/s':>10}{'crop MB/s':>11}{'py peak MB':>12}{'RSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['mode']:<12}{result['images_per_second']:>10.1f}"
+            f"{result['faces_per_image']:>11.2f}{result['crop_writes_per_second']:>10.0f}"
+            f"{result['crop_megabytes_per_second']:>11.1f}{result['python_peak_megabytes']:>12.1f}"
+            f"{result['peak_rss_megabytes']:>9.0f}"
+        )
+    for result in results:
+        stages = ", ".join(
+            f"{stage} {info['seconds']:.2f}s"
+            for stage, info in sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"])
+        )
+        print(f"{result['mode']} stage time: {stages}")
+
+
+if __name__ == "__main__":
+    main()
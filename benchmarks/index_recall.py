@@ -0,0 +1,111 @@
+"""
+Recall@k, queries/sec and memory of the compressed embedding indexes against
+exact search.
+
+    # Synthetic 512-d embeddings: 2,000 people, 200,000 faces.
+    python benchmarks/index_recall.py --faces 200000 --people 2000
+
+    # The cached faces of a processed folder (output_albums/.cache/libraries/<id>).
+    python benchmarks/index_recall.py --library output_albums/.cache/libraries/<id>
+
+Queries are held-out faces of the same people (synthetic) or a sample of
+cached faces searched against the rest (library). Ground truth is exact
+search; ``rerank 0`` rows show the compressed distances alone. The memory
+column is the index without the float32 embeddings used for re-ranking.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embedding_index import ExactIndex, IVFIndex  # noqa: E402
+from face_table import FaceTable  # noqa: E402
+
+
+def synthetic_embeddings(faces, people, queries, dim, noise, seed):
+    """Faces scattered around one random centre per person, like ArcFace embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(people, dim)).astype(np.float32)
+    centres *= 20.0 / np.linalg.norm(centres, axis=1, keepdims=True)
+    labels = rng.integers(0, people, faces + queries)
+    vectors = centres[labels] + rng.normal(scale=noise, size=(faces + queries, dim)).astype(np.float32)
+    return vectors[:faces], vectors[faces:]
+
+
+def library_embeddings(library, queries, seed):
+    table = FaceTable.load(os.path.join(library, "all_faces_data.json"))
+    if len(table) <= queries:
+        sys.exit(f"The library holds {len(table)} faces; need more than --queries.")
+    rng = np.random.default_rng(seed)
+    held_out = np.zeros(len(table), dtype=bool)
+    held_out[rng.choice(len(table), queries, replace=False)] = True
+    return table.embeddings[~held_out], table.embeddings[held_out]
+
+
+def run_queries(index, queries, k, **options):
+    started = time.perf_counter()
+    results = [index.search(query, k, **options)[0] for query in queries]
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def recall(results, truth, k):
+    return float(np.mean([len(set(found.tolist()) & set(best.tolist())) / k for found, best in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compressed embedding indexes with exact search.")
+    parser.add_argument("--library", help="Library cache directory to use instead of synthetic data.")
+    parser.add_argument("--faces", type=int, default=200000, help="Synthetic faces.")
+    parser.add_argument("--people", type=int, default=2000, help="Synthetic people.")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--noise", type=float, default=0.4, help="Per-dimension spread of a person's faces.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=["sq8", "pq"], choices=["sq8", "pq"])
+    parser.add_argument("--nlist", type=int, default=None, help="Coarse lists (default: ~4*sqrt(faces)).")
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--rerank", nargs="+", type=int, default=[0, 256])
+    parser.add_argument("--subspaces", type=int, default=64, help="PQ bytes per face.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.library:
+        vectors, queries = library_embeddings(args.library, args.queries, args.seed)
+    else:
+        print(f"Generating {args.faces} synthetic {args.dim}-d embeddings...", file=sys.stderr)
+        vectors, queries = synthetic_embeddings(
+            args.faces, args.people, args.queries, args.dim, args.noise, args.seed
+        )
+
+    exact = ExactIndex(vectors)
+    run_queries(exact, queries[:4], args.k)
+    truth, exact_qps = run_queries(exact, queries, args.k)
+    print(f"Faces: {len(vectors)}  queries: {len(queries)}  k: {args.k}")
+    header = f"{'index':<10}{'nprobe':>8}{'rerank':>8}{f'recall@{args.k}':>11}{'QPS':>10}{'speedup':>9}{'MB':>9}{'build s':>9}"
+    print(header)
+    print("-" * len(header))
+    print(
+        f"{'exact':<10}{'-':>8}{'-':>8}{1.0:>11.3f}{exact_qps:>10.1f}{1.0:>8.2f}x"
+        f"{exact.nbytes / 1e6:>9.1f}{0.0:>9.1f}"
+    )
+    for encoding in args.kinds:
+        started = time.perf_counter()
+        index = IVFIndex.build(vectors, encoding, nlist=args.nlist, subspaces=args.subspaces, seed=args.seed)
+        build_seconds = time.perf_counter() - started
+        for nprobe in args.nprobe:
+            for rerank in args.rerank:
+                results, qps = run_queries(index, queries, args.k, nprobe=nprobe, rerank=rerank)
+                print(
+                    f"{index.kind:<10}{nprobe:>8}{rerank:>8}{recall(results, truth, args.k):>11.3f}"
+                    f"{qps:>10.1f}{qps / exact_qps:>8.2f}x{index.nbytes / 1e6:>9.1f}{build_seconds:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
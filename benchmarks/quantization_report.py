@@ -0,0 +1,200 @@
+"""
+Latency and accuracy report for an INT8 model pack against the FP32 original.
+
+    python benchmarks/quantization_report.py --dataset /path/to/sample/photos \
+        --int8 ~/.insightface/models/buffalo_l_int8
+
+For every photo both detectors run on the same image and both recognition
+models embed the same FP32-detected faces, so embedding agreement is measured
+independently of detection differences. Reported:
+
+* detector and per-face recognition latency, FP32 vs INT8;
+* detection agreement: FP32 faces matched by an INT8 box (IoU >= 0.5);
+* cosine similarity between FP32 and INT8 embeddings of the same face;
+* clustering agreement: adjusted Rand index between DBSCAN labels on FP32 and
+  on INT8 embeddings, at the app's clustering parameters (``--eps``,
+  ``--min-samples``).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from photo_processor import PhotoProcessor, create_face_analysis, list_image_files  # noqa: E402
+
+MATCH_IOU = 0.5
+
+
+def _iou(box, boxes):
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum((box[2] - box[0]) * (box[3] - box[1]) + areas - inter, 1e-6)
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p5": float(np.percentile(values, 5)),
+        "min": float(values.min()),
+    }
+
+
+def compare(fp32_app, int8_app, image_paths, det_size, eps, min_samples):
+    from insightface.app.common import Face
+    from sklearn.cluster import DBSCAN
+    from sklearn.metrics import adjusted_rand_score
+
+    fp32_rec = fp32_app.models["recognition"]
+    int8_rec = int8_app.models["recognition"]
+    det_seconds = {"fp32": 0.0, "int8": 0.0}
+    rec_seconds = {"fp32": 0.0, "int8": 0.0}
+    fp32_faces = matched_faces = int8_faces = 0
+    score_deltas = []
+    fp32_embeddings = []
+    int8_embeddings = []
+    images = 0
+
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        images += 1
+        (fp32_boxes, fp32_kps), elapsed = _timed(
+            fp32_app.det_model.detect, img, input_size=(det_size, det_size)
+        )
+        det_seconds["fp32"] += elapsed
+        (int8_boxes, _), elapsed = _timed(
+            int8_app.det_model.detect, img, input_size=(det_size, det_size)
+        )
+        det_seconds["int8"] += elapsed
+        fp32_faces += len(fp32_boxes)
+        int8_faces += len(int8_boxes)
+
+        for index, row in enumerate(fp32_boxes):
+            if len(int8_boxes):
+                overlaps = _iou(row[:4], int8_boxes[:, :4])
+                best = int(np.argmax(overlaps))
+                if overlaps[best] >= MATCH_IOU:
+                    matched_faces += 1
+                    score_deltas.append(abs(float(row[4]) - float(int8_boxes[best, 4])))
+
+            kps = None if fp32_kps is None else fp32_kps[index]
+            face = Face(bbox=row[:4], kps=kps, det_score=row[4])
+            twin = Face(bbox=row[:4], kps=kps, det_score=row[4])
+            _, elapsed = _timed(fp32_rec.get, img, face)
+            rec_seconds["fp32"] += elapsed
+            _, elapsed = _timed(int8_rec.get, img, twin)
+            rec_seconds["int8"] += elapsed
+            fp32_embeddings.append(np.asarray(face.embedding, dtype=np.float32))
+            int8_embeddings.append(np.asarray(twin.embedding, dtype=np.float32))
+
+    report = {
+        "images": images,
+        "faces": fp32_faces,
+        "detection_ms_per_image": {
+            name: 1000 * seconds / max(images, 1) for name, seconds in det_seconds.items()
+        },
+        "recognition_ms_per_face": {
+            name: 1000 * seconds / max(fp32_faces, 1) for name, seconds in rec_seconds.items()
+        },
+        "detection_recall_vs_fp32": matched_faces / fp32_faces if fp32_faces else None,
+        "int8_faces": int8_faces,
+        "det_score_abs_delta": _percentiles(score_deltas).get("mean"),
+    }
+    if fp32_embeddings:
+        fp32_matrix = np.vstack(fp32_embeddings)
+        int8_matrix = np.vstack(int8_embeddings)
+        cosine = np.sum(fp32_matrix * int8_matrix, axis=1) / (
+            np.linalg.norm(fp32_matrix, axis=1) * np.linalg.norm(int8_matrix, axis=1)
+        )
+        report["embedding_cosine"] = _percentiles(cosine.tolist())
+        fp32_labels = DBSCAN(metric="euclidean", eps=eps, min_samples=min_samples).fit_predict(fp32_matrix)
+        int8_labels = DBSCAN(metric="euclidean", eps=eps, min_samples=min_samples).fit_predict(int8_matrix)
+        report["clustering"] = {
+            "eps": eps,
+            "min_samples": min_samples,
+            "ari": float(adjusted_rand_score(fp32_labels, int8_labels)),
+            "fp32_clusters": int(len(set(fp32_labels)) - (1 if -1 in fp32_labels else 0)),
+            "int8_clusters": int(len(set(int8_labels)) - (1 if -1 in int8_labels else 0)),
+        }
+    return report
+
+
+def print_report(report):
+    det = report["detection_ms_per_image"]
+    rec = report["recognition_ms_per_face"]
+    print(f"Images: {report['images']}  FP32 faces: {report['faces']}  INT8 faces: {report['int8_faces']}")
+    print(f"{'':<28}{'FP32':>10}{'INT8':>10}{'speedup':>10}")
+    print(f"{'detection ms/image':<28}{det['fp32']:>10.1f}{det['int8']:>10.1f}"
+          f"{det['fp32'] / det['int8'] if det['int8'] else 0:>9.2f}x")
+    print(f"{'recognition ms/face':<28}{rec['fp32']:>10.2f}{rec['int8']:>10.2f}"
+          f"{rec['fp32'] / rec['int8'] if rec['int8'] else 0:>9.2f}x")
+    if report["detection_recall_vs_fp32"] is not None:
+        print(f"\nDetection recall vs FP32: {report['detection_recall_vs_fp32']:.1%}"
+              f" (mean |det_score delta| {report['det_score_abs_delta'] or 0:.4f})")
+    if "embedding_cosine" in report:
+        cosine = report["embedding_cosine"]
+        print(f"Embedding cosine similarity: mean {cosine['mean']:.4f}, p5 {cosine['p5']:.4f}, min {cosine['min']:.4f}")
+        clustering = report["clustering"]
+        print(
+            f"Clustering ARI (eps={clustering['eps']}, min_samples={clustering['min_samples']}): "
+            f"{clustering['ari']:.4f}  ({clustering['fp32_clusters']} FP32 vs "
+            f"{clustering['int8_clusters']} INT8 clusters)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an INT8 model pack with FP32.")
+    parser.add_argument("--dataset", required=True, help="Folder of sample photos.")
+    parser.add_argument("--int8", required=True, help="INT8 model pack directory.")
+    parser.add_argument("--fp32", default=None, help="FP32 model pack name or directory (default pack if omitted).")
+    parser.add_argument("--limit", type=int, default=200, help="Maximum photos to compare.")
+    parser.add_argument("--det-size", type=int, default=640)
+    parser.add_argument("--eps", type=float, default=PhotoProcessor.DEFAULT_CLUSTER_EPS)
+    parser.add_argument("--min-samples", type=int, default=PhotoProcessor.DEFAULT_CLUSTER_MIN_SAMPLES)
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON.")
+    args = parser.parse_args()
+
+    image_paths = sorted(list_image_files(args.dataset))[: args.limit]
+    if not image_paths:
+        sys.exit(f"No photos found in {args.dataset}")
+    det_size = (args.det_size, args.det_size)
+    fp32_app = create_face_analysis(det_size=det_size, model=args.fp32)
+    int8_app = create_face_analysis(det_size=det_size, model=args.int8)
+
+    # One untimed pass so session initialisation is not counted.
+    warm = cv2.imread(image_paths[0])
+    if warm is not None:
+        fp32_app.get(warm)
+        int8_app.get(warm)
+
+    report = compare(fp32_app, int8_app, image_paths, args.det_size, args.eps, args.min_samples)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Speedup of cross-image batched recognition over one model call per face.
+
+    # Offline, with the stub model (batching gains are simulated, see stub_model).
+    python benchmarks/recognition_batching.py --stub --images 60
+
+    # Real photos with the InsightFace model (or --model for another pack).
+    python benchmarks/recognition_batching.py --dataset /path/to/photos --batch-sizes 1 16 32 64 128
+
+Faces are detected once; their aligned chips are then embedded per face (as
+``FaceAnalysis.get`` does) and at each batch size. The report shows
+faces/sec, the speedup over per-face calls and the largest difference from
+the per-face embeddings, which should be ~0. ``--end-to-end`` also times
+``extract_faces`` without and with ``--end-to-end-batch``.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from stub_model import StubFace, generate_dataset, install_stub, parse_range
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import photo_processor  # noqa: E402
+from face_embedding import align_chip, embed_chips, recognition_model  # noqa: E402
+from face_quality import QualitySettings  # noqa: E402
+
+
+def collect_faces(face_app, image_paths, limit):
+    """``(img, face)`` pairs from the detector, up to ``limit`` faces."""
+    pairs = []
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        bboxes, kpss = face_app.det_model.detect(img, max_num=0)
+        for index in range(len(bboxes)):
+            if kpss is None:
+                continue
+            face = StubFace(bbox=bboxes[index, :4], kps=kpss[index], det_score=bboxes[index, 4])
+            pairs.append((img, face))
+            if len(pairs) >= limit:
+                return pairs
+    return pairs
+
+
+def time_per_face(rec_model, pairs):
+    started = time.perf_counter()
+    embeddings = [np.asarray(rec_model.get(img, face), dtype=np.float32) for img, face in pairs]
+    return time.perf_counter() - started, np.stack(embeddings)
+
+
+def time_batched(rec_model, pairs, batch_size):
+    started = time.perf_counter()
+    chips = [align_chip(rec_model, img, face) for img, face in pairs]
+    embeddings = embed_chips(rec_model, chips, batch_size)
+    return time.perf_counter() - started, embeddings
+
+
+def time_extraction(dataset, recognition_batch, model):
+    with tempfile.TemporaryDirectory(prefix="recognition_batching_") as output:
+        processor = photo_processor.PhotoProcessor(
+            output, model=model, quality=QualitySettings.for_mode("off")
+        )
+        processor.warm_up(background=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            faces = processor.extract_faces(dataset, recognition_batch=recognition_batch)
+            elapsed = time.perf_counter() - started
+    return elapsed, len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-face and batched recognition.")
+    parser.add_argument("--dataset", help="Folder of photos (uses the InsightFace model unless --stub).")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub model.")
+    parser.add_argument("--model", help="Model pack name or directory.")
+    parser.add_argument("--images", type=int, default=60, help="Synthetic images when no --dataset.")
+    parser.add_argument("--faces", default="2-8", help="Synthetic faces per image, N or MIN-MAX.")
+    parser.add_argument("--rec-latency-ms", type=float, default=8.0, help="Stub latency per face.")
+    parser.add_argument("--max-faces", type=int, default=512, help="Faces to embed per measurement.")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 16, 32, 64, 128])
+    parser.add_argument("--repeats", type=int, default=3, help="Best of N timings.")
+    parser.add_argument("--end-to-end", action="store_true", help="Also time extract_faces.")
+    parser.add_argument("--end-to-end-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    dataset = args.dataset
+    if not dataset:
+        if not args.stub:
+            parser.error("--dataset is required unless --stub is given")
+        dataset = tempfile.mkdtemp(prefix="recognition_bench_")
+        print(f"Generating {args.images} synthetic photos in {dataset}...", file=sys.stderr)
+        generate_dataset(dataset, args.images, 1280, 960, with_exif=False, faces=parse_range(args.faces))
+    if args.stub:
+        install_stub(rec_latency=args.rec_latency_ms / 1000)
+
+    face_app = photo_processor.create_face_analysis(model=args.model)
+    rec_model = recognition_model(face_app)
+    pairs = collect_faces(face_app, sorted(photo_processor.list_image_files(dataset)), args.max_faces)
+    if not pairs:
+        sys.exit("No faces detected in the dataset.")
+    # Warm-up so session initialisation is not timed.
+    time_batched(rec_model, pairs[:8], 8)
+
+    base_seconds, base_embeddings = min(
+        (time_per_face(rec_model, pairs) for _ in range(args.repeats)), key=lambda result: result[0]
+    )
+    faces = len(pairs)
+    print(f"Faces: {faces}")
+    header = f"{'mode':<14}{'faces/s':>10}{'speedup':>10}{'max |diff|':>12}"
+    print(header)
+    print("-" * len(header))
+    print(f"{'per-face':<14}{faces / base_seconds:>10.1f}{1.0:>9.2f}x{0.0:>12.2e}")
+    for batch_size in args.batch_sizes:
+        seconds, embeddings = min(
+            (time_batched(rec_model, pairs, batch_size) for _ in range(args.repeats)),
+            key=lambda result: result[0],
+        )
+        diff = float(np.abs(embeddings - base_embeddings).max())
+        print(
+            f"{f'batch {batch_size}':<14}{faces / seconds:>10.1f}"
+            f"{base_seconds / seconds:>9.2f}x{diff:>12.2e}"
+        )
+
+    if args.end_to_end:
+        per_face, count = time_extraction(dataset, 0, args.model)
+        batched, _ = time_extraction(dataset, args.end_to_end_batch, args.model)
+        print(
+            f"\nextract_faces on {count} faces: per-face {per_face:.2f}s, "
+            f"batch {args.end_to_end_batch} {batched:.2f}s ({per_face / batched:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
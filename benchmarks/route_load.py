@@ -0,0 +1,509 @@
+"""
+Load test for the cached-data Flask routes against a synthetic face library.
+
+Generates a library of the chosen size without any model: original photos,
+a crop pack, ``all_faces_data.json`` (with its sidecar) and
+``cluster_assignments.json`` with the timeline views built from them. Then
+it drives the app with concurrent clients through Flask's test client or,
+with ``--server``, a local threaded server:
+
+    python benchmarks/route_load.py --faces 100000 --clients 8
+    python benchmarks/route_load.py --faces 1000000 --dim 128 --server --requests 500
+
+    # Generate once, then rerun against the same library.
+    python benchmarks/route_load.py --faces 1000000 --dim 128 --workdir /tmp/load-1m
+    python benchmarks/route_load.py --workdir /tmp/load-1m --reuse --routes photo crop
+
+Each route runs as its own phase of ``--requests`` requests shared by
+``--clients`` clients. The first request of a phase is timed on its own:
+caches are cold, and for ``save`` it includes the initial sync of every
+album. The report then shows p50/p95/p99 latency, requests/sec, errors,
+and the serving process's peak RSS plus its growth during the phase. The
+InsightFace model is never loaded; the run fails if a route loads it.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+MANIFEST_FILENAME = "load_manifest.json"
+ROUTES = ("timeline", "cluster", "photo", "crop", "save")
+# Share of faces left in "Unidentified", as DBSCAN noise.
+NOISE_SHARE = 0.1
+FIRST_DAY = datetime(2023, 1, 1)
+_BASE_CROPS = 16
+
+
+# ---------------------------------------------------------------------- #
+# Synthetic library
+# ---------------------------------------------------------------------- #
+def _smooth_jpeg(rng, width, height, quality=85) -> bytes:
+    small = rng.integers(0, 256, (max(2, height // 32), max(2, width // 32), 3), dtype=np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def _write_photos(photos_dir, count, photo_px, rng):
+    """One JPEG hard-linked ``count`` times (copied where links are unsupported)."""
+    os.makedirs(photos_dir, exist_ok=True)
+    data = _smooth_jpeg(rng, photo_px, photo_px * 3 // 4)
+    paths = [os.path.join(photos_dir, f"img_{index:07d}.jpg") for index in range(count)]
+    with open(paths[0], "wb") as photo_file:
+        photo_file.write(data)
+    for path in paths[1:]:
+        try:
+            os.link(paths[0], path)
+        except OSError:
+            shutil.copyfile(paths[0], path)
+    return paths
+
+
+def _write_crop_pack(library_path, count, rng):
+    """
+    Writes ``count`` distinct crops straight into the library's crop pack.
+    Crops are a few small JPEGs, each made unique by trailing bytes after the
+    end-of-image marker, which decoders ignore.
+    """
+    from face_pack import INDEX_FILENAME, PACK_FILENAME
+    from photo_processor import FACE_CROP_DIGEST_LENGTH
+
+    bases = [_smooth_jpeg(rng, 96, 96) for _ in range(_BASE_CROPS)]
+    names = []
+    offset = 0
+    with open(os.path.join(library_path, PACK_FILENAME), "wb") as pack_file, open(
+        os.path.join(library_path, INDEX_FILENAME), "wb"
+    ) as index_file:
+        for index in range(count):
+            data = bases[index % _BASE_CROPS] + index.to_bytes(8, "little")
+            digest = hashlib.sha256(data).hexdigest()[:FACE_CROP_DIGEST_LENGTH]
+            pack_file.write(data)
+            index_file.write(f"{digest} {offset} {len(data)}\n".encode("ascii"))
+            offset += len(data)
+            names.append(f"face_{digest}.jpg")
+    return names
+
+
+def generate_library(workdir, faces, clusters, photos, crops, dim, days, photo_px, seed):
+    """Writes a synthetic library under ``workdir`` and returns its manifest."""
+    from face_table import NAIVE_OFFSET, FaceTable
+    from photo_processor import PhotoProcessor
+
+    rng = np.random.default_rng(seed)
+    photos_dir = os.path.join(workdir, "photos")
+    started = time.perf_counter()
+    photo_paths = _write_photos(photos_dir, photos, photo_px, rng)
+    print(f"  {photos} photos in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    processor = PhotoProcessor(output_path_base=os.path.join(workdir, "output_albums"))
+    library_id = processor.use_library(photos_dir)
+
+    started = time.perf_counter()
+    crop_names = _write_crop_pack(processor.library_path, min(crops, faces), rng)
+    print(f"  {len(crop_names)} crops in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    # Faces in file order, photos dated across ``days``, cluster sizes skewed
+    # like real groups: a few people appear in most photos.
+    photo_ids = np.sort(rng.integers(0, photos, faces)).astype(np.int32)
+    first_us = int((FIRST_DAY - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+    photo_taken_us = first_us + np.sort(rng.integers(0, days * 86_400, photos)) * 1_000_000
+    weights = 1.0 / np.arange(1, clusters + 1) ** 0.8
+    labels = rng.choice(clusters, faces, p=weights / weights.sum())
+    labels[rng.random(faces) < NOISE_SHARE] = -1
+    crop_column = np.array([name.encode("ascii") for name in crop_names])
+
+    table = FaceTable(
+        np.arange(faces, dtype=np.int64),
+        rng.standard_normal((faces, dim), dtype=np.float32),
+        photo_ids,
+        photo_paths,
+        np.zeros(faces, dtype=np.int32),
+        [processor.faces_cache_path],
+        crop_column[np.arange(faces) % len(crop_names)],
+        photo_taken_us[photo_ids].astype(np.int64),
+        np.full(faces, NAIVE_OFFSET, dtype=np.int16),
+        np.zeros(faces, dtype=np.int16),
+        ["exif"],
+    )
+    started = time.perf_counter()
+    processor.save_face_data(table)
+    print(f"  all_faces_data.json in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    started = time.perf_counter()
+    processor.generate_cluster_ui_data(table, labels)
+    print(f"  cluster assignments and views in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    processor.libraries.update(library_id, face_count=faces, image_count=photos)
+    processor.libraries.record_size(library_id)
+
+    return {
+        "faces": faces,
+        "photos": photos,
+        "dim": dim,
+        "cluster_ids": sorted(int(label) for label in np.unique(labels) if label >= 0),
+        "crop_names": crop_names,
+    }
+
+
+# ---------------------------------------------------------------------- #
+# Requests and phases
+# ---------------------------------------------------------------------- #
+def build_requests(route, manifest, count, rng):
+    """``count`` ``(method, path, body)`` requests for one route."""
+    cluster_ids = manifest["cluster_ids"]
+    requests = []
+    for _ in range(count):
+        if route == "timeline":
+            requests.append(("GET", "/timeline", None))
+        elif route == "cluster":
+            cluster_id = cluster_ids[rng.integers(len(cluster_ids))]
+            requests.append(("GET", f"/timeline/{cluster_id}", None))
+        elif route == "photo":
+            requests.append(("GET", f"/timeline/photo/{rng.integers(manifest['faces'])}", None))
+        elif route == "crop":
+            name = manifest["crop_names"][rng.integers(len(manifest["crop_names"]))]
+            requests.append(("GET", f"/output_albums/.cache/faces/{name}", None))
+        elif route == "save":
+            move = {
+                "face_id": int(rng.integers(manifest["faces"])),
+                "cluster_id": int(cluster_ids[rng.integers(len(cluster_ids))]),
+            }
+            requests.append(("POST", "/save_albums", {"renames": [], "moves": [move]}))
+        else:
+            raise ValueError(f"Unknown route: {route}")
+    return requests
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class RssSampler:
+    """Tracks the peak resident memory of ``pid`` while running (Linux only)."""
+
+    def __init__(self, pid, interval=0.01):
+        self.pid = pid
+        self.interval = interval
+        self.start = _rss_bytes(pid)
+        self.peak = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            value = _rss_bytes(self.pid)
+            if value is not None:
+                self.peak = max(self.peak or 0, value)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_phase(route, requests, make_sender, clients, pid):
+    """Sends ``requests`` from ``clients`` threads and summarises the latencies."""
+    send = make_sender()
+    started = time.perf_counter()
+    first_status = send(*requests[0])
+    first_seconds = time.perf_counter() - started
+
+    pending = iter(requests[1:])
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def client():
+        sender = make_sender()
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                return
+            began = time.perf_counter()
+            status = sender(*request)
+            elapsed = time.perf_counter() - began
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    with RssSampler(pid) as sampler:
+        phase_started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - phase_started
+
+    timings = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "route": route,
+        "first_ms": first_seconds * 1000,
+        "first_status": first_status,
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "requests_per_second": len(latencies) / wall if wall else 0.0,
+        "errors": len(errors),
+        "error_statuses": sorted(set(errors)),
+        "peak_rss_mb": sampler.peak / 1e6 if sampler.peak else None,
+        "rss_growth_mb": (sampler.peak - sampler.start) / 1e6 if sampler.peak and sampler.start else None,
+    }
+
+
+def run_phases(manifest, routes, make_sender, clients, requests, seed, pid):
+    rng = np.random.default_rng(seed)
+    return [
+        run_phase(route, build_requests(route, manifest, requests + 1, rng), make_sender, clients, pid)
+        for route in routes
+    ]
+
+
+def test_client_sender(flask_app):
+    def make_sender():
+        client = flask_app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            response.close()
+            return response.status_code
+
+        return send
+
+    return make_sender
+
+
+def http_sender(port):
+    def make_sender():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+
+        def send(method, path, body):
+            payload = None if body is None else json.dumps(body)
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+
+        return send
+
+    return make_sender
+
+
+# ---------------------------------------------------------------------- #
+# Child processes (run inside the library's working directory)
+# ---------------------------------------------------------------------- #
+def child_test_client(args):
+    import app
+
+    with open(MANIFEST_FILENAME) as manifest_file:
+        manifest = json.load(manifest_file)
+    results = run_phases(
+        manifest, args.routes, test_client_sender(app.app), args.clients, args.requests, args.seed, os.getpid()
+    )
+    print("BENCHMARK_RESULT " + json.dumps({"phases": results, "model_loaded": app.processor.model_loaded}))
+
+
+def child_server(port):
+    import app
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", port, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("SERVER_READY", flush=True)
+    # The driver closes stdin when the load test is over.
+    sys.stdin.read()
+    server.shutdown()
+    print("BENCHMARK_RESULT " + json.dumps({"model_loaded": app.processor.model_loaded}), flush=True)
+
+
+def _child_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    # Cached-data routes only: no sign-in, warm-up or inference worker.
+    for name in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "PHOTO_PROCESSOR_WARMUP", "INFERENCE_SOCKET"):
+        env.pop(name, None)
+    return env
+
+
+def _result_line(output):
+    line = next(line for line in output.splitlines() if line.startswith("BENCHMARK_RESULT "))
+    return json.loads(line[len("BENCHMARK_RESULT "):])
+
+
+def drive_server(args, workdir, manifest):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+        cwd=workdir,
+        env=_child_env(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    # The app prints while serving; keep draining so the server never blocks.
+    lines = []
+    ready = threading.Event()
+
+    def read_output():
+        for line in server.stdout:
+            lines.append(line)
+            if line.strip() == "SERVER_READY":
+                ready.set()
+        ready.set()
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    try:
+        ready.wait(300)
+        if server.poll() is not None or not any(line.strip() == "SERVER_READY" for line in lines):
+            sys.exit("The app server did not start.")
+        phases = run_phases(
+            manifest, args.routes, http_sender(port), args.clients, args.requests, args.seed, server.pid
+        )
+        server.stdin.close()
+        server.wait(timeout=60)
+        reader.join(timeout=10)
+    finally:
+        if server.poll() is None:
+            server.kill()
+    return {"phases": phases, **_result_line("".join(lines))}
+
+
+def drive_test_client(args, workdir):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run-phases",
+        "--clients", str(args.clients), "--requests", str(args.requests),
+        "--seed", str(args.seed), "--routes", *args.routes,
+    ]
+    completed = subprocess.run(command, cwd=workdir, env=_child_env(), capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.exit(f"Load test failed:\n{completed.stderr.strip()[-4000:]}")
+    return _result_line(completed.stdout)
+
+
+# ---------------------------------------------------------------------- #
+# Driver
+# ---------------------------------------------------------------------- #
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Flask routes on a synthetic face library.")
+    parser.add_argument("--faces", type=int, default=100000)
+    parser.add_argument("--clusters", type=int, default=None, help="People (default: faces / 50).")
+    parser.add_argument("--photos", type=int, default=None, help="Original photos (default: faces / 4).")
+    parser.add_argument("--crops", type=int, default=100000, help="Distinct crops; faces beyond share them.")
+    parser.add_argument("--dim", type=int, default=512, help="Embedding size; smaller sizes generate faster.")
+    parser.add_argument("--days", type=int, default=730, help="Days the photos are spread over.")
+    parser.add_argument("--photo-px", type=int, default=320, help="Width of the original photos.")
+    parser.add_argument("--routes", nargs="+", default=list(ROUTES), choices=ROUTES)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per route after the first.")
+    parser.add_argument("--server", action="store_true", help="Drive a local threaded server over HTTP.")
+    parser.add_argument("--workdir", help="Directory for the library (default: a temporary one).")
+    parser.add_argument("--reuse", action="store_true", help="Reuse the library already in --workdir.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+    parser.add_argument("--run-phases", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_phases:
+        child_test_client(args)
+        return
+    if args.serve:
+        child_server(args.serve)
+        return
+    if args.reuse and not args.workdir:
+        parser.error("--reuse needs --workdir.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="route_load_")
+    try:
+        manifest_path = os.path.join(workdir, MANIFEST_FILENAME)
+        if args.reuse:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        else:
+            if os.path.exists(os.path.join(workdir, "output_albums")):
+                sys.exit(f"{workdir} already holds a library; pass --reuse or pick another --workdir.")
+            os.makedirs(workdir, exist_ok=True)
+            faces = args.faces
+            print(f"Generating {faces} faces ({args.dim}-d) in {workdir}...", file=sys.stderr)
+            manifest = generate_library(
+                workdir,
+                faces,
+                args.clusters or max(1, faces // 50),
+                args.photos or max(1, faces // 4),
+                args.crops,
+                args.dim,
+                args.days,
+                args.photo_px,
+                args.seed,
+            )
+            with open(manifest_path, "w") as manifest_file:
+                json.dump(manifest, manifest_file)
+
+        print(
+            f"Driving {', '.join(args.routes)} with {args.clients} clients "
+            f"({'local server' if args.server else 'test client'})...",
+            file=sys.stderr,
+        )
+        result = drive_server(args, workdir, manifest) if args.server else drive_test_client(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(
+            f"Faces: {manifest['faces']}  photos: {manifest['photos']}  people: {len(manifest['cluster_ids'])}  "
+            f"clients: {args.clients}  requests/route: {args.requests}"
+        )
+        header = (
+            f"{'route':<10}{'first ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'req/s':>9}{'errors':>8}{'RSS MB':>9}{'+MB':>8}"
+        )
+        print(header)
+        print("-" * len(header))
+        for phase in result["phases"]:
+            peak = phase["peak_rss_mb"]
+            growth = phase["rss_growth_mb"]
+            print(
+                f"{phase['route']:<10}{phase['first_ms']:>10.1f}{phase['p50_ms']:>9.1f}"
+                f"{phase['p95_ms']:>9.1f}{phase['p99_ms']:>9.1f}{phase['requests_per_second']:>9.1f}"
+                f"{phase['errors']:>8}{'-' if peak is None else f'{peak:.0f}':>9}"
+                f"{'-' if growth is None else f'{growth:.0f}':>8}"
+            )
+    if result["model_loaded"]:
+        sys.exit("A route loaded the InsightFace model.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measure how long ``app.py`` takes to import and serve its first cached-data
+requests, and confirm that those requests never load the InsightFace model.
+
+Usage:
+    python benchmarks/startup_time.py [--runs 5] [--eager]
+
+Each run happens in a fresh interpreter inside a temporary working directory,
+so ``output_albums/`` is created there rather than in the repository.
+``--eager`` also loads the model during startup, reproducing the previous
+behaviour for comparison (requires the InsightFace weights to be available).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if EAGER:
+    app.processor.warm_up(background=False)
+ready = time.perf_counter()
+client = app.app.test_client()
+timings = {}
+for path in ("/login", "/timeline", "/api/clusters"):
+    request_started = time.perf_counter()
+    status = client.get(path).status_code
+    timings[path] = {"status": status, "seconds": time.perf_counter() - request_started}
+print(json.dumps({
+    "import_seconds": imported - started,
+    "ready_seconds": ready - started,
+    "requests": timings,
+    "model_loaded": app.processor.model_loaded,
+}))
+"""
+
+
+def run_once(eager: bool) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+        env.pop("PHOTO_PROCESSOR_WARMUP", None)
+        result = subprocess.run(
+            [sys.executable, "-c", f"EAGER = {eager!r}\n" + CHILD_SCRIPT],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode != 0:
+        sys.exit(f"Startup run failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--eager", action="store_true", help="Load the model during startup."
+    )
+    args = parser.parse_args()
+
+    runs = [run_once(args.eager) for _ in range(args.runs)]
+    import_times = [run["import_seconds"] for run in runs]
+    ready_times = [run["ready_seconds"] for run in runs]
+
+    print(f"Runs: {args.runs} ({'eager' if args.eager else 'lazy'} model loading)")
+    print(f"Import app.py:   median {statistics.median(import_times):.3f}s, max {max(import_times):.3f}s")
+    print(f"Ready to serve:  median {statistics.median(ready_times):.3f}s, max {max(ready_times):.3f}s")
+    for path in runs[0]["requests"]:
+        seconds = [run["requests"][path]["seconds"] for run in runs]
+        status = runs[0]["requests"][path]["status"]
+        print(f"First GET {path:<14} HTTP {status}, median {statistics.median(seconds) * 1000:.1f}ms")
+
+    loaded = [run["model_loaded"] for run in runs]
+    print(f"Model loaded after cached-data requests: {any(loaded)}")
+    if not args.eager and any(loaded):
+        sys.exit("Cached-data routes triggered a model load.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Synthetic photos and a deterministic stand-in for InsightFace, shared by the
+offline benchmarks.
+
+``generate_dataset`` paints green checkered squares ("faces") onto smooth noise.
+``StubFaceAnalysis`` finds them at the detector input size it is asked for, so
+faces that shrink below ``STUB_MIN_FACE_PX`` at that size are missed, exactly
+the recall loss a real detector shows at low resolution. Detector latency
+scales with the input area, like the real model's.
+"""
+
+import hashlib
+import importlib
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME = 0x0132
+STUB_MIN_FACE_PX = 10
+STUB_REFERENCE_SIZE = 640
+# Share of the per-face recognition latency that is fixed per model call, so
+# batched calls amortise it the way a real ONNX Runtime session does.
+STUB_CALL_OVERHEAD = 0.6
+# Five-point landmarks (eyes, nose, mouth corners) relative to the face box.
+STUB_KPS = np.array([[0.3, 0.4], [0.7, 0.4], [0.5, 0.55], [0.35, 0.75], [0.65, 0.75]], dtype=np.float32)
+FACE_COLOR = (80, 250, 80)
+FACE_SHADE = (0, 205, 0)
+
+
+def parse_range(value):
+    """Parses ``N`` or ``MIN-MAX`` into an inclusive ``(low, high)`` tuple."""
+    low, _, high = value.partition("-")
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise ValueError("expected N or MIN-MAX with 0 <= MIN <= MAX")
+    return low, high
+
+
+def _face_texture(side):
+    """A face-coloured checkerboard: detectable by colour, sharp enough to pass the blur gate."""
+    cell = max(2, side // 8)
+    checker = ((np.arange(side)[:, None] // cell + np.arange(side)[None, :] // cell) % 2).astype(bool)
+    texture = np.empty((side, side, 3), dtype=np.uint8)
+    texture[:] = FACE_COLOR
+    texture[checker] = FACE_SHADE
+    return texture
+
+
+def generate_dataset(
+    path, images, width, height, with_exif, faces=(1, 3), face_px=(48, 160), seed=0
+):
+    """
+    Writes ``images`` JPEGs with ``faces`` painted faces each, sized in
+    ``face_px``; optionally tagged with EXIF capture times. Returns the painted
+    boxes per file name as ground truth.
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    # Smooth noise compresses like a photo rather than like static; the green
+    # channel stays below the face colour so markers are unambiguous.
+    base = rng.integers(0, 180, size=(height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    truth = {}
+    for index in range(images):
+        shifted = np.roll(base, index, axis=1)
+        pixels = np.array(Image.fromarray(shifted).resize((width, height), Image.BILINEAR))
+        boxes = []
+        for _ in range(int(rng.integers(faces[0], faces[1] + 1))):
+            side = int(rng.integers(face_px[0], face_px[1] + 1))
+            side = min(side, width - 1, height - 1)
+            for _attempt in range(20):
+                x1 = int(rng.integers(0, width - side))
+                y1 = int(rng.integers(0, height - side))
+                candidate = (x1, y1, x1 + side, y1 + side)
+                # Keep a gap so neighbouring faces never merge into one blob.
+                if all(
+                    candidate[2] + 4 < b[0] or b[2] + 4 < candidate[0]
+                    or candidate[3] + 4 < b[1] or b[3] + 4 < candidate[1]
+                    for b in boxes
+                ):
+                    boxes.append(candidate)
+                    pixels[candidate[1]:candidate[3], candidate[0]:candidate[2]] = _face_texture(side)
+                    break
+        name = f"img_{index:06d}.jpg"
+        truth[name] = boxes
+        image = Image.fromarray(pixels)
+        target = os.path.join(path, name)
+        if with_exif:
+            exif = Image.Exif()
+            timestamp = f"2023:{1 + index % 12:02d}:{1 + index % 28:02d} 12:{index % 60:02d}:00"
+            exif[EXIF_DATETIME] = timestamp
+            exif.get_ifd(EXIF_IFD_POINTER)[EXIF_DATETIME_ORIGINAL] = timestamp
+            image.save(target, quality=90, exif=exif)
+        else:
+            image.save(target, quality=90)
+    return truth
+
+
+class StubFace(dict):
+    """Dict with attribute access, like ``insightface.app.common.Face``."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            return None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class StubDetector:
+    taskname = "detection"
+
+    def __init__(self, latency, input_size=(STUB_REFERENCE_SIZE, STUB_REFERENCE_SIZE)):
+        self.latency = latency
+        self.input_size = input_size
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        input_w, input_h = input_size or self.input_size
+        if self.latency:
+            time.sleep(self.latency * (input_w * input_h) / STUB_REFERENCE_SIZE ** 2)
+        height, width = img.shape[:2]
+        scale = min(input_w / width, input_h / height)
+        resized = cv2.resize(
+            img, (max(1, int(width * scale)), max(1, int(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+        mask = cv2.inRange(resized, (0, 200, 0), (90, 255, 90))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        rows = []
+        for x, y, w, h, _area in stats[1:count]:
+            side = min(w, h)
+            if side < STUB_MIN_FACE_PX:
+                continue
+            score = min(0.99, 0.4 + side / 80.0)
+            rows.append([x / scale, y / scale, (x + w) / scale, (y + h) / scale, score])
+        bboxes = np.array(rows, dtype=np.float32).reshape(-1, 5)
+        sizes = (bboxes[:, 2:4] - bboxes[:, 0:2])[:, None, :]
+        kpss = bboxes[:, None, 0:2] + STUB_KPS[None, :, :] * sizes
+        return bboxes, kpss
+
+
+class StubRecognizer:
+    """Embeds aligned chips like ArcFaceONNX, with a dynamic batch dimension."""
+
+    taskname = "recognition"
+    input_size = (112, 112)
+    input_shape = ["None", 3, 112, 112]
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get(self, img, face):
+        from insightface.utils import face_align
+
+        chip = face_align.norm_crop(img, landmark=face.kps, image_size=self.input_size[0])
+        face.embedding = self.get_feat(chip).flatten()
+        return face.embedding
+
+    def get_feat(self, imgs):
+        if not isinstance(imgs, list):
+            imgs = [imgs]
+        if self.latency:
+            time.sleep(self.latency * (STUB_CALL_OVERHEAD + (1 - STUB_CALL_OVERHEAD) * len(imgs)))
+        embeddings = []
+        for chip in imgs:
+            # Seeded by the chip's pixels: the same face gives the same
+            # embedding whichever path aligned it.
+            seed = hashlib.sha1(np.ascontiguousarray(chip).tobytes()).digest()[:8]
+            rng = np.random.default_rng(int.from_bytes(seed, "little"))
+            embedding = rng.standard_normal(512).astype(np.float32)
+            embeddings.append(embedding / np.linalg.norm(embedding))
+        return np.stack(embeddings)
+
+
+class StubFaceAnalysis:
+    """Mimics ``FaceAnalysis``: ``det_model``, ``models`` and ``get``."""
+
+    def __init__(self, det_latency=0.0, rec_latency=0.0, det_size=(640, 640)):
+        # Loading a real pack imports insightface; do the same here so the
+        # first gated detect_faces call is not charged for the import.
+        try:
+            importlib.import_module("insightface.app.common")
+        except ImportError:
+            pass
+        self.det_model = StubDetector(det_latency, det_size)
+        self.models = {"detection": self.det_model, "recognition": StubRecognizer(rec_latency)}
+
+    def get(self, img, max_num=0):
+        bboxes, kpss = self.det_model.detect(img, max_num=max_num)
+        faces = []
+        for index, row in enumerate(bboxes):
+            kps = kpss[index] if kpss is not None else None
+            face = StubFace(bbox=row[:4], kps=kps, det_score=row[4])
+            self.models["recognition"].get(img, face)
+            faces.append(face)
+        return faces
+
+
+def install_stub(det_latency=0.0, rec_latency=0.0):
+    """Makes ``photo_processor.create_face_analysis`` build the stub."""
+    import photo_processor
+
+    photo_processor.create_face_analysis = lambda det_size=(640, 640), model=None: StubFaceAnalysis(
+        det_latency=det_latency, rec_latency=rec_latency, det_size=det_size
+    )
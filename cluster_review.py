@@ -0,0 +1,239 @@
+"""
+Merge and outlier suggestions for the review gallery.
+
+DBSCAN splits one person across several "Person N" clusters and lets a few
+stray faces into others. ``ClusterReview`` keeps, per cluster, the sum of
+its faces' unit-length embeddings; the normalised sum is the cluster's
+centroid. From the centroids it derives, with matrix operations over all
+clusters and faces at once:
+
+* ``similarity``: cosine similarity between every pair of centroids. Pairs
+  at or above ``MERGE_MIN_SIMILARITY`` are merge candidates.
+* ``distances``: each face's cosine distance to its own centroid. Faces far
+  out of line with the rest of their cluster (a robust z-score over the
+  cluster's distances) are outlier candidates, each paired with the nearest
+  other cluster.
+
+Gallery edits only touch the clusters they changed: their sums, their rows
+and columns of ``similarity`` and their faces' distances are recomputed.
+Nothing is re-clustered. "Unidentified" (-1) has no centroid.
+"""
+
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+NOISE_CLUSTER_ID = -1
+MERGE_MIN_SIMILARITY = 0.5
+# Robust z-score (median / MAD of the cluster's distances) and absolute
+# cosine distance a face must both exceed to be flagged.
+OUTLIER_MIN_SCORE = 3.0
+OUTLIER_MIN_DISTANCE = 0.3
+# Smaller clusters have no meaningful spread to judge a face against.
+OUTLIER_MIN_FACES = 4
+# Floor for the MAD-based spread so tight clusters do not flag every wobble.
+MIN_SPREAD = 0.02
+_MAD_SCALE = 1.4826
+
+
+class ClusterReview:
+    def __init__(self, faces):
+        """Review state over the ``FaceTable`` ``faces`` with no clusters yet."""
+        self._by_id = faces.by_id
+        embeddings = np.asarray(faces.embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            embeddings = embeddings.reshape(len(faces), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self._unit = embeddings / np.maximum(norms, 1e-12)
+        self._face_ids = faces.face_ids
+        dim = self._unit.shape[1]
+
+        # Per row: the slot of the face's cluster (-1 when it has none) and
+        # its cosine distance to that cluster's centroid.
+        self.labels = np.full(len(faces), -1, dtype=np.int64)
+        self.distances = np.full(len(faces), np.nan, dtype=np.float32)
+        # Per slot; a cluster keeps its slot, emptied clusters have count 0.
+        self.cluster_ids = np.empty(0, dtype=np.int64)
+        self._slots = {}
+        self.sums = np.zeros((0, dim), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.similarity = np.zeros((0, 0), dtype=np.float32)
+        self._medians = np.zeros(0, dtype=np.float32)
+        self._spreads = np.zeros(0, dtype=np.float32)
+
+    # ------------------------------------------------------------------ #
+    # Building and incremental updates
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def build(cls, faces, assignments: List[dict]) -> "ClusterReview":
+        review = cls(faces)
+        review.update_clusters(assignments)
+        return review
+
+    def _grow(self, cluster_ids: List[int]) -> None:
+        """Adds empty slots for ``cluster_ids``."""
+        added = len(cluster_ids)
+        for offset, cluster_id in enumerate(cluster_ids):
+            self._slots[cluster_id] = len(self.cluster_ids) + offset
+        size = len(self.cluster_ids) + added
+        dim = self.sums.shape[1]
+        self.cluster_ids = np.concatenate(
+            [self.cluster_ids, np.asarray(cluster_ids, dtype=np.int64)]
+        )
+        self.sums = np.vstack([self.sums, np.zeros((added, dim), dtype=np.float32)])
+        self.counts = np.concatenate([self.counts, np.zeros(added, dtype=np.int64)])
+        self.centroids = np.vstack([self.centroids, np.zeros((added, dim), dtype=np.float32)])
+        self._medians = np.concatenate([self._medians, np.zeros(added, dtype=np.float32)])
+        self._spreads = np.concatenate([self._spreads, np.zeros(added, dtype=np.float32)])
+        similarity = np.zeros((size, size), dtype=np.float32)
+        previous = len(self.similarity)
+        similarity[:previous, :previous] = self.similarity
+        self.similarity = similarity
+
+    def update_clusters(
+        self, assignments: List[dict], changed_cluster_ids: Optional[Iterable[int]] = None
+    ) -> None:
+        """
+        Recomputes the clusters in ``changed_cluster_ids`` (all when None)
+        and empties clusters that no longer exist.
+        """
+        present = {
+            item["cluster_id"]: item
+            for item in assignments
+            if "cluster_id" in item and item["cluster_id"] != NOISE_CLUSTER_ID
+        }
+        if changed_cluster_ids is None:
+            changed = set(present) | set(self._slots)
+        else:
+            changed = set(changed_cluster_ids) | (set(self._slots) - set(present))
+        changed.discard(NOISE_CLUSTER_ID)
+        new_ids = sorted(
+            cluster_id for cluster_id in changed if cluster_id in present and cluster_id not in self._slots
+        )
+        if new_ids:
+            self._grow(new_ids)
+        slots = np.array(
+            sorted(self._slots[cluster_id] for cluster_id in changed if cluster_id in self._slots),
+            dtype=np.int64,
+        )
+        if not slots.size:
+            return
+
+        # Clear every changed cluster before refilling, so a face moved
+        # between two changed clusters ends up in its new one.
+        stale = np.isin(self.labels, slots)
+        self.labels[stale] = -1
+        self.distances[stale] = np.nan
+        row_groups = []
+        for slot in slots.tolist():
+            cluster = present.get(int(self.cluster_ids[slot]))
+            face_ids = cluster.get("face_ids", []) if cluster else []
+            rows = self._by_id.rows(face_ids)
+            rows = rows[rows >= 0]
+            self.labels[rows] = slot
+            row_groups.append(rows)
+
+        counts = np.array([len(rows) for rows in row_groups], dtype=np.int64)
+        rows = np.concatenate(row_groups) if row_groups else np.empty(0, dtype=np.int64)
+        self.counts[slots] = counts
+        sums = np.zeros((len(slots), self.sums.shape[1]), dtype=np.float32)
+        filled = counts > 0
+        if rows.size:
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums[filled] = np.add.reduceat(self._unit[rows], starts[filled], axis=0)
+        self.sums[slots] = sums
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        self.centroids[slots] = np.where(norms > 0, sums / np.maximum(norms, 1e-12), 0.0)
+
+        # Only the changed rows and columns of the similarity matrix move.
+        block = self.centroids[slots] @ self.centroids.T
+        self.similarity[slots, :] = block
+        self.similarity[:, slots] = block.T
+
+        if rows.size:
+            self.distances[rows] = 1.0 - np.einsum(
+                "ij,ij->i", self._unit[rows], self.centroids[self.labels[rows]]
+            )
+        offset = 0
+        for slot, count in zip(slots.tolist(), counts.tolist()):
+            values = self.distances[rows[offset : offset + count]]
+            offset += count
+            if count:
+                median = float(np.median(values))
+                self._medians[slot] = median
+                spread = _MAD_SCALE * float(np.median(np.abs(values - median)))
+                self._spreads[slot] = max(spread, MIN_SPREAD)
+            else:
+                self._medians[slot] = 0.0
+                self._spreads[slot] = MIN_SPREAD
+
+    # ------------------------------------------------------------------ #
+    # Suggestions
+    # ------------------------------------------------------------------ #
+    def merge_candidates(
+        self, limit: int = 20, min_similarity: float = MERGE_MIN_SIMILARITY
+    ) -> List[dict]:
+        """Pairs of clusters whose centroids are most alike, most similar first."""
+        active = self.counts > 0
+        upper = np.triu(self.similarity, k=1)
+        upper[~active, :] = 0.0
+        upper[:, ~active] = 0.0
+        first, second = np.nonzero(upper >= min_similarity)
+        if not first.size:
+            return []
+        scores = upper[first, second]
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [
+            {
+                "cluster_ids": [int(self.cluster_ids[first[i]]), int(self.cluster_ids[second[i]])],
+                "similarity": round(float(scores[i]), 4),
+            }
+            for i in order.tolist()
+        ]
+
+    def outliers(self, limit: int = 50, cluster_id: Optional[int] = None) -> List[dict]:
+        """
+        Faces least like the rest of their cluster, highest score first, with
+        the most similar other cluster as a suggested destination.
+        """
+        assigned = self.labels >= 0
+        labels = np.where(assigned, self.labels, 0)
+        if not len(self.counts):
+            return []
+        scores = np.where(
+            assigned, (self.distances - self._medians[labels]) / self._spreads[labels], -np.inf
+        )
+        mask = (
+            assigned
+            & (self.counts[labels] >= OUTLIER_MIN_FACES)
+            & (scores >= OUTLIER_MIN_SCORE)
+            & (self.distances >= OUTLIER_MIN_DISTANCE)
+        )
+        if cluster_id is not None:
+            mask &= labels == self._slots.get(cluster_id, -2)
+        rows = np.flatnonzero(mask)
+        if not rows.size:
+            return []
+        rows = rows[np.argsort(-scores[rows], kind="stable")[:limit]]
+
+        nearest_similarity = self._unit[rows] @ self.centroids.T
+        nearest_similarity[:, self.counts == 0] = -np.inf
+        nearest_similarity[np.arange(len(rows)), self.labels[rows]] = -np.inf
+        nearest = np.argmax(nearest_similarity, axis=1)
+        suggestions = []
+        for position, row in enumerate(rows.tolist()):
+            best = float(nearest_similarity[position, nearest[position]])
+            found = np.isfinite(best)
+            suggestions.append(
+                {
+                    "face_id": int(self._face_ids[row]),
+                    "cluster_id": int(self.cluster_ids[self.labels[row]]),
+                    "distance": round(float(self.distances[row]), 4),
+                    "score": round(float(scores[row]), 2),
+                    "nearest_cluster_id": int(self.cluster_ids[nearest[position]]) if found else None,
+                    "nearest_similarity": round(best, 4) if found else None,
+                }
+            )
+        return suggestions
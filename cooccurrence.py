@@ -0,0 +1,179 @@
+"""
+Photo/person co-occurrence index.
+
+Photos get dense ids in chronological order (photos without a date last),
+so every sorted id list is also a timeline and a date filter is one
+contiguous id range. The index keeps both directions:
+
+* ``photos[i]["cluster_ids"]``: the clusters with a face in photo ``i``;
+* ``cluster_photos[cluster_id]``: the sorted ids of that cluster's photos.
+
+Queries combine people with AND / OR / NOT as boolean masks over photo ids.
+The photo list only changes with the faces cache; gallery edits rebuild just
+the clusters they touched.
+"""
+
+import bisect
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+
+COOCCURRENCE_VERSION = 1
+
+
+class CooccurrenceIndex:
+    def __init__(self, photos: List[dict], cluster_photos: Dict[int, List[int]]):
+        self.photos = photos
+        self.cluster_photos = cluster_photos
+        self._face_photo = {
+            face_id: photo_id
+            for photo_id, photo in enumerate(photos)
+            for face_id in photo["face_ids"]
+        }
+        # Photos are sorted by day, so the dated prefix is searchable by day.
+        self._days = [photo["day"] for photo in photos if photo["day"]]
+
+    # ------------------------------------------------------------------ #
+    # Building and incremental updates
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def build(cls, faces, assignments: List[dict], parse_taken_at) -> "CooccurrenceIndex":
+        """
+        Groups the rows of the ``FaceTable`` ``faces`` into photos and indexes
+        ``assignments``. ``parse_taken_at(value)`` turns a face's ``taken_at``
+        into a datetime (or None).
+        """
+        by_path = {}
+        order = np.argsort(faces.photo_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(faces.photo_ids[order])) + 1
+        for rows in np.split(order, boundaries) if order.size else []:
+            first = int(rows[0])
+            original_path = faces.original_path(first)
+            if not original_path:
+                continue
+            key = os.path.abspath(original_path)
+            photo = by_path.get(key)
+            if photo is None:
+                taken = parse_taken_at(faces.taken_at(first))
+                photo = by_path[key] = {
+                    "path": key,
+                    "day": taken.date().isoformat() if taken else None,
+                    "_order": taken.replace(tzinfo=None) if taken else None,
+                    "face_ids": [],
+                    "cluster_ids": [],
+                }
+            photo["face_ids"].extend(faces.face_ids[rows].tolist())
+
+        photos = sorted(
+            by_path.values(),
+            key=lambda photo: (photo["_order"] is None, photo["_order"] or datetime.min, photo["path"]),
+        )
+        for photo in photos:
+            del photo["_order"]
+            photo["face_ids"].sort()
+        index = cls(photos, {})
+        index.update_clusters(assignments)
+        return index
+
+    def update_clusters(
+        self, assignments: List[dict], changed_cluster_ids: Optional[Iterable[int]] = None
+    ) -> None:
+        """
+        Re-indexes the clusters in ``changed_cluster_ids`` (all when None) and
+        drops clusters that no longer exist.
+        """
+        present = {item["cluster_id"]: item for item in assignments if "cluster_id" in item}
+        if changed_cluster_ids is None:
+            changed = set(present) | set(self.cluster_photos)
+        else:
+            changed = set(changed_cluster_ids) | (set(self.cluster_photos) - set(present))
+
+        for cluster_id in changed:
+            old = set(self.cluster_photos.get(cluster_id, ()))
+            cluster = present.get(cluster_id)
+            new = set()
+            if cluster is not None:
+                for face_id in cluster.get("face_ids", []):
+                    photo_id = self._face_photo.get(face_id)
+                    if photo_id is not None:
+                        new.add(photo_id)
+                self.cluster_photos[cluster_id] = sorted(new)
+            else:
+                self.cluster_photos.pop(cluster_id, None)
+            for photo_id in old - new:
+                self.photos[photo_id]["cluster_ids"].remove(cluster_id)
+            for photo_id in new - old:
+                bisect.insort(self.photos[photo_id]["cluster_ids"], cluster_id)
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def _mask(self, cluster_id: int) -> np.ndarray:
+        mask = np.zeros(len(self.photos), dtype=bool)
+        mask[self.cluster_photos.get(cluster_id, [])] = True
+        return mask
+
+    def date_range(self, start: Optional[str], end: Optional[str]) -> range:
+        """Photo ids whose day lies in ``[start, end]`` (ISO dates, inclusive)."""
+        if not start and not end:
+            return range(len(self.photos))
+        low = bisect.bisect_left(self._days, start) if start else 0
+        high = bisect.bisect_right(self._days, end) if end else len(self._days)
+        return range(low, max(low, high))
+
+    def query(
+        self,
+        all_of: Iterable[int] = (),
+        any_of: Iterable[int] = (),
+        none_of: Iterable[int] = (),
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Sorted (so chronological) ids of photos with every ``all_of`` person,
+        at least one ``any_of`` person when given, no ``none_of`` person, and
+        a date within ``[start, end]`` when either bound is given.
+        """
+        mask = np.zeros(len(self.photos), dtype=bool)
+        window = self.date_range(start, end)
+        mask[window.start : window.stop] = True
+        for cluster_id in all_of:
+            mask &= self._mask(cluster_id)
+        any_of = list(any_of)
+        if any_of:
+            either = np.zeros_like(mask)
+            for cluster_id in any_of:
+                either |= self._mask(cluster_id)
+            mask &= either
+        for cluster_id in none_of:
+            mask &= ~self._mask(cluster_id)
+        return np.flatnonzero(mask).tolist()
+
+    def faces_of(self, photo_id: int, cluster_ids: Optional[Set[int]], face_owner: dict) -> List[int]:
+        """Faces in a photo, limited to ``cluster_ids`` when given."""
+        face_ids = self.photos[photo_id]["face_ids"]
+        if not cluster_ids:
+            return list(face_ids)
+        return [face_id for face_id in face_ids if face_owner.get(face_id) in cluster_ids]
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def to_dict(self) -> dict:
+        return {
+            "version": COOCCURRENCE_VERSION,
+            "photos": self.photos,
+            "cluster_photos": {str(key): value for key, value in self.cluster_photos.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Optional["CooccurrenceIndex"]:
+        if data.get("version") != COOCCURRENCE_VERSION:
+            return None
+        return cls(
+            data["photos"],
+            {int(key): value for key, value in data.get("cluster_photos", {}).items()},
+        )
@@ -0,0 +1,458 @@
+"""
+Compressed embedding indexes for searching many cached faces.
+
+``ExactIndex`` compares a query with every float32 embedding (2 KB per
+512-d face). ``IVFIndex`` first assigns every embedding to the nearest of
+``nlist`` coarse centroids (an inverted file) and stores it compressed:
+
+* ``ivf-sq8``: one byte per dimension from a per-dimension min/max scalar
+  quantiser, 4x smaller than float32;
+* ``ivf-pq``: the residual from the face's centroid, product-quantised into
+  ``subspaces`` one-byte codes (64 bytes for 512-d at the default, 32x
+  smaller).
+
+A query only scans the ``nprobe`` lists nearest to it, ranks their members by
+approximate distance and re-ranks the best ``rerank`` candidates exactly
+against the float32 embeddings (any array, including a memory map).
+Distances are Euclidean, like the rest of the app.
+"""
+
+import json
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+INDEX_KINDS = ("exact", "ivf-sq8", "ivf-pq")
+INDEX_VERSION = 1
+DEFAULT_NPROBE = 16
+DEFAULT_RERANK = 256
+DEFAULT_PQ_SUBSPACES = 64
+PQ_CENTROIDS = 256
+# Fewer faces per list than this makes coarse centroids poorly trained.
+MIN_POINTS_PER_LIST = 39
+TRAIN_POINTS_PER_CENTROID = 64
+PQ_TRAIN_POINTS = PQ_CENTROIDS * 32
+KMEANS_ITERATIONS = 15
+CHUNK_ROWS = 32768
+# Range searches check every candidate whose approximate distance is within
+# this factor of the radius exactly.
+RANGE_SLACK = 1.15
+
+
+def default_nlist(count: int) -> int:
+    """About ``4 * sqrt(count)`` lists, each still holding enough faces to train."""
+    return max(1, min(65536, int(4 * math.sqrt(count)), count // MIN_POINTS_PER_LIST))
+
+
+# ---------------------------------------------------------------------- #
+# Distances and k-means
+# ---------------------------------------------------------------------- #
+def _squared_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors)
+
+
+def _squared_distances(query: np.ndarray, vectors: np.ndarray, norms=None) -> np.ndarray:
+    """``||query - v||^2`` for every row ``v`` (never negative)."""
+    if norms is None:
+        norms = _squared_norms(vectors)
+    distances = norms - 2.0 * (vectors @ query) + float(query @ query)
+    return np.maximum(distances, 0.0, out=distances)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid per row, computed in chunks."""
+    centroid_norms = _squared_norms(centroids)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), CHUNK_ROWS):
+        chunk = np.asarray(vectors[start : start + CHUNK_ROWS], dtype=np.float32)
+        scores = centroid_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        labels[start : start + len(chunk)] = np.argmin(scores, axis=1)
+    return labels
+
+
+def _kmeans(vectors: np.ndarray, k: int, seed: int = 0, iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """Lloyd's k-means seeded from random rows; empty clusters are re-seeded."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        present, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        updated = centroids.copy()
+        updated[present] = sums / counts[:, None]
+        empty = np.setdiff1d(np.arange(k), present)
+        if empty.size:
+            updated[empty] = vectors[rng.choice(len(vectors), empty.size, replace=False)]
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids
+
+
+# ---------------------------------------------------------------------- #
+# Quantisers
+# ---------------------------------------------------------------------- #
+class ScalarQuantizer:
+    """One byte per dimension over the trained per-dimension range."""
+
+    def __init__(self, low: np.ndarray, scale: np.ndarray):
+        self.low = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        low = vectors.min(axis=0)
+        scale = (vectors.max(axis=0) - low) / 255.0
+        scale[scale == 0] = 1.0
+        return cls(low, scale)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((vectors - self.low) / self.scale), 0, 255).astype(np.uint8)
+
+    def decoded_norms(self, codes: np.ndarray) -> np.ndarray:
+        """``||decode(c) - low||^2`` per code, stored so queries skip decoding."""
+        scaled = codes.astype(np.float32) * self.scale
+        return _squared_norms(scaled)
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        """Squared distances from ``query`` to the decoded ``codes``."""
+        shifted = query - self.low
+        return np.maximum(
+            norms - 2.0 * (codes @ (shifted * self.scale)) + float(shifted @ shifted), 0.0
+        )
+
+
+class ProductQuantizer:
+    """Splits vectors into subspaces and stores the nearest of 256 centroids in each."""
+
+    def __init__(self, codebooks: np.ndarray):
+        # (subspaces, centroids, dims per subspace)
+        self.codebooks = codebooks.astype(np.float32)
+        self._codebook_norms = (self.codebooks**2).sum(axis=2)
+        self._offsets = np.arange(self.subspaces, dtype=np.int64) * self.codebooks.shape[1]
+
+    @property
+    def subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, subspaces: int, seed: int = 0) -> "ProductQuantizer":
+        dim = vectors.shape[1]
+        if subspaces <= 0 or dim % subspaces:
+            raise ValueError(f"PQ subspaces must divide the embedding size ({dim}).")
+        width = dim // subspaces
+        centroids = min(PQ_CENTROIDS, len(vectors))
+        codebooks = np.stack(
+            [
+                _kmeans(vectors[:, j * width : (j + 1) * width], centroids, seed=seed + j)
+                for j in range(subspaces)
+            ]
+        )
+        return cls(codebooks)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        width = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = _assign(vectors[:, j * width : (j + 1) * width], self.codebooks[j])
+        return codes
+
+    def query_tables(self, query: np.ndarray) -> np.ndarray:
+        """``||c||^2 - 2 q.c`` per subspace centroid: the part of the tables shared by every list."""
+        slices = query.reshape(self.subspaces, -1, 1)
+        return self._codebook_norms - 2.0 * np.matmul(self.codebooks, slices)[:, :, 0]
+
+    def tables(self, query_tables: np.ndarray, centroid: np.ndarray) -> np.ndarray:
+        """
+        ``||r - c||^2 - ||r||^2`` per subspace centroid for the residual
+        ``r = query - centroid`` of one list.
+        """
+        slices = centroid.reshape(self.subspaces, -1, 1)
+        return query_tables + 2.0 * np.matmul(self.codebooks, slices)[:, :, 0]
+
+    def distances(self, tables: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return tables.ravel()[codes + self._offsets].sum(axis=1)
+
+
+# ---------------------------------------------------------------------- #
+# Indexes
+# ---------------------------------------------------------------------- #
+def _top(rows: np.ndarray, distances: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The ``count`` smallest distances with their rows, nearest first."""
+    if len(distances) > count:
+        keep = np.argpartition(distances, count - 1)[:count]
+        rows, distances = rows[keep], distances[keep]
+    order = np.argsort(distances, kind="stable")
+    return rows[order], distances[order]
+
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self._norms = None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def _all_distances(self, query: np.ndarray) -> np.ndarray:
+        if self._norms is None:
+            self._norms = _squared_norms(np.asarray(self.vectors, dtype=np.float32))
+        return _squared_distances(np.asarray(query, dtype=np.float32), self.vectors, self._norms)
+
+    def search(self, query: np.ndarray, k: int, **_options) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and Euclidean distances of the ``k`` nearest faces."""
+        if not len(self.vectors) or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, distances = _top(np.arange(len(self.vectors)), self._all_distances(query), k)
+        return rows, np.sqrt(distances)
+
+    def range_search(self, query: np.ndarray, radius: float, **_options) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and distances of every face closer than ``radius``, nearest first."""
+        if not len(self.vectors):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        distances = self._all_distances(query)
+        rows = np.flatnonzero(distances < radius * radius)
+        rows, distances = _top(rows, distances[rows], len(rows))
+        return rows, np.sqrt(distances)
+
+
+class IVFIndex:
+    """Inverted lists of compressed embeddings with exact re-ranking."""
+
+    def __init__(
+        self,
+        encoding: str,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        rows: np.ndarray,
+        codes: np.ndarray,
+        quantizer,
+        code_norms: Optional[np.ndarray] = None,
+        vectors: Optional[np.ndarray] = None,
+    ):
+        self.encoding = encoding
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.rows = rows
+        self.codes = codes
+        self.quantizer = quantizer
+        self.code_norms = code_norms
+        self.vectors = vectors
+        self._centroid_norms = _squared_norms(centroids)
+
+    @property
+    def kind(self) -> str:
+        return f"ivf-{self.encoding}"
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the index itself, without the float32 embeddings used for re-ranking."""
+        total = self.centroids.nbytes + self.list_offsets.nbytes + self.rows.nbytes + self.codes.nbytes
+        if self.code_norms is not None:
+            total += self.code_norms.nbytes
+        if isinstance(self.quantizer, ProductQuantizer):
+            total += self.quantizer.codebooks.nbytes
+        else:
+            total += self.quantizer.low.nbytes + self.quantizer.scale.nbytes
+        return int(total)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        encoding: str = "sq8",
+        nlist: Optional[int] = None,
+        subspaces: int = DEFAULT_PQ_SUBSPACES,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Trains the coarse centroids and quantiser on a sample and encodes every row."""
+        if encoding not in ("sq8", "pq"):
+            raise ValueError(f"Unknown IVF encoding: {encoding}")
+        count = len(vectors)
+        if not count:
+            raise ValueError("Cannot build an index without embeddings.")
+        nlist = min(nlist or default_nlist(count), count)
+        rng = np.random.default_rng(seed)
+        sample_size = min(count, max(nlist * TRAIN_POINTS_PER_CENTROID, PQ_CENTROIDS * 40))
+        sample = np.sort(rng.choice(count, sample_size, replace=False))
+        training = np.asarray(vectors[sample], dtype=np.float32)
+
+        centroids = _kmeans(training, nlist, seed=seed)
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1)).astype(np.int64)
+
+        code_norms = None
+        if encoding == "sq8":
+            quantizer = ScalarQuantizer.train(training)
+            codes = np.empty((count, vectors.shape[1]), dtype=np.uint8)
+        else:
+            pq_sample = training[: min(len(training), PQ_TRAIN_POINTS)]
+            residuals = pq_sample - centroids[_assign(pq_sample, centroids)]
+            quantizer = ProductQuantizer.train(residuals, subspaces, seed=seed)
+            codes = np.empty((count, quantizer.subspaces), dtype=np.uint8)
+        for start in range(0, count, CHUNK_ROWS):
+            chunk_rows = order[start : start + CHUNK_ROWS]
+            chunk = np.asarray(vectors[chunk_rows], dtype=np.float32)
+            if encoding == "pq":
+                chunk = chunk - centroids[labels[chunk_rows]]
+            codes[start : start + len(chunk_rows)] = quantizer.encode(chunk)
+        if encoding == "sq8":
+            code_norms = np.concatenate(
+                [quantizer.decoded_norms(codes[start : start + CHUNK_ROWS]) for start in range(0, count, CHUNK_ROWS)]
+            )
+        return cls(encoding, centroids, list_offsets, order.astype(np.int64), codes, quantizer, code_norms, vectors)
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    def _candidates(self, query: np.ndarray, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and approximate squared distances of the faces in the nearest lists."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_distances = _squared_distances(query, self.centroids, self._centroid_norms)
+        probes = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+        rows, distances = [], []
+        if self.encoding == "pq":
+            query_tables = self.quantizer.query_tables(query)
+        for list_id in probes.tolist():
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            codes = self.codes[start:end]
+            if self.encoding == "sq8":
+                approx = self.quantizer.distances(query, codes, self.code_norms[start:end])
+            else:
+                tables = self.quantizer.tables(query_tables, self.centroids[list_id])
+                residual = query - self.centroids[list_id]
+                approx = self.quantizer.distances(tables, codes) + float(residual @ residual)
+            rows.append(self.rows[start:end])
+            distances.append(approx)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(distances).astype(np.float32)
+
+    def _rerank(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self.vectors is None:
+            raise ValueError("Re-ranking needs the float32 embeddings; pass vectors=.")
+        ordered = np.sort(rows)
+        # Sorted reads keep memory-mapped embeddings sequential.
+        exact = _squared_distances(query, np.asarray(self.vectors[ordered], dtype=np.float32))
+        return exact[np.searchsorted(ordered, rows)]
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE, rerank: int = DEFAULT_RERANK
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and Euclidean distances of the ``k`` nearest faces among the
+        ``nprobe`` nearest lists. ``rerank`` = 0 returns approximate
+        distances without touching the float32 embeddings.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        rows, approx = self._candidates(query, nprobe)
+        if not len(rows) or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if rerank <= 0:
+            rows, approx = _top(rows, approx, k)
+            return rows, np.sqrt(approx)
+        rows, _approx = _top(rows, approx, max(k, rerank))
+        rows, exact = _top(rows, self._rerank(query, rows), k)
+        return rows, np.sqrt(exact)
+
+    def range_search(
+        self,
+        query: np.ndarray,
+        radius: float,
+        nprobe: int = DEFAULT_NPROBE,
+        rerank: int = DEFAULT_RERANK,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and exact distances of faces closer than ``radius``, nearest
+        first. Every candidate whose approximate distance is near the radius
+        is checked, and at least the ``rerank`` approximately nearest.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        rows, approx = self._candidates(query, nprobe)
+        near = int(np.count_nonzero(approx < (radius * RANGE_SLACK) ** 2))
+        rows, _approx = _top(rows, approx, max(near, rerank))
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        exact = self._rerank(query, rows)
+        inside = exact < radius * radius
+        rows, exact = _top(rows[inside], exact[inside], int(inside.sum()))
+        return rows, np.sqrt(exact)
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def save(self, path: str, signature=None) -> None:
+        """Writes the index as one ``.npz``; ``signature`` identifies the embeddings it covers."""
+        meta = {"version": INDEX_VERSION, "encoding": self.encoding, "signature": signature}
+        arrays = {
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "rows": self.rows,
+            "codes": self.codes,
+        }
+        if self.encoding == "sq8":
+            arrays.update(low=self.quantizer.low, scale=self.quantizer.scale, code_norms=self.code_norms)
+        else:
+            arrays.update(codebooks=self.quantizer.codebooks)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, signature=None, vectors: Optional[np.ndarray] = None) -> Optional["IVFIndex"]:
+        """The index at ``path``, or None when missing, unreadable or built for other embeddings."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != INDEX_VERSION or meta.get("signature") != signature:
+                    return None
+                if meta["encoding"] == "sq8":
+                    quantizer = ScalarQuantizer(data["low"], data["scale"])
+                    code_norms = data["code_norms"]
+                else:
+                    quantizer = ProductQuantizer(data["codebooks"])
+                    code_norms = None
+                return cls(
+                    meta["encoding"],
+                    data["centroids"],
+                    data["list_offsets"],
+                    data["rows"],
+                    data["codes"],
+                    quantizer,
+                    code_norms,
+                    vectors,
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def build_index(vectors: np.ndarray, kind: str = "exact", **options):
+    """An index of ``kind`` (see ``INDEX_KINDS``) over ``vectors``."""
+    if kind == "exact":
+        return ExactIndex(vectors)
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown embedding index: {kind}. Choose from {', '.join(INDEX_KINDS)}.")
+    return IVFIndex.build(vectors, encoding=kind.split("-", 1)[1], **options)
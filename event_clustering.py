@@ -0,0 +1,196 @@
+"""
+Time-bucketed clustering with same-photo constraints.
+
+Global DBSCAN compares every face with every other and knows nothing about
+where the faces came from. Two facts come for free from the ``FaceTable``:
+
+* faces in the same photo are different people (cannot-link), so two
+  siblings side by side are never put in one cluster;
+* ``taken_at_us`` groups photos into events (a gap of more than
+  ``event_gap_hours`` between consecutive photos starts a new one), and
+  within an event the same person looks much the same.
+
+``cluster_by_events`` first clusters the faces of each event on their own,
+then merges the event clusters across events by their centroids. Both
+passes are single linkage at ``eps`` (like DBSCAN with ``min_samples=2``)
+and skip any merge that would put two faces of one photo together, so the
+pairwise work is per event plus one pass over the far fewer event clusters.
+Faces without a timestamp are grouped in file order. Final clusters smaller
+than ``min_samples`` become noise (-1). Distances are Euclidean, like the
+rest of the app.
+"""
+
+from typing import List, Set, Tuple
+
+import numpy as np
+
+from face_table import NO_TIMESTAMP
+
+
+CLUSTER_MODES = ("global", "events")
+DEFAULT_EVENT_GAP_HOURS = 3.0
+# Longer events are cut at photo boundaries so the within-event distance
+# matrix stays small (2000 x 2000 float32 is 16 MB).
+MAX_EVENT_FACES = 2000
+_MICROSECONDS_PER_HOUR = 3_600_000_000
+
+
+class _ConstrainedUnion:
+    """Union-find whose components remember the photos they hold."""
+
+    def __init__(self, photo_sets: List[Set[int]]):
+        self.parent = list(range(len(photo_sets)))
+        self.photos = photo_sets
+        self.blocked = 0
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first: int, second: int) -> None:
+        """Joins the two components unless they share a photo."""
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        if not self.photos[first].isdisjoint(self.photos[second]):
+            self.blocked += 1
+            return
+        if len(self.photos[first]) < len(self.photos[second]):
+            first, second = second, first
+        self.parent[second] = first
+        self.photos[first] |= self.photos[second]
+        self.photos[second] = set()
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(item) for item in range(len(self.parent))], dtype=np.int64)
+
+
+def _cut_at_photos(rows: np.ndarray, photos: np.ndarray, max_faces: int) -> List[np.ndarray]:
+    """Cuts ``rows`` (grouped by photo) into windows of at most ``max_faces``
+    faces, or one photo when a single photo has more."""
+    photo_starts = np.flatnonzero(np.r_[True, photos[1:] != photos[:-1]]).tolist()
+    windows = []
+    start = 0
+    previous = 0
+    for photo_start in photo_starts[1:] + [len(rows)]:
+        if photo_start - start > max_faces and previous > start:
+            windows.append(rows[start:previous])
+            start = previous
+        previous = photo_start
+    windows.append(rows[start:])
+    return windows
+
+
+def split_events(
+    taken_at_us: np.ndarray,
+    photo_ids: np.ndarray,
+    event_gap_hours: float = DEFAULT_EVENT_GAP_HOURS,
+    max_event_faces: int = MAX_EVENT_FACES,
+) -> List[np.ndarray]:
+    """
+    Rows of each event, in time order. Photos are never split; undated faces
+    come last in file order, cut into windows like an overlong event.
+    """
+    if event_gap_hours <= 0:
+        raise ValueError("Event gap must be greater than 0 hours.")
+    taken_at_us = np.asarray(taken_at_us, dtype=np.int64)
+    photo_ids = np.asarray(photo_ids)
+    if not len(photo_ids):
+        return []
+    dated = taken_at_us != NO_TIMESTAMP
+    order = np.lexsort((photo_ids, taken_at_us, ~dated))
+    times = taken_at_us[order]
+    dated = dated[order]
+
+    gap_us = int(event_gap_hours * _MICROSECONDS_PER_HOUR)
+    new_event = (dated[1:] & dated[:-1] & (times[1:] - times[:-1] > gap_us)) | (
+        dated[1:] != dated[:-1]
+    )
+    events = []
+    for event in np.split(order, np.flatnonzero(new_event) + 1):
+        events.extend(_cut_at_photos(event, photo_ids[event], max_event_faces))
+    return events
+
+
+def _single_linkage_edges(vectors: np.ndarray, eps: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs ``(i, j)``, ``i < j``, within ``eps`` of each other, closest first."""
+    squared = np.einsum("ij,ij->i", vectors, vectors)
+    distances = squared[:, None] + squared[None, :] - 2.0 * (vectors @ vectors.T)
+    first, second = np.nonzero(np.triu(distances <= eps * eps, k=1))
+    order = np.argsort(distances[first, second], kind="stable")
+    return first[order], second[order]
+
+
+def cluster_by_events(
+    embeddings: np.ndarray,
+    photo_ids: np.ndarray,
+    taken_at_us: np.ndarray,
+    eps: float,
+    min_samples: int,
+    event_gap_hours: float = DEFAULT_EVENT_GAP_HOURS,
+) -> Tuple[np.ndarray, dict]:
+    """
+    Returns DBSCAN-style labels (-1 for noise, clusters numbered by their
+    first face) and counts of events, event clusters and blocked merges.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    photo_ids = np.asarray(photo_ids)
+    labels = np.full(len(photo_ids), -1, dtype=np.int64)
+    stats = {"events": 0, "event_clusters": 0, "blocked_merges": 0}
+    if not len(photo_ids):
+        return labels, stats
+    embeddings = embeddings.reshape(len(photo_ids), -1)
+
+    # Pass 1: each event on its own.
+    events = split_events(taken_at_us, photo_ids, event_gap_hours)
+    event_cluster = np.empty(len(photo_ids), dtype=np.int64)
+    centroids = []
+    photo_sets = []
+    for rows in events:
+        union = _ConstrainedUnion([{photo_id} for photo_id in photo_ids[rows].tolist()])
+        for first, second in zip(*_single_linkage_edges(embeddings[rows], eps)):
+            union.union(int(first), int(second))
+        stats["blocked_merges"] += union.blocked
+        roots = union.roots()
+        local_ids, local_labels = np.unique(roots, return_inverse=True)
+        event_cluster[rows] = len(centroids) + local_labels
+        sums = np.zeros((len(local_ids), embeddings.shape[1]), dtype=np.float64)
+        np.add.at(sums, local_labels, embeddings[rows])
+        centroids.extend(sums / np.bincount(local_labels)[:, None])
+        photo_sets.extend(union.photos[root] for root in local_ids.tolist())
+    stats["events"] = len(events)
+    stats["event_clusters"] = len(centroids)
+
+    # Pass 2: event clusters across events, by centroid.
+    centroids = np.asarray(centroids, dtype=np.float32)
+    union = _ConstrainedUnion(photo_sets)
+    neighbours = NearestNeighbors(radius=eps).fit(centroids)
+    distances, indices = neighbours.radius_neighbors(centroids, return_distance=True)
+    counts = np.fromiter((len(row) for row in indices), dtype=np.int64, count=len(indices))
+    if counts.sum():
+        first = np.repeat(np.arange(len(centroids)), counts)
+        second = np.concatenate(indices)
+        distance = np.concatenate(distances)
+        keep = first < second
+        first, second, distance = first[keep], second[keep], distance[keep]
+        for index in np.argsort(distance, kind="stable").tolist():
+            union.union(int(first[index]), int(second[index]))
+    stats["blocked_merges"] += union.blocked
+
+    roots = union.roots()[event_cluster]
+    _, inverse, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+    kept = sizes[inverse] >= min_samples
+    if kept.any():
+        kept_rows = np.flatnonzero(kept)
+        # Number clusters by their first face, as DBSCAN does.
+        first_rows = {}
+        for row, root in zip(kept_rows.tolist(), roots[kept_rows].tolist()):
+            first_rows.setdefault(root, len(first_rows))
+        labels[kept_rows] = [first_rows[root] for root in roots[kept_rows].tolist()]
+    return labels, stats
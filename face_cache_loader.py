@@ -0,0 +1,238 @@
+"""
+Streaming loader for external ``all_faces_data.json`` caches ("Group Existing
+Faces").
+
+The cache is read one face object at a time rather than as one document, and
+embeddings go straight into a single preallocated float32 matrix. Photo paths
+are validated once per unique photo (not once per face) with the ``stat``
+calls spread over a thread pool, and every problem found is collected so the
+caller can report them all at once. The result is a ``FaceTable``.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from face_table import FaceTable, FaceTableBuilder
+from photo_sources import photo_exists, source_root
+
+
+READ_CHUNK_CHARS = 1 << 20
+# A single face object larger than this means the document is malformed.
+MAX_ENTRY_CHARS = 64 << 20
+STAT_WORKERS = 16
+ERROR_EXAMPLES = 3
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(path: str, chunk_chars: int = READ_CHUNK_CHARS) -> Iterator[Tuple[object, int]]:
+    """
+    Yields ``(item, size_in_chars)`` for each element of the top-level JSON
+    array in ``path`` while holding roughly one chunk in memory. Raises
+    ValueError when the file is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as handle:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def refill():
+            nonlocal buffer, pos, eof
+            chunk = handle.read(chunk_chars)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    return ""
+                refill()
+
+        if peek() != "[":
+            raise ValueError("Faces cache must be a JSON list of faces.")
+        pos += 1
+        if peek() == "]":
+            return
+        while True:
+            peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    if eof or len(buffer) - pos > MAX_ENTRY_CHARS:
+                        raise ValueError("Faces cache metadata is not valid JSON.") from None
+                    refill()
+            yield item, end - pos
+            pos = end
+            separator = peek()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError("Faces cache metadata is not valid JSON.")
+            pos += 1
+
+
+class FaceCacheIssues:
+    """Counts and a few examples per validation problem."""
+
+    MESSAGES = {
+        "missing_metadata": "{count} face(s) are missing an id, embedding or photo path",
+        "bad_embedding": "{count} face(s) have an embedding that is not a {dim}-number list",
+        "missing_photo": "{count} face(s) reference {photos} photo file(s) that no longer exist",
+        "outside_scope": "{count} face(s) reference {photos} photo file(s) outside the photo directory",
+    }
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.photos: Dict[str, int] = {}
+        self.examples: Dict[str, List[str]] = {}
+
+    def add(self, reason: str, example, faces: int = 1) -> None:
+        self.counts[reason] = self.counts.get(reason, 0) + faces
+        self.photos[reason] = self.photos.get(reason, 0) + 1
+        examples = self.examples.setdefault(reason, [])
+        if example is not None and len(examples) < ERROR_EXAMPLES:
+            examples.append(str(example))
+
+    def __bool__(self) -> bool:
+        return bool(self.counts)
+
+    def summary(self, dim: Optional[int] = None) -> Optional[str]:
+        """One sentence per problem, in a fixed order, or None when clean."""
+        if not self.counts:
+            return None
+        parts = []
+        for reason, template in self.MESSAGES.items():
+            if reason not in self.counts:
+                continue
+            text = template.format(
+                count=self.counts[reason], photos=self.photos[reason], dim=dim or "fixed-length"
+            )
+            if self.examples.get(reason):
+                text += f" (e.g. {', '.join(self.examples[reason])})"
+            parts.append(text + ".")
+        return " ".join(parts)
+
+
+class LoadedFaceCache:
+    def __init__(self, faces: FaceTable, issues: FaceCacheIssues):
+        self.faces = faces
+        self.issues = issues
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self.faces.embeddings
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.faces.dim or None
+
+    def error_summary(self) -> Optional[str]:
+        return self.issues.summary(self.dim)
+
+
+def _stat_photos(paths: List[str], workers: int) -> Dict[str, bool]:
+    if workers <= 1 or len(paths) <= 1:
+        return {path: photo_exists(path) for path in paths}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cache-stat") as executor:
+        return dict(zip(paths, executor.map(photo_exists, paths)))
+
+
+def _optional_str(value) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+def load_face_cache(
+    cache_file: str, photos_root: str, workers: int = STAT_WORKERS
+) -> LoadedFaceCache:
+    """
+    Streams ``cache_file`` and validates it against ``photos_root``.
+
+    Returns the faces that passed as a ``FaceTable`` together with every
+    issue found. Raises ValueError when the file is not a JSON list.
+    """
+    photos_abs = os.path.abspath(photos_root)
+    issues = FaceCacheIssues()
+    builder = None
+    abs_paths: Dict[str, str] = {}
+
+    for entry, size in iter_json_array(cache_file):
+        if not isinstance(entry, dict):
+            issues.add("missing_metadata", None)
+            continue
+        face_id = entry.get("face_id")
+        embedding = entry.get("embedding")
+        original_path = entry.get("original_path")
+        if face_id is None or embedding is None or not isinstance(original_path, str):
+            issues.add("missing_metadata", face_id)
+            continue
+        try:
+            face_id = int(face_id)
+        except (TypeError, ValueError):
+            issues.add("missing_metadata", face_id)
+            continue
+        if not isinstance(embedding, list) or not embedding:
+            issues.add("bad_embedding", face_id)
+            continue
+
+        if builder is None:
+            # The first entry's size is a good estimate of every entry's.
+            capacity = os.path.getsize(cache_file) // max(size, 1) + 16
+            builder = FaceTableBuilder(dim=len(embedding), capacity=capacity)
+        original_abs = abs_paths.get(original_path)
+        if original_abs is None:
+            original_abs = abs_paths[original_path] = os.path.abspath(original_path)
+        try:
+            builder.append(
+                face_id,
+                original_abs,
+                _optional_str(entry.get("face_image_path")),
+                _optional_str(entry.get("taken_at")),
+                _optional_str(entry.get("timestamp_source")),
+                embedding=embedding,
+                face_image_url=_optional_str(entry.get("face_image_url")),
+            )
+        except (TypeError, ValueError):
+            issues.add("bad_embedding", face_id)
+
+    if builder is None:
+        return LoadedFaceCache(FaceTable.empty(), issues)
+    faces = builder.build()
+
+    # Each unique photo is checked once, however many faces it holds.
+    faces_per_photo = np.bincount(faces.photo_ids, minlength=len(faces.photo_paths))
+    in_scope = np.zeros(len(faces.photo_paths), dtype=bool)
+    for photo_id, path in enumerate(faces.photo_paths):
+        try:
+            # Photos inside an archive are in scope when the archive is.
+            relative = os.path.relpath(source_root(path), photos_abs)
+        except ValueError:
+            relative = None
+        in_scope[photo_id] = bool(relative) and not relative.startswith("..")
+    scoped = [path for path, ok in zip(faces.photo_paths, in_scope) if ok]
+    exists = _stat_photos(scoped, workers)
+    usable = np.zeros(len(faces.photo_paths), dtype=bool)
+    for photo_id, path in enumerate(faces.photo_paths):
+        count = int(faces_per_photo[photo_id])
+        if not in_scope[photo_id]:
+            issues.add("outside_scope", path, faces=count)
+        elif not exists[path]:
+            issues.add("missing_photo", path, faces=count)
+        else:
+            usable[photo_id] = True
+
+    keep = usable[faces.photo_ids]
+    if not keep.all():
+        faces = faces.take(keep)
+    return LoadedFaceCache(faces, issues)
@@ -0,0 +1,249 @@
+"""
+Detector resolution policies for face extraction.
+
+``fixed`` runs the detector once at ``det_size`` (640 matches earlier
+releases). ``adaptive`` starts with a cheap low-resolution pass and only
+escalates when the image is large or that pass finds faces that are small or
+low-confidence (or none at all in an image bigger than ``det_size``).
+Escalation adds one pass at ``det_size`` or, for images more than twice that
+size, an overlapping tile pass so small faces in group shots are seen at a
+higher effective resolution. Faces too big for a tile were already found by
+the low-resolution pass.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+
+DETECTION_MODES = ("fixed", "adaptive")
+DEFAULT_DET_SIZE = 640
+MIN_DET_SIZE = 160
+MAX_DET_SIZE = 2048
+# SCRFD's largest feature stride; input sizes must be a multiple of it.
+DET_SIZE_STEP = 32
+NMS_IOU_THRESHOLD = 0.4
+# A box mostly inside a stronger one is the same face seen partially.
+NMS_CONTAINMENT_THRESHOLD = 0.8
+
+DETECTION_PASSES = metrics.REGISTRY.register(
+    metrics.Counter(
+        "photo_detection_passes_total",
+        "Detector runs by scale (low_res, full, tile).",
+        ("scale",),
+    )
+)
+DETECTION_ESCALATIONS = metrics.REGISTRY.register(
+    metrics.Counter(
+        "photo_detection_escalations_total",
+        "Images escalated past the low-resolution pass, by first matching reason.",
+        ("reason",),
+    )
+)
+
+
+class DetectionSettings:
+    """Per-job detector policy. Plain attributes so it pickles to the inference worker."""
+
+    def __init__(
+        self,
+        mode: str = "fixed",
+        det_size: int = DEFAULT_DET_SIZE,
+        low_res_size: int = 320,
+        small_face_px: int = 24,
+        min_confident_score: float = 0.65,
+        large_image_px: int = 2000,
+        tile_grid: int = 2,
+        tile_overlap: float = 0.2,
+    ):
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Detection mode must be one of {', '.join(DETECTION_MODES)}.")
+        for name, size in (("Detector size", det_size), ("Low-resolution size", low_res_size)):
+            if not MIN_DET_SIZE <= size <= MAX_DET_SIZE or size % DET_SIZE_STEP:
+                raise ValueError(
+                    f"{name} must be a multiple of {DET_SIZE_STEP} "
+                    f"between {MIN_DET_SIZE} and {MAX_DET_SIZE}."
+                )
+        if low_res_size > det_size:
+            raise ValueError("Low-resolution size cannot exceed the detector size.")
+        if tile_grid < 1 or not 0 <= tile_overlap < 0.5:
+            raise ValueError("Tile grid must be >= 1 and tile overlap in [0, 0.5).")
+        self.mode = mode
+        self.det_size = int(det_size)
+        self.low_res_size = int(low_res_size)
+        self.small_face_px = small_face_px
+        self.min_confident_score = min_confident_score
+        self.large_image_px = large_image_px
+        self.tile_grid = int(tile_grid)
+        self.tile_overlap = tile_overlap
+
+    @property
+    def is_default(self) -> bool:
+        """True when detection behaves exactly like ``FaceAnalysis.get``."""
+        return self.mode == "fixed" and self.det_size == DEFAULT_DET_SIZE
+
+    def describe(self) -> dict:
+        return {"mode": self.mode, "det_size": self.det_size}
+
+
+def _nms(
+    bboxes: np.ndarray,
+    threshold: float = NMS_IOU_THRESHOLD,
+    containment: float = NMS_CONTAINMENT_THRESHOLD,
+) -> List[int]:
+    """Indices of ``bboxes`` rows (x1, y1, x2, y2, score) kept by greedy NMS."""
+    if len(bboxes) == 0:
+        return []
+    x1, y1, x2, y2, scores = bboxes.T
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1 + 1) * np.maximum(0.0, yy2 - yy1 + 1)
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+        contained = inter / areas[order[1:]]
+        order = order[1:][(iou <= threshold) & (contained <= containment)]
+    return keep
+
+
+def _tile_origins(length: int, tiles: int, overlap: float) -> Tuple[int, List[int]]:
+    """Tile side and start offsets covering ``length`` with ``tiles`` overlapping tiles."""
+    if tiles <= 1:
+        return length, [0]
+    side = int(np.ceil(length / (tiles - (tiles - 1) * overlap)))
+    step = (length - side) / (tiles - 1)
+    return side, [int(round(step * index)) for index in range(tiles)]
+
+
+def _run_pass(det_model, img, size: int, scale: str):
+    DETECTION_PASSES.inc(scale=scale)
+    bboxes, kpss = det_model.detect(img, input_size=(size, size), max_num=0)
+    return bboxes, kpss
+
+
+def _escalation_reason(bboxes, image_side: int, settings: DetectionSettings) -> Optional[str]:
+    if image_side > settings.large_image_px:
+        return "large_image"
+    if len(bboxes) == 0:
+        # Nothing at low resolution in an image bigger than the detector
+        # input usually means the faces were too small to register.
+        return "no_faces" if image_side > settings.det_size else None
+    # Face side as the low-resolution detector saw it.
+    scale = settings.low_res_size / float(image_side)
+    face_sides = np.minimum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1]) * scale
+    if face_sides.min() < settings.small_face_px:
+        return "small_face"
+    if bboxes[:, 4].min() < settings.min_confident_score:
+        return "low_confidence"
+    return None
+
+
+def detect_boxes(det_model, img: np.ndarray, settings: DetectionSettings):
+    """
+    Runs the detector passes chosen by ``settings`` and returns merged
+    ``(bboxes, kpss)`` in original image coordinates.
+    """
+    if settings.mode == "fixed":
+        return _run_pass(det_model, img, settings.det_size, "full")
+
+    height, width = img.shape[:2]
+    image_side = max(height, width)
+    bboxes, kpss = _run_pass(det_model, img, settings.low_res_size, "low_res")
+    reason = _escalation_reason(bboxes, image_side, settings)
+    if reason is None:
+        return bboxes, kpss
+    DETECTION_ESCALATIONS.inc(reason=reason)
+
+    box_parts = [bboxes]
+    kps_parts = [kpss]
+    if image_side <= settings.det_size * 2 or settings.tile_grid == 1:
+        full_boxes, full_kps = _run_pass(det_model, img, settings.det_size, "full")
+        box_parts.append(full_boxes)
+        kps_parts.append(full_kps)
+    else:
+        tile_h, rows = _tile_origins(height, settings.tile_grid, settings.tile_overlap)
+        tile_w, cols = _tile_origins(width, settings.tile_grid, settings.tile_overlap)
+        for y0 in rows:
+            for x0 in cols:
+                tile = img[y0 : y0 + tile_h, x0 : x0 + tile_w]
+                tile_boxes, tile_kps = _run_pass(det_model, tile, settings.det_size, "tile")
+                if len(tile_boxes) == 0:
+                    continue
+                # Faces cut by an inner tile edge lie whole in the neighbouring
+                # tile (or were big enough for the low-resolution pass).
+                keep = np.ones(len(tile_boxes), dtype=bool)
+                if x0 > 0:
+                    keep &= tile_boxes[:, 0] > 2
+                if y0 > 0:
+                    keep &= tile_boxes[:, 1] > 2
+                if x0 + tile_w < width:
+                    keep &= tile_boxes[:, 2] < tile.shape[1] - 2
+                if y0 + tile_h < height:
+                    keep &= tile_boxes[:, 3] < tile.shape[0] - 2
+                tile_boxes = tile_boxes[keep].copy()
+                tile_boxes[:, [0, 2]] += x0
+                tile_boxes[:, [1, 3]] += y0
+                if tile_kps is not None:
+                    tile_kps = tile_kps[keep].copy()
+                    tile_kps[:, :, 0] += x0
+                    tile_kps[:, :, 1] += y0
+                box_parts.append(tile_boxes)
+                kps_parts.append(tile_kps)
+
+    merged_boxes = np.concatenate([part.reshape(-1, 5) for part in box_parts], axis=0)
+    if any(part is None for part in kps_parts):
+        merged_kps = None
+    else:
+        merged_kps = np.concatenate([part.reshape(-1, 5, 2) for part in kps_parts], axis=0)
+    keep = _nms(merged_boxes)
+    return merged_boxes[keep], None if merged_kps is None else merged_kps[keep]
+
+
+def detect_faces(
+    face_app, img: np.ndarray, settings: DetectionSettings, gate=None, embed: bool = True
+) -> list:
+    """
+    ``FaceAnalysis.get`` with the detector policy from ``settings``: detection
+    passes first, then every per-face model (embedding, attributes) once per
+    merged face.
+
+    ``gate(face)`` returning False drops a face. Locally it runs after the
+    landmark and attribute models but before recognition, so rejected faces
+    are never embedded; with remote inference it filters the returned faces.
+    ``embed=False`` skips the local recognition model so the caller can
+    embed the faces in batches.
+    """
+    if not hasattr(face_app, "det_model"):
+        # Remote inference: the worker applies the same policy.
+        faces = face_app.get(img, detection=settings)
+        return faces if gate is None else [face for face in faces if gate(face)]
+
+    from insightface.app.common import Face
+
+    bboxes, kpss = detect_boxes(face_app.det_model, img, settings)
+    faces = []
+    for index in range(bboxes.shape[0]):
+        face = Face(
+            bbox=bboxes[index, 0:4],
+            kps=None if kpss is None else kpss[index],
+            det_score=bboxes[index, 4],
+        )
+        for taskname, model in face_app.models.items():
+            if taskname in ("detection", "recognition"):
+                continue
+            model.get(img, face)
+        if gate is not None and not gate(face):
+            continue
+        recognition = face_app.models.get("recognition")
+        if embed and recognition is not None:
+            recognition.get(img, face)
+        faces.append(face)
+    return faces
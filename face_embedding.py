@@ -0,0 +1,111 @@
+"""
+Batched face recognition across images.
+
+``FaceAnalysis.get`` embeds each face with its own ONNX Runtime call, so the
+recognition model only ever sees a batch of one. In batched extraction faces
+are detected image by image, their aligned chips are queued, and
+``RecognitionBatcher`` embeds the queue in large ``get_feat`` calls; each
+embedding is handed back to the face it came from.
+"""
+
+from contextlib import nullcontext
+from typing import Callable, ContextManager, List, Optional
+
+import numpy as np
+
+import metrics
+
+
+DEFAULT_RECOGNITION_BATCH = 64
+MAX_RECOGNITION_BATCH = 1024
+
+RECOGNITION_BATCH_SIZE = metrics.REGISTRY.register(
+    metrics.Histogram(
+        "photo_recognition_batch_size",
+        "Face chips embedded per recognition model call in batched extraction.",
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+    )
+)
+
+
+def recognition_model(face_app):
+    """The local recognition model of ``face_app``, or None (remote inference)."""
+    models = getattr(face_app, "models", None)
+    if not models:
+        return None
+    return models.get("recognition")
+
+
+def supports_batching(rec_model) -> bool:
+    """True when the model's batch dimension is dynamic and ``get_feat`` exists."""
+    if rec_model is None or not hasattr(rec_model, "get_feat"):
+        return False
+    batch_dim = (getattr(rec_model, "input_shape", None) or [None])[0]
+    return not isinstance(batch_dim, int) or batch_dim <= 0
+
+
+def align_chip(rec_model, img: np.ndarray, face) -> np.ndarray:
+    """The aligned crop ``rec_model.get`` would embed for ``face``."""
+    from insightface.utils import face_align
+
+    return face_align.norm_crop(img, landmark=face.kps, image_size=rec_model.input_size[0])
+
+
+def embed_chips(rec_model, chips: List[np.ndarray], batch_size: int) -> np.ndarray:
+    """Embeds ``chips`` ``batch_size`` at a time; rows follow ``chips`` order."""
+    rows = []
+    for start in range(0, len(chips), batch_size):
+        batch = chips[start : start + batch_size]
+        RECOGNITION_BATCH_SIZE.observe(len(batch))
+        with metrics.time_stage("embedding"):
+            rows.append(np.asarray(rec_model.get_feat(batch), dtype=np.float32).reshape(len(batch), -1))
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(rows, axis=0)
+
+
+class RecognitionBatcher:
+    """
+    Queues aligned chips and embeds them ``batch_size`` at a time.
+
+    ``add(chip, deliver)`` calls ``deliver(embedding)`` once the chip's batch
+    has run; ``flush()`` runs whatever is still queued. ``slot()``, when
+    given, is entered around each flush (an ``InferenceScheduler`` slot).
+    """
+
+    def __init__(
+        self,
+        rec_model,
+        batch_size: int = DEFAULT_RECOGNITION_BATCH,
+        slot: Optional[Callable[[], ContextManager]] = None,
+    ):
+        if not 1 <= batch_size <= MAX_RECOGNITION_BATCH:
+            raise ValueError(
+                f"Recognition batch size must be between 1 and {MAX_RECOGNITION_BATCH}."
+            )
+        self.rec_model = rec_model
+        self.batch_size = batch_size
+        self.slot = slot or nullcontext
+        self._chips: List[np.ndarray] = []
+        self._deliveries: List[Callable[[np.ndarray], None]] = []
+        self.calls = 0
+        self.embedded = 0
+
+    def add(self, chip: np.ndarray, deliver: Callable[[np.ndarray], None]) -> None:
+        self._chips.append(chip)
+        self._deliveries.append(deliver)
+        if len(self._chips) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> Optional[int]:
+        if not self._chips:
+            return None
+        chips, deliveries = self._chips, self._deliveries
+        self._chips, self._deliveries = [], []
+        with self.slot():
+            embeddings = embed_chips(self.rec_model, chips, self.batch_size)
+        for deliver, embedding in zip(deliveries, embeddings):
+            deliver(embedding)
+        self.calls += 1
+        self.embedded += len(chips)
+        return len(chips)
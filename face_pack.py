@@ -0,0 +1,265 @@
+"""
+Packed face-crop storage and per-cluster sprite sheets.
+
+Extraction used to write one small ``face_<digest>.jpg`` per face, so large
+libraries ended up with hundreds of thousands of files. ``FacePack`` appends
+the JPEG bytes to a single ``faces.pack`` instead and ``faces.idx`` records
+``<digest> <offset> <length>`` per crop. Crops keep their content digest, so
+face records and ``/output_albums/.cache/faces/face_<digest>.jpg`` URLs are
+unchanged; the server reads the crop's byte range out of the pack.
+
+Sprite sheets tile the crops of one gallery page into a single JPEG so a
+cluster's faces load in one request.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+from file_lock import exclusive_lock
+
+
+PACK_FILENAME = "faces.pack"
+INDEX_FILENAME = "faces.idx"
+# Rewrite the pack once this share of its bytes belongs to unreferenced crops.
+COMPACT_DEAD_RATIO = 0.25
+SPRITE_TILE_PX = 120
+SPRITE_MAX_COLUMNS = 16
+SPRITE_JPEG_QUALITY = 85
+SPRITE_KEY_LENGTH = 16
+_MISSING_TILE_COLOR = (235, 235, 235)
+
+PACK_COMPACTIONS = metrics.REGISTRY.register(
+    metrics.Counter(
+        "photo_face_pack_compactions_total",
+        "Face-crop packs rewritten to drop crops no face references.",
+    )
+)
+
+
+def _digest_matches(digest: str, data: bytes) -> bool:
+    return hashlib.sha256(data).hexdigest()[: len(digest)] == digest
+
+
+class FacePack:
+    """
+    Append-only crop store of one library. Appends are locked across
+    processes; readers pick up new index lines incrementally.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pack_path = os.path.join(directory, PACK_FILENAME)
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        # (inode, bytes of the index file already parsed)
+        self._index_state = (None, 0)
+
+    # ------------------------------------------------------------------ #
+    # Index
+    # ------------------------------------------------------------------ #
+    def _refresh(self, force: bool = False) -> None:
+        """Parses index lines appended since the last call (all of them after a compaction)."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._index, self._index_state = {}, (None, 0)
+            return
+        inode, parsed = self._index_state
+        if force or inode != stat.st_ino or stat.st_size < parsed:
+            index, parsed = {}, 0
+        elif stat.st_size == parsed:
+            return
+        else:
+            index = dict(self._index)
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(parsed)
+            chunk = index_file.read()
+        # A writer may be mid-line; leave the partial line for the next call.
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            parts = line.split()
+            if len(parts) == 3:
+                index[parts[0].decode("ascii")] = (int(parts[1]), int(parts[2]))
+        self._index = index
+        self._index_state = (stat.st_ino, parsed + len(complete))
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return digest in self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def locate(self, digest: str) -> Optional[Tuple[int, int]]:
+        """``(offset, length)`` of a crop in the pack, or None."""
+        with self._lock:
+            self._refresh()
+            return self._index.get(digest)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            live = sum(length for _offset, length in self._index.values())
+        try:
+            size = os.path.getsize(self.pack_path)
+        except FileNotFoundError:
+            size = 0
+        return {"crops": len(self._index), "pack_bytes": size, "dead_bytes": max(0, size - live)}
+
+    # ------------------------------------------------------------------ #
+    # Writing
+    # ------------------------------------------------------------------ #
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return exclusive_lock(os.path.join(self.directory, f"{PACK_FILENAME}.lock"))
+
+    def append(self, digest: str, data: bytes) -> bool:
+        """Appends a crop unless the pack already holds it; True when written."""
+        with self._lock:
+            self._refresh()
+            if digest in self._index:
+                return False
+            with self._locked():
+                self._refresh()
+                if digest in self._index:
+                    return False
+                with open(self.pack_path, "ab") as pack_file:
+                    offset = pack_file.seek(0, os.SEEK_END)
+                    pack_file.write(data)
+                with open(self.index_path, "ab") as index_file:
+                    index_file.write(f"{digest} {offset} {len(data)}\n".encode("ascii"))
+                self._refresh()
+            return True
+
+    def compact(self, keep: Iterable[str]) -> int:
+        """
+        Rewrites the pack with only the ``keep`` digests once enough of it is
+        dead. Returns the bytes reclaimed (0 when the pack was left alone).
+        """
+        keep = set(keep)
+        with self._lock, self._locked():
+            self._refresh(force=True)
+            try:
+                size = os.path.getsize(self.pack_path)
+            except FileNotFoundError:
+                return 0
+            live = {digest: entry for digest, entry in self._index.items() if digest in keep}
+            live_bytes = sum(length for _offset, length in live.values())
+            if size == 0 or (size - live_bytes) < COMPACT_DEAD_RATIO * size:
+                return 0
+
+            pack_temp = f"{self.pack_path}.{os.getpid()}.tmp"
+            index_temp = f"{self.index_path}.{os.getpid()}.tmp"
+            offset = 0
+            with open(self.pack_path, "rb") as source, open(pack_temp, "wb") as pack_file, open(
+                index_temp, "wb"
+            ) as index_file:
+                for digest, (old_offset, length) in sorted(live.items(), key=lambda item: item[1][0]):
+                    source.seek(old_offset)
+                    data = source.read(length)
+                    pack_file.write(data)
+                    index_file.write(f"{digest} {offset} {length}\n".encode("ascii"))
+                    offset += length
+            # Readers holding the old index notice the digest mismatch and reload.
+            os.replace(pack_temp, self.pack_path)
+            os.replace(index_temp, self.index_path)
+            self._refresh(force=True)
+        PACK_COMPACTIONS.inc()
+        return size - offset
+
+    # ------------------------------------------------------------------ #
+    # Reading
+    # ------------------------------------------------------------------ #
+    def read_many(self, digests: Iterable[str]) -> Dict[str, bytes]:
+        """The crops of ``digests`` that the pack holds, read with one open file."""
+        digests = list(digests)
+        found = {}
+        for attempt in range(2):
+            with self._lock:
+                self._refresh(force=attempt > 0)
+                ranges = [(digest, self._index.get(digest)) for digest in digests]
+            stale = []
+            try:
+                # The handle is private to this call, so seeking needs no lock.
+                with open(self.pack_path, "rb") as pack_file:
+                    for digest, entry in ranges:
+                        if entry is None:
+                            continue
+                        pack_file.seek(entry[0])
+                        data = pack_file.read(entry[1])
+                        if _digest_matches(digest, data):
+                            found[digest] = data
+                        else:
+                            stale.append(digest)
+            except FileNotFoundError:
+                return found
+            if not stale:
+                break
+            # The pack was compacted after the index was read; reload once.
+            digests = stale
+        return found
+
+    def read(self, digest: str) -> Optional[bytes]:
+        return self.read_many([digest]).get(digest)
+
+
+# ---------------------------------------------------------------------- #
+# Sprite sheets
+# ---------------------------------------------------------------------- #
+def sprite_layout(count: int) -> Tuple[int, int]:
+    """``(columns, rows)`` of a sprite holding ``count`` tiles."""
+    columns = max(1, min(SPRITE_MAX_COLUMNS, count))
+    return columns, max(1, math.ceil(count / columns))
+
+
+def sprite_key(crop_names: List[str], tile_px: int = SPRITE_TILE_PX) -> str:
+    """Content key of a sprite: changes whenever its crops or their order do."""
+    digest = hashlib.sha256(f"{tile_px}\n".encode("utf-8"))
+    for name in crop_names:
+        digest.update(name.encode("utf-8") + b"\n")
+    return digest.hexdigest()[:SPRITE_KEY_LENGTH]
+
+
+def _fit_tile(img: np.ndarray, tile_px: int) -> np.ndarray:
+    """Centre-crops to a square and resizes, like ``object-fit: cover``."""
+    height, width = img.shape[:2]
+    side = min(height, width)
+    top, left = (height - side) // 2, (width - side) // 2
+    square = img[top : top + side, left : left + side]
+    interpolation = cv2.INTER_AREA if side > tile_px else cv2.INTER_LINEAR
+    return cv2.resize(square, (tile_px, tile_px), interpolation=interpolation)
+
+
+def render_sprite(crops: List[Optional[bytes]], tile_px: int = SPRITE_TILE_PX) -> bytes:
+    """
+    Tiles JPEG ``crops`` row by row into one JPEG; missing or unreadable
+    crops leave a blank tile so indices still line up.
+    """
+    columns, rows = sprite_layout(len(crops))
+    sheet = np.empty((rows * tile_px, columns * tile_px, 3), dtype=np.uint8)
+    sheet[:] = _MISSING_TILE_COLOR
+    for index, data in enumerate(crops):
+        if not data:
+            continue
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None or not img.size:
+            continue
+        row, column = divmod(index, columns)
+        sheet[row * tile_px : (row + 1) * tile_px, column * tile_px : (column + 1) * tile_px] = _fit_tile(
+            img, tile_px
+        )
+    success, encoded = cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, SPRITE_JPEG_QUALITY])
+    if not success:
+        raise ValueError("Could not encode sprite sheet as JPEG.")
+    return encoded.tobytes()
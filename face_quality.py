@@ -0,0 +1,153 @@
+"""
+Quality gates applied to detected faces before they are embedded and cropped.
+
+Tiny background faces, heavy blur, weak detections and near-profile poses
+rarely cluster with anyone and mostly end up as "Unidentified" noise. A face
+failing any gate gets no crop and no embedding; it is counted per reason and,
+when requested, recorded in a side table so the decision can be reviewed.
+
+Checks run cheapest first: box size, detector score, pose, then sharpness
+(variance of the Laplacian on the crop resized to the recognition input).
+Pose comes from InsightFace's 3D landmark model when the pack has one and is
+otherwise estimated (yaw only) from the five detector keypoints.
+"""
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+
+
+QUALITY_MODES = ("standard", "off")
+# ArcFace input side; sharpness is measured at this size so it is comparable
+# across face sizes.
+SHARPNESS_SIDE = 112
+
+FACES_REJECTED = metrics.REGISTRY.register(
+    metrics.Counter(
+        "photo_faces_rejected_total",
+        "Detected faces dropped by the quality gates, by first failing check.",
+        ("reason",),
+    )
+)
+
+
+class QualitySettings:
+    """Per-job quality thresholds; 0 disables a check. Plain attributes so it pickles."""
+
+    def __init__(
+        self,
+        min_face_px: int = 32,
+        min_det_score: float = 0.6,
+        min_sharpness: float = 25.0,
+        max_yaw_deg: float = 60.0,
+        max_pitch_deg: float = 50.0,
+        keep_rejected: bool = False,
+    ):
+        if min_face_px < 0 or min_sharpness < 0:
+            raise ValueError("Minimum face size and sharpness cannot be negative.")
+        if not 0 <= min_det_score <= 1:
+            raise ValueError("Minimum detection score must be between 0 and 1.")
+        if not 0 <= max_yaw_deg <= 90 or not 0 <= max_pitch_deg <= 90:
+            raise ValueError("Maximum yaw and pitch must be between 0 and 90 degrees.")
+        self.min_face_px = int(min_face_px)
+        self.min_det_score = float(min_det_score)
+        self.min_sharpness = float(min_sharpness)
+        self.max_yaw_deg = float(max_yaw_deg)
+        self.max_pitch_deg = float(max_pitch_deg)
+        self.keep_rejected = keep_rejected
+
+    @classmethod
+    def for_mode(cls, mode: str, keep_rejected: bool = False) -> "QualitySettings":
+        """``standard`` thresholds, or ``off`` to keep every detected face."""
+        if mode not in QUALITY_MODES:
+            raise ValueError(f"Quality mode must be one of {', '.join(QUALITY_MODES)}.")
+        if mode == "off":
+            return cls(0, 0.0, 0.0, 0.0, 0.0, keep_rejected=keep_rejected)
+        return cls(keep_rejected=keep_rejected)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.min_face_px
+            or self.min_det_score
+            or self.min_sharpness
+            or self.max_yaw_deg
+            or self.max_pitch_deg
+        )
+
+    def describe(self) -> dict:
+        return {
+            "min_face_px": self.min_face_px,
+            "min_det_score": self.min_det_score,
+            "min_sharpness": self.min_sharpness,
+            "max_yaw_deg": self.max_yaw_deg,
+            "max_pitch_deg": self.max_pitch_deg,
+        }
+
+
+def face_sharpness(img: np.ndarray, bbox) -> float:
+    """Variance of the Laplacian of the face crop at ``SHARPNESS_SIDE`` pixels."""
+    height, width = img.shape[:2]
+    x1, y1, x2, y2 = np.asarray(bbox, dtype=float)
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(width, int(x2)), min(height, int(y2))
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+    crop = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    crop = cv2.resize(crop, (SHARPNESS_SIDE, SHARPNESS_SIDE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def estimate_pose(face) -> Tuple[Optional[float], Optional[float]]:
+    """``(yaw, pitch)`` in degrees, either unknown (None) when it cannot be estimated."""
+    pose = getattr(face, "pose", None)
+    if pose is not None:
+        pitch, yaw = float(pose[0]), float(pose[1])
+        return yaw, pitch
+    kps = getattr(face, "kps", None)
+    if kps is None:
+        return None, None
+    # Five-point keypoints: eyes, nose, mouth corners. The nose drifts
+    # towards one eye as the head turns.
+    left_eye, right_eye, nose = kps[0], kps[1], kps[2]
+    half_span = abs(float(right_eye[0] - left_eye[0])) / 2.0
+    if half_span < 1e-6:
+        return 90.0, None
+    offset = (float(nose[0]) - (float(left_eye[0]) + float(right_eye[0])) / 2.0) / half_span
+    return float(np.degrees(np.arcsin(np.clip(offset, -1.0, 1.0)))), None
+
+
+def check_face(face, img: np.ndarray, settings: QualitySettings) -> Tuple[Optional[str], dict]:
+    """
+    Returns ``(reason, measurements)``; ``reason`` is None when the face passes
+    and otherwise names the first failing check.
+    """
+    x1, y1, x2, y2 = (float(value) for value in face.bbox[:4])
+    measurements = {
+        "face_px": round(min(x2 - x1, y2 - y1), 1),
+        "det_score": round(float(face.det_score), 4),
+    }
+    if settings.min_face_px and measurements["face_px"] < settings.min_face_px:
+        return "too_small", measurements
+    if settings.min_det_score and measurements["det_score"] < settings.min_det_score:
+        return "low_score", measurements
+
+    if settings.max_yaw_deg or settings.max_pitch_deg:
+        yaw, pitch = estimate_pose(face)
+        if yaw is not None:
+            measurements["yaw"] = round(yaw, 1)
+            if settings.max_yaw_deg and abs(yaw) > settings.max_yaw_deg:
+                return "pose", measurements
+        if pitch is not None:
+            measurements["pitch"] = round(pitch, 1)
+            if settings.max_pitch_deg and abs(pitch) > settings.max_pitch_deg:
+                return "pose", measurements
+
+    if settings.min_sharpness:
+        measurements["sharpness"] = round(face_sharpness(img, face.bbox), 1)
+        if measurements["sharpness"] < settings.min_sharpness:
+            return "blurry", measurements
+    return None, measurements
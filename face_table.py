@@ -0,0 +1,532 @@
+"""
+Columnar in-memory table of faces.
+
+Faces used to travel between ``PhotoProcessor`` and the routes as one dict
+per face, each with its own strings and its own small embedding array. A
+``FaceTable`` keeps them as columns instead:
+
+* ``face_ids`` (int64) and ``embeddings`` (float32, ``(n, dim)``, contiguous);
+* ``photo_ids`` (int32) into ``photo_paths``, one interned string per photo;
+* ``crop_dir_ids`` (int32) into ``crop_dirs`` plus fixed-width ``crop_names``;
+* ``taken_at_us`` (int64 wall-clock microseconds since 1970, ``NO_TIMESTAMP``
+  when unknown) with ``utc_offsets_min`` (int16, ``NAIVE_OFFSET`` for EXIF
+  times without a zone) and ``source_ids`` (int16) into ``sources``.
+
+``table[i]`` and ``table.by_id[face_id]`` return ``FaceRow`` views that read
+like the old face dicts (``row["original_path"]``, ``row.get("taken_at")``,
+``row.face_image_url`` in templates) without materialising them.
+
+``all_faces_data.json`` keeps its format. ``save`` also writes a ``.npz``
+sidecar holding the columns, so the next ``load`` skips JSON parsing.
+"""
+
+import json
+import os
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+NO_TIMESTAMP = np.iinfo(np.int64).min
+NAIVE_OFFSET = np.iinfo(np.int16).min
+FACE_URL_PREFIX = "/output_albums/.cache/faces/"
+SIDECAR_SUFFIX = ".npz"
+SIDECAR_VERSION = 1
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECONDS_PER_DAY = 86_400_000_000
+
+
+def encode_timestamp(value: Optional[str]):
+    """``(wall_clock_us, utc_offset_min)`` of an ISO timestamp string."""
+    if not value:
+        return NO_TIMESTAMP, NAIVE_OFFSET
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, TypeError, ValueError):
+        return NO_TIMESTAMP, NAIVE_OFFSET
+    offset = parsed.utcoffset()
+    wall_clock = parsed.replace(tzinfo=None) - _EPOCH
+    micros = (wall_clock.days * 86_400 + wall_clock.seconds) * 1_000_000 + wall_clock.microseconds
+    if offset is None:
+        return micros, NAIVE_OFFSET
+    return micros, int(offset.total_seconds() // 60)
+
+
+def decode_timestamp(micros: int, offset_min: int) -> Optional[str]:
+    if micros == NO_TIMESTAMP:
+        return None
+    value = _EPOCH + timedelta(microseconds=int(micros))
+    if offset_min != NAIVE_OFFSET:
+        value = value.replace(tzinfo=timezone(timedelta(minutes=int(offset_min))))
+    return value.isoformat(timespec="seconds" if not value.microsecond else "microseconds")
+
+
+class FaceRow(Mapping):
+    """Read-only view of one face; behaves like the face dicts it replaces."""
+
+    __slots__ = ("_table", "_row")
+    KEYS = (
+        "face_id",
+        "embedding",
+        "original_path",
+        "face_image_path",
+        "face_image_url",
+        "taken_at",
+        "timestamp_source",
+    )
+
+    def __init__(self, table: "FaceTable", row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self._table, key)(self._row)
+
+    def __getattr__(self, key):
+        # Lets templates write ``face.original_path``.
+        if key in FaceRow.KEYS:
+            return self[key]
+        raise AttributeError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"FaceRow(face_id={self['face_id']}, original_path={self['original_path']!r})"
+
+
+class FaceIdIndex(Mapping):
+    """``face_id -> FaceRow`` over a table, without a per-face dict."""
+
+    def __init__(self, table: "FaceTable"):
+        self._table = table
+        ids = table.face_ids
+        if len(ids) and np.all(ids[1:] > ids[:-1]):
+            self._order = None
+            self._sorted = ids
+        else:
+            self._order = np.argsort(ids, kind="stable")
+            self._sorted = ids[self._order]
+
+    def rows(self, face_ids: Iterable[int]) -> np.ndarray:
+        """Row of each face id, or -1 when the table has no such face."""
+        if not isinstance(face_ids, np.ndarray):
+            face_ids = list(face_ids)
+        wanted = np.asarray(face_ids, dtype=np.int64)
+        if not len(self._sorted) or not wanted.size:
+            return np.full(wanted.shape, -1, dtype=np.int64)
+        positions = np.searchsorted(self._sorted, wanted)
+        positions = np.minimum(positions, len(self._sorted) - 1)
+        found = self._sorted[positions] == wanted
+        rows = positions if self._order is None else self._order[positions]
+        return np.where(found, rows, -1)
+
+    def row(self, face_id) -> int:
+        try:
+            face_id = int(face_id)
+        except (TypeError, ValueError):
+            return -1
+        return int(self.rows([face_id])[0])
+
+    def __getitem__(self, face_id) -> FaceRow:
+        row = self.row(face_id)
+        if row < 0:
+            raise KeyError(face_id)
+        return FaceRow(self._table, row)
+
+    def __contains__(self, face_id) -> bool:
+        return self.row(face_id) >= 0
+
+    def __iter__(self):
+        return iter(self._table.face_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+class FaceTable:
+    def __init__(
+        self,
+        face_ids: np.ndarray,
+        embeddings: np.ndarray,
+        photo_ids: np.ndarray,
+        photo_paths: List[str],
+        crop_dir_ids: np.ndarray,
+        crop_dirs: List[str],
+        crop_names: np.ndarray,
+        taken_at_us: np.ndarray,
+        utc_offsets_min: np.ndarray,
+        source_ids: np.ndarray,
+        sources: List[str],
+        url_overrides: Optional[Dict[int, str]] = None,
+    ):
+        self.face_ids = face_ids
+        self.embeddings = embeddings
+        self.photo_ids = photo_ids
+        self.photo_paths = photo_paths
+        self.crop_dir_ids = crop_dir_ids
+        self.crop_dirs = crop_dirs
+        self.crop_names = crop_names
+        self.taken_at_us = taken_at_us
+        self.utc_offsets_min = utc_offsets_min
+        self.source_ids = source_ids
+        self.sources = sources
+        # Face URLs that do not follow FACE_URL_PREFIX + crop name (external caches).
+        self.url_overrides = url_overrides or {}
+        self._by_id = None
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "FaceTable":
+        return FaceTableBuilder(dim or None).build()
+
+    def __len__(self) -> int:
+        return len(self.face_ids)
+
+    def __bool__(self) -> bool:
+        return len(self.face_ids) > 0
+
+    def __getitem__(self, row: int) -> FaceRow:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return FaceRow(self, row)
+
+    def __iter__(self) -> Iterator[FaceRow]:
+        return (FaceRow(self, row) for row in range(len(self)))
+
+    @property
+    def by_id(self) -> FaceIdIndex:
+        if self._by_id is None:
+            self._by_id = FaceIdIndex(self)
+        return self._by_id
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns."""
+        arrays = (
+            self.face_ids,
+            self.embeddings,
+            self.photo_ids,
+            self.crop_dir_ids,
+            self.crop_names,
+            self.taken_at_us,
+            self.utc_offsets_min,
+            self.source_ids,
+        )
+        strings = sum(len(value) + 49 for value in self.photo_paths)
+        return sum(column.nbytes for column in arrays) + strings
+
+    # ------------------------------------------------------------------ #
+    # Per-row fields (FaceRow reads these)
+    # ------------------------------------------------------------------ #
+    def face_id(self, row: int) -> int:
+        return int(self.face_ids[row])
+
+    def embedding(self, row: int) -> np.ndarray:
+        return self.embeddings[row]
+
+    def original_path(self, row: int) -> str:
+        return self.photo_paths[self.photo_ids[row]]
+
+    def crop_name(self, row: int) -> str:
+        return self.crop_names[row].decode("utf-8")
+
+    def face_image_path(self, row: int) -> Optional[str]:
+        name = self.crop_name(row)
+        if not name:
+            return None
+        directory = self.crop_dirs[self.crop_dir_ids[row]]
+        return os.path.join(directory, name) if directory else name
+
+    def face_image_url(self, row: int) -> Optional[str]:
+        override = self.url_overrides.get(row)
+        if override is not None:
+            return override
+        name = self.crop_name(row)
+        return FACE_URL_PREFIX + name if name else None
+
+    def taken_at(self, row: int) -> Optional[str]:
+        return decode_timestamp(self.taken_at_us[row], self.utc_offsets_min[row])
+
+    def timestamp_source(self, row: int) -> str:
+        return self.sources[self.source_ids[row]]
+
+    def record(self, row: int, embedding: bool = True) -> dict:
+        """The face as a plain dict, as stored in ``all_faces_data.json``."""
+        record = {
+            "face_id": self.face_id(row),
+            "original_path": self.original_path(row),
+            "face_image_path": self.face_image_path(row),
+            "face_image_url": self.face_image_url(row),
+            "taken_at": self.taken_at(row),
+            "timestamp_source": self.timestamp_source(row),
+        }
+        if embedding:
+            record["embedding"] = self.embeddings[row].tolist()
+        return record
+
+    # ------------------------------------------------------------------ #
+    # Whole-column helpers
+    # ------------------------------------------------------------------ #
+    def crop_name_set(self) -> set:
+        return {name.decode("utf-8") for name in self.crop_names.tolist() if name}
+
+    def photo_days(self) -> np.ndarray:
+        """Day number (since 1970, wall clock) per face; NO_TIMESTAMP when unknown."""
+        days = self.taken_at_us // _MICROSECONDS_PER_DAY
+        return np.where(self.taken_at_us == NO_TIMESTAMP, NO_TIMESTAMP, days)
+
+    def take(self, rows) -> "FaceTable":
+        """A new table holding ``rows`` (indices or a boolean mask), in that order."""
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        remap = {int(old): new for new, old in enumerate(rows.tolist())}
+        return FaceTable(
+            self.face_ids[rows],
+            self.embeddings[rows],
+            self.photo_ids[rows],
+            self.photo_paths,
+            self.crop_dir_ids[rows],
+            self.crop_dirs,
+            self.crop_names[rows],
+            self.taken_at_us[rows],
+            self.utc_offsets_min[rows],
+            self.source_ids[rows],
+            self.sources,
+            {remap[row]: url for row, url in self.url_overrides.items() if row in remap},
+        )
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def save(self, json_path: str) -> None:
+        """Writes ``all_faces_data.json`` (streamed, one face at a time) and its sidecar."""
+        directory = os.path.dirname(json_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{json_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            cache_file.write("[")
+            for row in range(len(self)):
+                if row:
+                    cache_file.write(", ")
+                json.dump(self.record(row), cache_file)
+            cache_file.write("]")
+        os.replace(temp_path, json_path)
+        self._save_sidecar(json_path)
+
+    def _save_sidecar(self, json_path: str) -> None:
+        stat = os.stat(json_path)
+        meta = {
+            "version": SIDECAR_VERSION,
+            "json_signature": [stat.st_mtime_ns, stat.st_size],
+            "photo_paths": self.photo_paths,
+            "crop_dirs": self.crop_dirs,
+            "sources": self.sources,
+            "url_overrides": {str(row): url for row, url in self.url_overrides.items()},
+        }
+        temp_path = f"{json_path}.{os.getpid()}.tmp{SIDECAR_SUFFIX}"
+        np.savez(
+            temp_path,
+            meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            face_ids=self.face_ids,
+            embeddings=self.embeddings,
+            photo_ids=self.photo_ids,
+            crop_dir_ids=self.crop_dir_ids,
+            crop_names=self.crop_names,
+            taken_at_us=self.taken_at_us,
+            utc_offsets_min=self.utc_offsets_min,
+            source_ids=self.source_ids,
+        )
+        os.replace(temp_path, json_path + SIDECAR_SUFFIX)
+
+    @classmethod
+    def _load_sidecar(cls, json_path: str) -> Optional["FaceTable"]:
+        try:
+            stat = os.stat(json_path)
+            with np.load(json_path + SIDECAR_SUFFIX, allow_pickle=False) as data:
+                meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+                if meta.get("version") != SIDECAR_VERSION or meta.get("json_signature") != [
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                ]:
+                    return None
+                return cls(
+                    data["face_ids"],
+                    data["embeddings"],
+                    data["photo_ids"],
+                    meta["photo_paths"],
+                    data["crop_dir_ids"],
+                    meta["crop_dirs"],
+                    data["crop_names"],
+                    data["taken_at_us"],
+                    data["utc_offsets_min"],
+                    data["source_ids"],
+                    meta["sources"],
+                    {int(row): url for row, url in meta.get("url_overrides", {}).items()},
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @classmethod
+    def load(cls, json_path: str) -> "FaceTable":
+        """
+        Loads a faces cache written by ``save`` (or by older versions, which
+        are parsed once and then given a sidecar). Missing files load empty.
+        """
+        table = cls._load_sidecar(json_path)
+        if table is not None:
+            return table
+        # Imported here: face_cache_loader builds tables itself.
+        from face_cache_loader import iter_json_array
+
+        builder = FaceTableBuilder()
+        try:
+            for entry, _size in iter_json_array(json_path):
+                builder.append(
+                    entry["face_id"],
+                    entry["original_path"],
+                    entry.get("face_image_path"),
+                    entry.get("taken_at"),
+                    entry.get("timestamp_source"),
+                    embedding=entry.get("embedding"),
+                    face_image_url=entry.get("face_image_url"),
+                )
+        except FileNotFoundError:
+            return cls.empty()
+        table = builder.build()
+        try:
+            table._save_sidecar(json_path)
+        except OSError:
+            pass
+        return table
+
+
+class FaceTableBuilder:
+    """Appends faces column by column; ``build`` returns the ``FaceTable``."""
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        self.dim = dim
+        self._capacity = max(16, capacity)
+        self._matrix = None if dim is None else np.zeros((self._capacity, dim), dtype=np.float32)
+        self._face_ids = array("q")
+        self._photo_ids = array("i")
+        self._crop_dir_ids = array("i")
+        self._crop_names: List[bytes] = []
+        self._taken_at_us = array("q")
+        self._offsets = array("h")
+        self._source_ids = array("h")
+        self._photo_index: Dict[str, int] = {}
+        self._crop_dir_index: Dict[str, int] = {}
+        self._source_index: Dict[str, int] = {}
+        self._url_overrides: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._face_ids)
+
+    @property
+    def photo_paths(self) -> List[str]:
+        return list(self._photo_index)
+
+    def reserve(self, capacity: int) -> None:
+        """Grows the embedding matrix ahead of time to about ``capacity`` rows."""
+        if capacity > self._capacity:
+            self._capacity = capacity
+            if self._matrix is not None:
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[: len(self)] = self._matrix[: len(self)]
+                self._matrix = grown
+
+    @staticmethod
+    def _intern(index: Dict[str, int], value: str) -> int:
+        found = index.get(value)
+        if found is None:
+            found = index[value] = len(index)
+        return found
+
+    def set_embedding(self, row: int, embedding) -> None:
+        """Stores a face's embedding; the first one fixes the table's dimension."""
+        if self._matrix is None:
+            size = len(embedding) if not isinstance(embedding, np.ndarray) else embedding.size
+            if not size:
+                raise ValueError("Embedding is empty.")
+            self.dim = size
+            self._matrix = np.zeros((self._capacity, size), dtype=np.float32)
+        if row >= self._matrix.shape[0]:
+            self.reserve(row + row // 2 + 16)
+        if isinstance(embedding, np.ndarray):
+            embedding = embedding.reshape(-1)
+        if len(embedding) != self.dim:
+            raise ValueError(f"Embedding has {len(embedding)} numbers, expected {self.dim}.")
+        self._matrix[row] = embedding
+
+    def append(
+        self,
+        face_id,
+        original_path: str,
+        face_image_path: Optional[str],
+        taken_at: Optional[str],
+        timestamp_source: Optional[str],
+        embedding=None,
+        face_image_url: Optional[str] = None,
+    ) -> int:
+        """
+        Adds a face and returns its row. ``embedding`` may come later via
+        ``set_embedding``; a bad embedding raises before anything is added.
+        """
+        row = len(self)
+        if embedding is not None:
+            self.set_embedding(row, embedding)
+        self._face_ids.append(int(face_id))
+        self._photo_ids.append(self._intern(self._photo_index, original_path))
+        directory, name = os.path.split(face_image_path or "")
+        self._crop_dir_ids.append(self._intern(self._crop_dir_index, directory))
+        self._crop_names.append(name.encode("utf-8"))
+        micros, offset = encode_timestamp(taken_at)
+        self._taken_at_us.append(micros)
+        self._offsets.append(offset)
+        self._source_ids.append(self._intern(self._source_index, timestamp_source or "unknown"))
+        if face_image_url and face_image_url != (FACE_URL_PREFIX + name if name else None):
+            self._url_overrides[row] = face_image_url
+        return row
+
+    def build(self) -> FaceTable:
+        count = len(self)
+        if self._matrix is None:
+            embeddings = np.zeros((count, self.dim or 0), dtype=np.float32)
+        elif self._matrix.shape[0] == count:
+            embeddings = self._matrix
+        else:
+            # Copy so the spare capacity is not kept alive.
+            embeddings = self._matrix[:count].copy()
+        return FaceTable(
+            np.array(self._face_ids, dtype=np.int64),
+            embeddings,
+            np.array(self._photo_ids, dtype=np.int32),
+            list(self._photo_index),
+            np.array(self._crop_dir_ids, dtype=np.int32),
+            list(self._crop_dir_index),
+            np.array(self._crop_names, dtype=bytes) if count else np.zeros(0, dtype="S1"),
+            np.array(self._taken_at_us, dtype=np.int64),
+            np.array(self._offsets, dtype=np.int16),
+            np.array(self._source_ids, dtype=np.int16),
+            list(self._source_index) or ["unknown"],
+            dict(self._url_overrides),
+        )
@@ -0,0 +1,42 @@
+"""
+Exclusive inter-process lock on a lock file, on POSIX and Windows.
+
+POSIX uses ``fcntl.flock``; Windows has no ``fcntl`` and locks the first
+byte of the file with ``msvcrt.locking`` instead. Either way the lock is
+released when the ``with`` block ends (or the process dies).
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def exclusive_lock(path: str):
+    """Blocks until this process holds the lock on ``path``, creating the file if needed."""
+    with open(path, "a+b") as lock_file:
+        if os.name == "nt":
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK itself gives up after about 10 seconds.
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,172 @@
+"""
+Priority scheduling of model inference.
+
+A long ``/process`` ingest and a user's ``/run_search`` share one model
+(``PhotoProcessor.app`` or the inference worker's pool) and the same CPUs.
+Every inference call first takes a slot from an ``InferenceScheduler``:
+
+* ``interactive`` (person search, sample photos) outranks ``bulk`` (folder
+  extraction): a bulk call never starts while interactive calls wait;
+* at most ``capacity`` calls run at once, and each class at most its limit;
+* while an interactive request is open (``session``), the slots it may
+  still claim are held back from bulk work. Bulk jobs take one slot per
+  image (per batch with a shared worker), so an ingest yields at the next
+  image or batch boundary and resumes with the remaining capacity when the
+  request ends.
+
+Time spent waiting for a slot is recorded per class in
+``photo_inference_queue_wait_seconds``.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import metrics
+
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Highest priority first.
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+DEFAULT_CAPACITY = os.cpu_count() or 1
+
+QUEUE_WAIT_SECONDS = metrics.REGISTRY.register(
+    metrics.Histogram(
+        "photo_inference_queue_wait_seconds",
+        "Time an inference call waited for a scheduler slot, by priority class.",
+        ("priority",),
+    )
+)
+CALLS_WAITING = metrics.REGISTRY.register(
+    metrics.Gauge(
+        "photo_inference_calls_waiting",
+        "Inference calls waiting for a scheduler slot, by priority class.",
+        ("priority",),
+    )
+)
+CALLS_RUNNING = metrics.REGISTRY.register(
+    metrics.Gauge(
+        "photo_inference_calls_running",
+        "Inference calls holding a scheduler slot, by priority class.",
+        ("priority",),
+    )
+)
+
+_current = threading.local()
+
+
+def current_priority() -> Optional[str]:
+    """The class of the slot held by this thread, if any."""
+    return getattr(_current, "priority", None)
+
+
+def parse_limits(value: Optional[str]) -> Dict[str, int]:
+    """Parses ``"interactive=2,bulk=1"`` into per-class limits."""
+    limits = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        name, _, raw = item.partition("=")
+        try:
+            limits[name.strip()] = int(raw)
+        except ValueError:
+            raise ValueError(f"Invalid inference limit: {item.strip()!r} (expected class=N).")
+    return limits
+
+
+class InferenceScheduler:
+    def __init__(self, capacity: Optional[int] = None, limits: Optional[Dict[str, int]] = None):
+        """
+        ``capacity`` bounds concurrent inference calls (CPU count when
+        omitted); ``limits`` bounds each class and defaults to ``capacity``.
+        """
+        capacity = DEFAULT_CAPACITY if capacity is None else capacity
+        if capacity < 1:
+            raise ValueError("Inference capacity must be at least 1.")
+        self.capacity = capacity
+        self.limits = dict.fromkeys(PRIORITY_CLASSES, capacity)
+        for name, limit in (limits or {}).items():
+            self._check_class(name)
+            if limit < 1:
+                raise ValueError(f"Inference limit for {name} must be at least 1.")
+            self.limits[name] = min(limit, capacity)
+        self._condition = threading.Condition()
+        self._running = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._waiting = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._sessions = dict.fromkeys(PRIORITY_CLASSES, 0)
+
+    @staticmethod
+    def _check_class(priority: str) -> None:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(
+                f"Unknown priority class: {priority}. Choose from {', '.join(PRIORITY_CLASSES)}."
+            )
+
+    def _can_start(self, priority: str) -> bool:
+        if self._running[priority] >= self.limits[priority]:
+            return False
+        available = self.capacity - sum(self._running.values())
+        for higher in PRIORITY_CLASSES[: PRIORITY_CLASSES.index(priority)]:
+            if self._waiting[higher]:
+                return False
+            if self._sessions[higher] or self._running[higher]:
+                available -= self.limits[higher] - self._running[higher]
+        return available > 0
+
+    def _publish(self, priority: str) -> None:
+        CALLS_WAITING.set(self._waiting[priority], priority=priority)
+        CALLS_RUNNING.set(self._running[priority], priority=priority)
+
+    @contextmanager
+    def slot(self, priority: str = BULK):
+        """
+        Holds one inference slot of class ``priority`` for the ``with`` block.
+        A thread already holding a slot keeps it rather than queueing again.
+        """
+        self._check_class(priority)
+        if current_priority() is not None:
+            yield
+            return
+        started = time.perf_counter()
+        with self._condition:
+            self._waiting[priority] += 1
+            self._publish(priority)
+            try:
+                while not self._can_start(priority):
+                    self._condition.wait()
+            finally:
+                self._waiting[priority] -= 1
+                # A waiter leaving may unblock lower classes.
+                self._condition.notify_all()
+            self._running[priority] += 1
+            self._publish(priority)
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, priority=priority)
+
+        _current.priority = priority
+        try:
+            yield
+        finally:
+            _current.priority = None
+            with self._condition:
+                self._running[priority] -= 1
+                self._publish(priority)
+                self._condition.notify_all()
+
+    @contextmanager
+    def session(self, priority: str = INTERACTIVE):
+        """
+        Marks a request of class ``priority`` as open, so lower classes leave
+        its share of slots free between its calls.
+        """
+        self._check_class(priority)
+        with self._condition:
+            self._sessions[priority] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._sessions[priority] -= 1
+                self._condition.notify_all()
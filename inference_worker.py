@@ -0,0 +1,348 @@
+"""
+Standalone face inference service shared by several web workers.
+
+Run one worker service per host and point the Flask app at its socket:
+
+    python inference_worker.py --socket /tmp/photo-inference.sock --processes 2
+    INFERENCE_SOCKET=/tmp/photo-inference.sock gunicorn -w 4 app:app
+
+Each pool process loads InsightFace once; web workers only hold a small
+client (``RemoteFaceAnalysis``) that sends batches of decoded images over a
+Unix socket and gets boxes, landmarks, scores and embeddings back. Requests
+carry the priority class of the caller's scheduler slot, so searches from
+any web worker go ahead of queued bulk extraction (see
+``inference_scheduler``).
+"""
+
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import List, Optional
+
+import numpy as np
+
+from inference_scheduler import BULK, InferenceScheduler, current_priority
+
+DEFAULT_SOCKET_PATH = "/tmp/photo-inference.sock"
+AUTHKEY_ENV = "INFERENCE_AUTHKEY"
+# Without INFERENCE_AUTHKEY the worker writes a random key next to its socket.
+KEY_FILE_SUFFIX = ".key"
+
+_worker_face_app = None
+
+
+def key_file_path(socket_path: str) -> str:
+    return socket_path + KEY_FILE_SUFFIX
+
+
+def _configured_authkey() -> Optional[bytes]:
+    value = os.environ.get(AUTHKEY_ENV)
+    return value.encode("utf-8") if value else None
+
+
+def _write_authkey(path: str) -> bytes:
+    """Writes a new random key that only the current user can read."""
+    key = secrets.token_hex(32).encode("ascii")
+    if os.path.lexists(path):
+        os.unlink(path)
+    # O_EXCL fails rather than follow anything created at ``path`` meanwhile.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as key_file:
+        key_file.write(key)
+    return key
+
+
+def _read_authkey(path: str) -> bytes:
+    """Reads the worker's key, refusing a file another user owns or can read."""
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError as exc:
+        raise RuntimeError(
+            f"Inference worker key not readable at {path} ({exc}); "
+            f"start the worker or set {AUTHKEY_ENV}."
+        ) from exc
+    with os.fdopen(fd, "rb") as key_file:
+        info = os.fstat(key_file.fileno())
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise RuntimeError(
+                f"Refusing inference worker key {path}: it must be owned by this user "
+                "and not accessible to others."
+            )
+        return key_file.read().strip()
+
+
+# ---------------------------------------------------------------------- #
+# Pool process side
+# ---------------------------------------------------------------------- #
+def _init_pool_process(det_size, model):
+    global _worker_face_app
+    from photo_processor import create_face_analysis
+
+    _worker_face_app = create_face_analysis(det_size=det_size, model=model)
+
+
+def _pool_ready() -> int:
+    """Returns once this pool process has loaded the model."""
+    # Long enough that one round of tasks spreads over the idle processes.
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _analyse_batch(images: List[np.ndarray], detection=None) -> List[List[dict]]:
+    """Runs detection + embedding on each image and returns plain face dicts."""
+    from face_detection import detect_faces
+
+    results = []
+    for img in images:
+        if detection is None or detection.is_default:
+            faces = _worker_face_app.get(img)
+        else:
+            faces = detect_faces(_worker_face_app, img, detection)
+        results.append(
+            [
+                {
+                    "bbox": np.asarray(face.bbox, dtype=np.float32),
+                    "kps": None if face.kps is None else np.asarray(face.kps, dtype=np.float32),
+                    "det_score": float(face.det_score),
+                    "embedding": np.asarray(face.embedding, dtype=np.float32),
+                }
+                for face in faces
+            ]
+        )
+    return results
+
+
+# ---------------------------------------------------------------------- #
+# Service side
+# ---------------------------------------------------------------------- #
+class InferenceServer:
+    """Accepts client connections and fans their batches out to a process pool."""
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        processes: int = 1,
+        det_size=(640, 640),
+        model: Optional[str] = None,
+    ):
+        self.socket_path = socket_path
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_pool_process,
+            initargs=(det_size, model),
+        )
+        self.scheduler = InferenceScheduler(capacity=processes)
+        # Waits on pool results, one thread per chunk of a batch being analysed.
+        self._chunk_threads = ThreadPoolExecutor(
+            max_workers=processes * 4, thread_name_prefix="inference-chunk"
+        )
+        self._listener = None
+        self._key_file = None
+
+    def _warm_pool(self) -> None:
+        """Starts every pool process and waits for its model, before the first client."""
+        ready = set()
+        while len(ready) < self.processes:
+            rounds = [self.executor.submit(_pool_ready) for _ in range(self.processes)]
+            ready.update(task.result() for task in rounds)
+
+    def serve_forever(self) -> None:
+        self._warm_pool()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        authkey = _configured_authkey()
+        if authkey is None:
+            self._key_file = key_file_path(self.socket_path)
+            authkey = _write_authkey(self._key_file)
+        # Requests are pickled, so only the owning user may connect: the
+        # socket is created without group or other permissions.
+        previous_umask = os.umask(0o077)
+        try:
+            self._listener = Listener(self.socket_path, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+        print(
+            f"Inference worker listening on {self.socket_path} "
+            f"with {self.processes} process(es)."
+        )
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except AuthenticationError:
+                    print("Rejected an inference client with the wrong key.")
+                    continue
+                except OSError:
+                    break
+                threading.Thread(
+                    target=self._handle_connection, args=(conn,), daemon=True
+                ).start()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._chunk_threads.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        if self._key_file and os.path.exists(self._key_file):
+            os.unlink(self._key_file)
+            self._key_file = None
+
+    def _handle_connection(self, conn) -> None:
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                conn.send(self._dispatch(message))
+
+    def _analyse_chunk(self, images, detection, priority: str) -> List[List[dict]]:
+        with self.scheduler.slot(priority):
+            return self.executor.submit(_analyse_batch, images, detection).result()
+
+    def _dispatch(self, message) -> dict:
+        op = message.get("op") if isinstance(message, dict) else None
+        if op == "ping":
+            return {"status": "ok", "processes": self.processes}
+        if op == "get":
+            images = message["images"]
+            # A batch is split over the pool processes; each chunk takes its
+            # own scheduler slot, so searches still get in between chunks.
+            chunk_size = max(1, -(-len(images) // self.processes))
+            chunks = [
+                self._chunk_threads.submit(
+                    self._analyse_chunk,
+                    images[start : start + chunk_size],
+                    message.get("detection"),
+                    message.get("priority") or BULK,
+                )
+                for start in range(0, len(images), chunk_size)
+            ]
+            try:
+                faces = [face for chunk in chunks for face in chunk.result()]
+            except Exception as exc:  # pylint: disable=broad-except
+                return {"status": "error", "message": f"Inference failed: {exc}"}
+            return {"status": "ok", "faces": faces}
+        return {"status": "error", "message": f"Unknown operation: {op}"}
+
+
+# ---------------------------------------------------------------------- #
+# Client side
+# ---------------------------------------------------------------------- #
+class RemoteFace:
+    """Attribute view over a face dict returned by the worker, like InsightFace's Face."""
+
+    __slots__ = ("bbox", "kps", "det_score", "embedding")
+
+    def __init__(self, bbox, kps, det_score, embedding):
+        self.bbox = bbox
+        self.kps = kps
+        self.det_score = det_score
+        self.embedding = embedding
+
+
+class RemoteFaceAnalysis:
+    """
+    Drop-in replacement for ``FaceAnalysis.get`` that delegates to an
+    ``InferenceServer``. Safe to share between threads: each call borrows one
+    connection from a small pool.
+    """
+
+    def __init__(self, address: str = DEFAULT_SOCKET_PATH, max_connections: int = 4):
+        self.address = address
+        self._connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _request(self, message: dict) -> dict:
+        with self._slots:
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                authkey = _configured_authkey() or _read_authkey(key_file_path(self.address))
+                try:
+                    conn = Client(self.address, family="AF_UNIX", authkey=authkey)
+                except (AuthenticationError, OSError) as exc:
+                    raise RuntimeError(
+                        f"Inference worker unavailable at {self.address}: {exc}"
+                    ) from exc
+            try:
+                conn.send(message)
+                reply = conn.recv()
+            except (EOFError, OSError) as exc:
+                conn.close()
+                raise RuntimeError(f"Lost connection to inference worker: {exc}") from exc
+            self._connections.put(conn)
+
+        if reply.get("status") != "ok":
+            raise RuntimeError(reply.get("message", "Inference worker error."))
+        return reply
+
+    def ping(self) -> dict:
+        return self._request({"op": "ping"})
+
+    def get_batch(self, images: List[np.ndarray], detection=None) -> List[List[RemoteFace]]:
+        """
+        Detects and embeds faces for several images in one round trip.
+        ``detection`` is an optional ``DetectionSettings`` applied by the worker.
+        """
+        if not images:
+            return []
+        reply = self._request(
+            {
+                "op": "get",
+                "images": list(images),
+                "detection": detection,
+                "priority": current_priority(),
+            }
+        )
+        return [[RemoteFace(**face) for face in faces] for faces in reply["faces"]]
+
+    def get(self, img: np.ndarray, detection=None) -> List[RemoteFace]:
+        return self.get_batch([img], detection=detection)[0]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the shared face inference worker.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Inference processes, each holding one copy of the model.",
+    )
+    parser.add_argument(
+        "--det-size", type=int, default=640, help="Detector input size in pixels."
+    )
+    parser.add_argument(
+        "--model",
+        default=os.environ.get("INSIGHTFACE_MODEL"),
+        help="Model pack name or directory, e.g. an INT8 pack from model_quantization.py.",
+    )
+    args = parser.parse_args(argv)
+
+    server = InferenceServer(
+        socket_path=args.socket,
+        processes=max(1, args.processes),
+        det_size=(args.det_size, args.det_size),
+        model=args.model,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down inference worker.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Opt-in per-job profiling for slow processing runs.
+
+When enabled, a job records a cProfile profile plus a timeline of pipeline
+stage spans (the same stages reported at ``/metrics``) into the cache's
+``profiles/`` directory. Enable it for every job with
+``PHOTO_PROCESSOR_PROFILE=1`` or for a single job with the "profile" checkbox
+on the processing forms.
+
+The profile covers the job's thread and the worker threads it fans out to
+through ``follow_job`` (``--workers N``); spans from other jobs running in
+the same process are left out.
+
+Summarise the hot spots across recent runs:
+
+    python job_profiler.py --dir output_albums/.cache/profiles --last 5 --top 25
+"""
+
+import argparse
+import cProfile
+import functools
+import glob
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import metrics
+
+
+PROFILE_ENV = "PHOTO_PROCESSOR_PROFILE"
+DEFAULT_PROFILES_DIR = os.path.join("output_albums", ".cache", "profiles")
+# Per-face stages can produce millions of spans on large jobs; keep the file bounded.
+MAX_SPANS = 100_000
+TRUTHY_VALUES = ("1", "true", "yes", "on")
+
+# cProfile can only trace one job at a time in a process.
+_profiler_lock = threading.Lock()
+# The profiled run the current thread is working for, if any.
+_current = threading.local()
+
+
+class _ProfiledRun:
+    """The per-thread profilers of one profiled job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profilers = {}
+
+    def thread_profiler(self) -> cProfile.Profile:
+        """This thread's profiler, created on its first call."""
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._profilers:
+                self._profilers[ident] = cProfile.Profile()
+            return self._profilers[ident]
+
+    def profilers(self) -> List[cProfile.Profile]:
+        with self._lock:
+            return list(self._profilers.values())
+
+
+def follow_job(func):
+    """
+    Wraps ``func`` so calls from worker threads are profiled, and their
+    stage spans recorded, as part of the calling thread's profiled job.
+    Returns ``func`` unchanged when no job is being profiled.
+    """
+    run = getattr(_current, "run", None)
+    if run is None:
+        return func
+
+    @functools.wraps(func)
+    def call_in_job(*args, **kwargs):
+        previous = getattr(_current, "run", None)
+        profiler = None
+        if previous is not run:
+            profiler = run.thread_profiler()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ profiles every thread from the job's own profiler.
+                profiler = None
+        _current.run = run
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.run = previous
+            if profiler is not None:
+                profiler.disable()
+
+    return call_in_job
+
+
+def profiling_requested(flag_value: Optional[str] = None) -> bool:
+    """True when the environment or a form flag asks for a profile."""
+    if os.environ.get(PROFILE_ENV, "").lower() in TRUTHY_VALUES:
+        return True
+    return (flag_value or "").lower() in TRUTHY_VALUES
+
+
+@contextmanager
+def profile_job(job: str, profiles_dir: str, enabled: bool = True, details: Optional[dict] = None):
+    """
+    Profiles the enclosed block and writes ``<run>.prof`` and ``<run>.spans.json``
+    into ``profiles_dir``. Yields the run's path prefix, or None when not profiling.
+    """
+    if not enabled:
+        yield None
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        print("Profiling skipped: another job in this process is already being profiled.")
+        yield None
+        return
+
+    started_at = datetime.now(timezone.utc)
+    safe_job = re.sub(r"[^A-Za-z0-9_-]", "_", job)
+    run_prefix = os.path.join(
+        profiles_dir, f"{started_at.strftime('%Y%m%dT%H%M%S%f')}_{safe_job}"
+    )
+    spans = []
+    dropped = [0]
+    origin = time.perf_counter()
+    run = _ProfiledRun()
+
+    def record_span(stage, started, elapsed):
+        # The listener sees every job in the process; keep this job's threads.
+        if getattr(_current, "run", None) is not run:
+            return
+        if len(spans) < MAX_SPANS:
+            spans.append(
+                {
+                    "stage": stage,
+                    "start": round(started - origin, 6),
+                    "duration": round(elapsed, 6),
+                    "thread": threading.current_thread().name,
+                }
+            )
+        else:
+            dropped[0] += 1
+
+    profiler = run.thread_profiler()
+    _current.run = run
+    metrics.add_stage_listener(record_span)
+    profiler.enable()
+    try:
+        yield run_prefix
+    finally:
+        profiler.disable()
+        metrics.remove_stage_listener(record_span)
+        _current.run = None
+        duration = time.perf_counter() - origin
+        try:
+            os.makedirs(profiles_dir, exist_ok=True)
+            # One profile for the job and its worker threads.
+            profilers = run.profilers()
+            stats = pstats.Stats(profilers[0])
+            for worker_profiler in profilers[1:]:
+                stats.add(worker_profiler)
+            stats.dump_stats(f"{run_prefix}.prof")
+            with open(f"{run_prefix}.spans.json", "w") as spans_file:
+                json.dump(
+                    {
+                        "job": job,
+                        "started_at": started_at.isoformat(timespec="seconds"),
+                        "duration": round(duration, 6),
+                        "details": details or {},
+                        "dropped_spans": dropped[0],
+                        "spans": spans,
+                    },
+                    spans_file,
+                )
+            print(f"Profile saved to {run_prefix}.prof")
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"Failed to save profile: {exc}")
+        finally:
+            _profiler_lock.release()
+
+
+def recent_runs(profiles_dir: str, last: int) -> List[str]:
+    """Path prefixes of the most recent profiled runs, newest first."""
+    prof_files = glob.glob(os.path.join(profiles_dir, "*.prof"))
+    prof_files.sort(key=os.path.getmtime, reverse=True)
+    return [path[: -len(".prof")] for path in prof_files[:last]]
+
+
+def summarize(profiles_dir: str, last: int = 5, top: int = 25, sort: str = "cumulative", stream=None) -> None:
+    stream = stream or sys.stdout
+    runs = recent_runs(profiles_dir, last)
+    if not runs:
+        print(f"No profiles found in {profiles_dir}", file=stream)
+        return
+
+    stage_totals = defaultdict(lambda: [0.0, 0])
+    print(f"Runs ({len(runs)} most recent):", file=stream)
+    for run in runs:
+        try:
+            with open(f"{run}.spans.json", "r") as spans_file:
+                timeline = json.load(spans_file)
+        except (OSError, json.JSONDecodeError):
+            print(f"  {os.path.basename(run)} (no span timeline)", file=stream)
+            continue
+        print(
+            f"  {os.path.basename(run)}: job={timeline['job']} "
+            f"duration={timeline['duration']:.2f}s spans={len(timeline['spans'])}",
+            file=stream,
+        )
+        for span in timeline["spans"]:
+            stage_totals[span["stage"]][0] += span["duration"]
+            stage_totals[span["stage"]][1] += 1
+
+    if stage_totals:
+        print("\nStage totals across runs:", file=stream)
+        for stage, (seconds, count) in sorted(
+            stage_totals.items(), key=lambda item: item[1][0], reverse=True
+        ):
+            print(
+                f"  {stage:<16} {seconds:10.3f}s  {count:8d} calls  "
+                f"{seconds / count * 1000:9.3f} ms/call",
+                file=stream,
+            )
+
+    print(f"\nTop {top} functions by {sort} time:", file=stream)
+    stats = pstats.Stats(*[f"{run}.prof" for run in runs], stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Summarise recent job profiles.")
+    parser.add_argument("--dir", default=DEFAULT_PROFILES_DIR, help="Profiles directory.")
+    parser.add_argument("--last", type=int, default=5, help="Number of recent runs to include.")
+    parser.add_argument("--top", type=int, default=25, help="Number of functions to list.")
+    parser.add_argument(
+        "--sort",
+        default="cumulative",
+        choices=["cumulative", "tottime", "ncalls"],
+        help="pstats sort key.",
+    )
+    args = parser.parse_args(argv)
+    summarize(args.dir, last=args.last, top=args.top, sort=args.sort)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Per-library face caches with a shared registry and LRU disk-budget eviction.
+
+Each source folder ("library") gets its own cache directory under
+``.cache/libraries/<library_id>/`` holding its crops, embeddings, cluster
+assignments and timeline views, so processing another group folder no longer
+overwrites the previous one. ``.cache/libraries.json`` records every library's
+source path, size, last use and the fingerprint of the folder it was built
+from, plus which library is active; web workers read it to agree on the active
+library.
+
+When a total budget is configured, least recently used libraries (never the
+active one, nor one a job of this process holds) are deleted after each
+extraction until the caches fit.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+import metrics
+from file_lock import exclusive_lock
+from photo_sources import photo_stat
+
+
+REGISTRY_FILENAME = "libraries.json"
+REGISTRY_VERSION = 1
+LIBRARIES_DIRNAME = "libraries"
+LIBRARY_ID_LENGTH = 16
+
+LIBRARY_EVICTIONS = metrics.REGISTRY.register(
+    metrics.Counter(
+        "photo_cache_library_evictions_total",
+        "Library caches deleted to stay within the cache disk budget.",
+    )
+)
+LIBRARY_CACHE_BYTES = metrics.REGISTRY.register(
+    metrics.Gauge(
+        "photo_cache_library_bytes",
+        "Total size of all library caches after the last budget check.",
+    )
+)
+
+
+def library_id_for(source_path: str) -> str:
+    """Stable id of a source folder, derived from its resolved path."""
+    resolved = os.path.realpath(os.path.abspath(source_path))
+    return hashlib.sha1(resolved.encode("utf-8")).hexdigest()[:LIBRARY_ID_LENGTH]
+
+
+def source_fingerprint(image_files: Iterable[str]) -> Optional[str]:
+    """
+    Digest of the names, sizes and modification times of ``image_files``; it
+    changes whenever a photo is added, removed or edited.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(image_files):
+        stat = photo_stat(path)
+        if stat is None:
+            continue
+        digest.update(f"{os.path.basename(path)}\0{stat[0]}\0{stat[1]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class LibraryRegistry:
+    """Reads and updates ``libraries.json``; writes are locked across processes."""
+
+    def __init__(self, cache_root: str, budget_bytes: Optional[int] = None):
+        self.cache_root = cache_root
+        self.libraries_root = os.path.join(cache_root, LIBRARIES_DIRNAME)
+        self.path = os.path.join(cache_root, REGISTRY_FILENAME)
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._cached = None
+        # library_id -> jobs of this process using it; never evicted.
+        self._holds = Counter()
+
+    def library_dir(self, library_id: str) -> str:
+        return os.path.join(self.libraries_root, library_id)
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+    def load(self) -> dict:
+        """The registry document, reparsed only when the file has changed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {"version": REGISTRY_VERSION, "active": None, "libraries": {}}
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._cached
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(self.path, "r") as registry_file:
+                data = json.load(registry_file)
+        except (OSError, json.JSONDecodeError):
+            data = None
+        if not data or data.get("version") != REGISTRY_VERSION:
+            data = {"version": REGISTRY_VERSION, "active": None, "libraries": {}}
+        self._cached = (signature, data)
+        return data
+
+    @contextmanager
+    def _editing(self):
+        """Yields the registry for modification and saves it afterwards."""
+        os.makedirs(self.cache_root, exist_ok=True)
+        with self._lock, exclusive_lock(f"{self.path}.lock"):
+            self._cached = None
+            data = self.load()
+            yield data
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as registry_file:
+                json.dump(data, registry_file, indent=2)
+            os.replace(temp_path, self.path)
+            self._cached = None
+
+    # ------------------------------------------------------------------ #
+    # Queries and updates
+    # ------------------------------------------------------------------ #
+    def active_id(self) -> Optional[str]:
+        active = self.load().get("active")
+        return active if active in self.load()["libraries"] else None
+
+    def get(self, library_id: str) -> Optional[dict]:
+        return self.load()["libraries"].get(library_id)
+
+    def list(self) -> List[dict]:
+        """Libraries, most recently used first."""
+        libraries = [
+            {"library_id": library_id, **entry}
+            for library_id, entry in self.load()["libraries"].items()
+        ]
+        libraries.sort(key=lambda entry: entry.get("last_used_at") or "", reverse=True)
+        return libraries
+
+    def activate(self, source_path: str) -> str:
+        """Registers ``source_path`` if needed, marks it used and active, and returns its id."""
+        library_id = library_id_for(source_path)
+        with self._editing() as data:
+            entry = data["libraries"].setdefault(
+                library_id,
+                {
+                    "source_path": os.path.realpath(os.path.abspath(source_path)),
+                    "created_at": _now(),
+                    "size_bytes": 0,
+                },
+            )
+            entry["last_used_at"] = _now()
+            data["active"] = library_id
+        os.makedirs(self.library_dir(library_id), exist_ok=True)
+        return library_id
+
+    def update(self, library_id: str, **fields) -> None:
+        with self._editing() as data:
+            entry = data["libraries"].get(library_id)
+            if entry is not None:
+                entry.update(fields)
+
+    def record_size(self, library_id: str) -> int:
+        size = directory_size(self.library_dir(library_id))
+        self.update(library_id, size_bytes=size)
+        return size
+
+    @contextmanager
+    def holding(self, library_id: str):
+        """Keeps ``library_id`` from being evicted until the block ends."""
+        with self._lock:
+            self._holds[library_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._holds[library_id] -= 1
+                if not self._holds[library_id]:
+                    del self._holds[library_id]
+
+    def enforce_budget(self, protect: Iterable[str] = ()) -> List[str]:
+        """
+        Deletes least recently used libraries, except the active one, the
+        held ones and ``protect``, until the recorded sizes fit the budget.
+        Returns the evicted ids.
+        """
+        evicted = []
+        with self._editing() as data:
+            libraries = data["libraries"]
+            total = sum(entry.get("size_bytes", 0) for entry in libraries.values())
+            if self.budget_bytes is not None:
+                # _editing holds self._lock, so no hold can start meanwhile.
+                keep = set(protect) | set(self._holds) | {data.get("active")}
+                candidates = sorted(
+                    (library_id for library_id in libraries if library_id not in keep),
+                    key=lambda library_id: libraries[library_id].get("last_used_at") or "",
+                )
+                for library_id in candidates:
+                    if total <= self.budget_bytes:
+                        break
+                    total -= libraries.pop(library_id).get("size_bytes", 0)
+                    evicted.append(library_id)
+            # Deleted under the lock, so activating an evicted library waits
+            # until its directory is gone instead of being emptied meanwhile.
+            for library_id in evicted:
+                shutil.rmtree(self.library_dir(library_id), ignore_errors=True)
+                LIBRARY_EVICTIONS.inc()
+                print(f"Evicted library cache {library_id} to stay within the cache budget.")
+        LIBRARY_CACHE_BYTES.set(total)
+        return evicted
@@ -0,0 +1,274 @@
+"""
+Minimal in-process metrics for the photo pipeline, rendered in the
+Prometheus text exposition format by the ``/metrics`` route.
+
+Values are per process: under a multi-worker WSGI server each worker reports
+its own series, so scrape them individually or aggregate by instance.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} expects labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.label_names, key), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(
+                (key, {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]})
+                for key, state in self._values.items()
+            )
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                labels = _format_labels(
+                    self.label_names + ("le",), key + (_format_value(bound),)
+                )
+                yield f"{self.name}_bucket", labels, count
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum", labels, state["sum"]
+            yield f"{self.name}_count", labels, state["count"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "photo_pipeline_stage_seconds",
+        "Time spent per pipeline stage call.",
+        ("stage",),
+    )
+)
+IMAGES_TOTAL = REGISTRY.register(
+    Counter(
+        "photo_pipeline_images_total",
+        "Images handled by extraction and search, by outcome.",
+        ("result",),
+    )
+)
+FACES_TOTAL = REGISTRY.register(
+    Counter("photo_pipeline_faces_total", "Faces detected during extraction.")
+)
+FACES_PER_IMAGE = REGISTRY.register(
+    Histogram(
+        "photo_pipeline_faces_per_image",
+        "Number of faces detected per processed image.",
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+    )
+)
+LAST_RUN_IMAGES_PER_SECOND = REGISTRY.register(
+    Gauge(
+        "photo_pipeline_last_run_images_per_second",
+        "Throughput of the most recent extraction run.",
+    )
+)
+LAST_RUN_FACES_PER_IMAGE = REGISTRY.register(
+    Gauge(
+        "photo_pipeline_last_run_faces_per_image",
+        "Mean faces per processed image in the most recent extraction run.",
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "photo_pipeline_queue_depth",
+        "Items waiting in a pipeline queue.",
+        ("queue",),
+    )
+)
+JOBS_IN_PROGRESS = REGISTRY.register(
+    Gauge(
+        "photo_pipeline_jobs_in_progress",
+        "Pipeline jobs currently running.",
+        ("job",),
+    )
+)
+CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "photo_cache_lookups_total",
+        "Cache lookups by cache and result (hit or miss).",
+        ("cache", "result"),
+    )
+)
+
+
+_stage_listeners = []
+
+
+def add_stage_listener(listener) -> None:
+    """Register ``listener(stage, started, elapsed)`` to be told about every stage call."""
+    _stage_listeners.append(listener)
+
+
+def remove_stage_listener(listener) -> None:
+    try:
+        _stage_listeners.remove(listener)
+    except ValueError:
+        pass
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Context manager recording one call of a pipeline stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        for listener in list(_stage_listeners):
+            listener(stage, started, elapsed)
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    if count:
+        CACHE_LOOKUPS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def track_job(job: str):
+    JOBS_IN_PROGRESS.inc(job=job)
+    try:
+        yield
+    finally:
+        JOBS_IN_PROGRESS.dec(job=job)
+
+
+def _timed(func, stage: str):
+    def wrapper(*args, **kwargs):
+        with time_stage(stage):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument_face_analysis(face_app) -> None:
+    """
+    Wraps the detector and per-face models of a loaded FaceAnalysis so
+    detection, embedding and the remaining per-face models are timed apart.
+    """
+    face_app.det_model.detect = _timed(face_app.det_model.detect, "detection")
+    for taskname, model in face_app.models.items():
+        if taskname == "detection":
+            continue
+        stage = "embedding" if taskname == "recognition" else "face_attributes"
+        model.get = _timed(model.get, stage)
@@ -0,0 +1,268 @@
+"""
+Builds an INT8 copy of the InsightFace model pack from the shipped FP32 models.
+
+The detection (SCRFD) and recognition (ArcFace) models are quantised and
+every other model in the pack is copied unchanged, so the output directory
+loads exactly like the original:
+
+    python model_quantization.py --output ~/.insightface/models/buffalo_l_int8 \
+        --method static --calibration-dir /path/to/sample/photos
+    INSIGHTFACE_MODEL=~/.insightface/models/buffalo_l_int8 flask run
+
+``static`` quantisation (QDQ, per-channel weights) calibrates activation
+ranges on local photos and is the faster option for these convolutional
+models on CPU. ``dynamic`` needs no calibration data but only quantises
+weights ahead of time. Check the result with
+``benchmarks/quantization_report.py`` before switching production to it.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+DEFAULT_MODEL_NAME = "buffalo_l"
+DEFAULT_MODEL_ROOT = "~/.insightface"
+QUANTIZATION_METADATA = "quantization.json"
+QUANTIZED_TASKS = ("detection", "recognition")
+QUANTIZATION_METHODS = ("static", "dynamic")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+
+
+def resolve_model_dir(model: Optional[str] = None, root: str = DEFAULT_MODEL_ROOT) -> str:
+    """Directory of a model pack given either its name or its path."""
+    model = model or DEFAULT_MODEL_NAME
+    expanded = os.path.expanduser(model)
+    if os.path.isdir(expanded):
+        return os.path.abspath(expanded)
+    return os.path.join(os.path.expanduser(root), "models", model)
+
+
+def _model_task(onnx_path: str):
+    """``(taskname, model)`` as InsightFace routes the file, taskname None if unknown."""
+    from insightface.model_zoo import model_zoo
+
+    model = model_zoo.get_model(onnx_path, providers=["CPUExecutionProvider"])
+    return getattr(model, "taskname", None), model
+
+
+# ---------------------------------------------------------------------- #
+# Calibration data
+# ---------------------------------------------------------------------- #
+def _calibration_images(directory: str, limit: int) -> List[np.ndarray]:
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    images = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def _detection_blob(det_model, img: np.ndarray, size: int) -> np.ndarray:
+    """The detector's own letterbox + normalisation, as in SCRFD.detect."""
+    scale = min(size / img.shape[0], size / img.shape[1])
+    resized = cv2.resize(img, (int(img.shape[1] * scale), int(img.shape[0] * scale)))
+    canvas = np.zeros((size, size, 3), dtype=np.uint8)
+    canvas[: resized.shape[0], : resized.shape[1]] = resized
+    mean = det_model.input_mean
+    return cv2.dnn.blobFromImage(
+        canvas, 1.0 / det_model.input_std, (size, size), (mean, mean, mean), swapRB=True
+    )
+
+
+def _recognition_blobs(det_model, rec_model, images: List[np.ndarray], size: int, limit: int):
+    """Aligned face crops found by the FP32 detector, normalised for ArcFace."""
+    from insightface.utils import face_align
+
+    blobs = []
+    for img in images:
+        bboxes, kpss = det_model.detect(img, input_size=(size, size))
+        if kpss is None:
+            continue
+        for kps in kpss:
+            aligned = face_align.norm_crop(img, landmark=kps, image_size=rec_model.input_size[0])
+            mean = rec_model.input_mean
+            blobs.append(
+                cv2.dnn.blobFromImage(
+                    aligned,
+                    1.0 / rec_model.input_std,
+                    rec_model.input_size,
+                    (mean, mean, mean),
+                    swapRB=True,
+                )
+            )
+            if len(blobs) >= limit:
+                return blobs
+    return blobs
+
+
+def _calibration_reader(input_name: str, blobs: List[np.ndarray]):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class _BlobReader(CalibrationDataReader):
+        def __init__(self):
+            self._blobs = iter(blobs)
+
+        def get_next(self):
+            blob = next(self._blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    return _BlobReader()
+
+
+# ---------------------------------------------------------------------- #
+# Quantisation
+# ---------------------------------------------------------------------- #
+def _quantize_file(source: str, target: str, method: str, reader=None) -> None:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if method == "dynamic":
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8, per_channel=True)
+        return
+    quantize_static(
+        source,
+        target,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+def quantize_model_pack(
+    source_dir: str,
+    output_dir: str,
+    method: str = "static",
+    calibration_dir: Optional[str] = None,
+    calibration_limit: int = 64,
+    det_size: int = 640,
+) -> dict:
+    """
+    Writes an INT8 copy of ``source_dir`` to ``output_dir`` and returns the
+    metadata recorded alongside it.
+    """
+    if method not in QUANTIZATION_METHODS:
+        raise ValueError(f"Quantisation method must be one of {', '.join(QUANTIZATION_METHODS)}.")
+    onnx_files = sorted(glob.glob(os.path.join(source_dir, "*.onnx")))
+    if not onnx_files:
+        raise FileNotFoundError(f"No ONNX models found in {source_dir}")
+    if os.path.abspath(source_dir) == os.path.abspath(output_dir):
+        raise ValueError("Output directory must differ from the FP32 model directory.")
+
+    models = {}
+    for path in onnx_files:
+        task, model = _model_task(path)
+        models[path] = (task, model)
+
+    calibration = {}
+    if method == "static":
+        if not calibration_dir:
+            raise ValueError("Static quantisation needs --calibration-dir with sample photos.")
+        images = _calibration_images(calibration_dir, calibration_limit)
+        if not images:
+            raise ValueError(f"No readable calibration photos in {calibration_dir}")
+        by_task = {task: model for task, model in models.values()}
+        det_model = by_task.get("detection")
+        rec_model = by_task.get("recognition")
+        if det_model is not None:
+            det_model.prepare(0, input_size=(det_size, det_size))
+            calibration["detection"] = [_detection_blob(det_model, img, det_size) for img in images]
+        if det_model is not None and rec_model is not None:
+            calibration["recognition"] = _recognition_blobs(
+                det_model, rec_model, images, det_size, calibration_limit
+            )
+            if not calibration["recognition"]:
+                raise ValueError("No faces found in the calibration photos.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = {}
+    for path, (task, model) in models.items():
+        name = os.path.basename(path)
+        target = os.path.join(output_dir, name)
+        if task not in QUANTIZED_TASKS:
+            shutil.copy2(path, target)
+            files[name] = {"task": task, "quantized": False}
+            continue
+
+        print(f"Quantising {name} ({task}, {method})...")
+        reader = None
+        if method == "static":
+            input_name = model.session.get_inputs()[0].name
+            reader = _calibration_reader(input_name, calibration[task])
+        _quantize_file(path, target, method, reader)
+        files[name] = {
+            "task": task,
+            "quantized": True,
+            "fp32_bytes": os.path.getsize(path),
+            "int8_bytes": os.path.getsize(target),
+            "calibration_samples": len(calibration.get(task, [])),
+        }
+
+    metadata = {
+        "source": os.path.abspath(source_dir),
+        "method": method,
+        "det_size": det_size,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "files": files,
+    }
+    with open(os.path.join(output_dir, QUANTIZATION_METADATA), "w") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+    return metadata
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build an INT8 copy of the face model pack.")
+    parser.add_argument(
+        "--source",
+        default=DEFAULT_MODEL_NAME,
+        help=f"FP32 model pack name or directory (default: {DEFAULT_MODEL_NAME}).",
+    )
+    parser.add_argument("--root", default=DEFAULT_MODEL_ROOT, help="InsightFace model root.")
+    parser.add_argument("--output", required=True, help="Directory for the INT8 model pack.")
+    parser.add_argument("--method", choices=QUANTIZATION_METHODS, default="static")
+    parser.add_argument("--calibration-dir", help="Sample photos for static calibration.")
+    parser.add_argument(
+        "--calibration-limit", type=int, default=64, help="Photos (and faces) used for calibration."
+    )
+    parser.add_argument("--det-size", type=int, default=640, help="Detector size to calibrate at.")
+    args = parser.parse_args(argv)
+
+    source_dir = resolve_model_dir(args.source, args.root)
+    try:
+        metadata = quantize_model_pack(
+            source_dir,
+            os.path.expanduser(args.output),
+            method=args.method,
+            calibration_dir=args.calibration_dir,
+            calibration_limit=args.calibration_limit,
+            det_size=args.det_size,
+        )
+    except (ValueError, FileNotFoundError) as exc:
+        parser.exit(1, f"Error: {exc}\n")
+    for name, info in metadata["files"].items():
+        if info["quantized"]:
+            print(
+                f"  {name}: {info['fp32_bytes'] / 1e6:.1f} MB -> {info['int8_bytes'] / 1e6:.1f} MB"
+            )
+        else:
+            print(f"  {name}: copied ({info['task']})")
+    print(f"INT8 model pack written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Headless command-line entry point for batch jobs, built on ``PhotoProcessor``.
+
+    python photo_cli.py extract /data/group-export --workers 4 --progress
+    python photo_cli.py cluster --eps 0.5 --min-samples 2 --mode events
+    python photo_cli.py search /data/group-export --samples jane1.jpg jane2.jpg --album "Jane"
+    python photo_cli.py export-albums
+    python photo_cli.py libraries --cache-budget-mb 2048 --evict
+
+Every subcommand writes JSON lines (one record per face, cluster, match,
+album or library, then a ``summary`` record) to stdout or ``--jsonl``. Processing logs go
+to stderr so the JSON stream stays machine readable. Exit status is 0 on
+success and 1 when the job could not produce a result.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+from face_detection import DEFAULT_DET_SIZE, DETECTION_MODES, DetectionSettings
+from embedding_index import INDEX_KINDS
+from event_clustering import CLUSTER_MODES
+from face_embedding import MAX_RECOGNITION_BATCH
+from face_quality import QUALITY_MODES, QualitySettings
+from library_cache import library_id_for
+from photo_processor import PhotoProcessor
+from photo_sources import is_photo_source
+
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record_type: str, **fields) -> None:
+        self.stream.write(json.dumps({"type": record_type, **fields}, default=str) + "\n")
+        self.stream.flush()
+
+
+class ProgressReporter:
+    """Renders ``done/total`` on one stderr line when enabled."""
+
+    def __init__(self, label: str, enabled: bool):
+        self.label = label
+        self.enabled = enabled
+        self.total = 0
+        self.started = time.perf_counter()
+
+    def __call__(self, done: int, total: int) -> None:
+        self.total = total
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        sys.stderr.write(f"\r{self.label}: {done}/{total} images ({rate:.1f}/s)")
+        if done == total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def _build_processor(args) -> PhotoProcessor:
+    return PhotoProcessor(
+        output_path_base=args.output,
+        inference_address=args.inference_socket,
+        model=getattr(args, "model", None),
+        cache_budget_mb=args.cache_budget_mb,
+        embedding_index=getattr(args, "index", "exact"),
+    )
+
+
+def _open_library(args, out: "JsonLinesWriter") -> Optional[PhotoProcessor]:
+    """Processor reading ``--library``'s cache, or the most recently used one."""
+    processor = _build_processor(args)
+    if args.library:
+        if processor.libraries.get(library_id_for(args.library)) is None:
+            out.write(
+                "error",
+                message=f"No cache for {args.library}; run extract on that folder first.",
+            )
+            return None
+        processor.use_library(args.library)
+    return processor
+
+
+# ---------------------------------------------------------------------- #
+# Subcommands
+# ---------------------------------------------------------------------- #
+def cmd_extract(args, out: JsonLinesWriter) -> int:
+    if not is_photo_source(args.input):
+        out.write("error", message=f"Input directory not found: {args.input}")
+        return 1
+
+    processor = _build_processor(args)
+    progress = ProgressReporter("extract", args.progress)
+    started = time.perf_counter()
+    faces = processor.extract_faces(
+        os.path.abspath(args.input),
+        workers=args.workers,
+        progress=progress,
+        detection=args.detection_settings,
+        quality=args.quality_settings,
+        recognition_batch=args.recognition_batch,
+    )
+    elapsed = time.perf_counter() - started
+
+    for face in faces:
+        out.write(
+            "face",
+            face_id=face["face_id"],
+            original_path=face["original_path"],
+            face_image_path=face["face_image_path"],
+            taken_at=face.get("taken_at"),
+            timestamp_source=face.get("timestamp_source"),
+        )
+    out.write(
+        "summary",
+        command="extract",
+        images=progress.total,
+        faces=len(faces),
+        detection=args.detection_settings.describe(),
+        recognition_batch=args.recognition_batch,
+        library_id=processor.library_id,
+        rejected=processor.load_rejected_faces().get("counts", {}),
+        seconds=round(elapsed, 3),
+        faces_cache_file=processor.faces_cache_file,
+    )
+    return 0
+
+
+def cmd_cluster(args, out: JsonLinesWriter) -> int:
+    processor = _open_library(args, out)
+    if processor is None:
+        return 1
+    faces = processor.load_face_table()
+    if not faces:
+        out.write(
+            "error",
+            message=f"No cached faces in {processor.faces_cache_file}; run extract first.",
+        )
+        return 1
+
+    started = time.perf_counter()
+    labels = processor.cluster_faces(
+        faces, eps=args.eps, min_samples=args.min_samples, mode=args.mode
+    )
+    clusters = processor.generate_cluster_ui_data(faces, labels)
+    elapsed = time.perf_counter() - started
+
+    for cluster in clusters:
+        rows = [face.row for face in cluster["faces"]]
+        face_ids = faces.face_ids[rows].tolist()
+        out.write(
+            "cluster",
+            cluster_id=cluster["cluster_id"],
+            name=cluster["name"],
+            face_count=len(face_ids),
+            photo_count=len(set(faces.photo_ids[rows].tolist())),
+            face_ids=face_ids,
+        )
+    out.write(
+        "summary",
+        command="cluster",
+        faces=len(faces),
+        clusters=sum(1 for cluster in clusters if cluster["cluster_id"] != -1),
+        unidentified_faces=sum(
+            len(cluster["faces"]) for cluster in clusters if cluster["cluster_id"] == -1
+        ),
+        eps=args.eps or PhotoProcessor.DEFAULT_CLUSTER_EPS,
+        min_samples=args.min_samples or PhotoProcessor.DEFAULT_CLUSTER_MIN_SAMPLES,
+        mode=args.mode,
+        seconds=round(elapsed, 3),
+    )
+    return 0
+
+
+def cmd_search(args, out: JsonLinesWriter) -> int:
+    if not is_photo_source(args.input):
+        out.write("error", message=f"Search directory not found: {args.input}")
+        return 1
+    missing = [path for path in args.samples if not os.path.isfile(path)]
+    if missing:
+        out.write("error", message=f"Sample photo not found: {missing[0]}")
+        return 1
+
+    processor = _build_processor(args)
+    progress = ProgressReporter("search", args.progress)
+    started = time.perf_counter()
+    matches = processor.search_for_person(
+        args.samples,
+        os.path.abspath(args.input),
+        args.album,
+        threshold=args.threshold,
+        workers=args.workers,
+        progress=progress,
+        rescan=args.rescan,
+    )
+    elapsed = time.perf_counter() - started
+
+    for path in matches:
+        out.write("match", path=path)
+    out.write(
+        "summary",
+        command="search",
+        images=progress.total,
+        matches=len(matches),
+        album_dir=os.path.join(args.output, args.album) if matches else None,
+        seconds=round(elapsed, 3),
+    )
+    return 0
+
+
+def cmd_export_albums(args, out: JsonLinesWriter) -> int:
+    processor = _open_library(args, out)
+    if processor is None:
+        return 1
+    faces = processor.load_face_table()
+    assignments = processor.load_cluster_assignments()
+    if not faces or not assignments:
+        out.write("error", message="No clustered faces in the cache; run extract and cluster first.")
+        return 1
+
+    destination = args.dest or args.output
+    started = time.perf_counter()
+    plan = PhotoProcessor.save_final_albums(
+        PhotoProcessor.album_clusters_from_assignments(assignments), faces, destination
+    )
+    elapsed = time.perf_counter() - started
+
+    for directory, files in sorted(plan["manifest"]["albums"].items()):
+        out.write(
+            "album", directory=os.path.join(destination, directory), photo_count=len(files)
+        )
+    out.write(
+        "summary",
+        command="export-albums",
+        albums=len(plan["manifest"]["albums"]),
+        copied=len(plan["copies"]),
+        removed=len(plan["removals"]),
+        renamed=len(plan["renames"]),
+        unchanged=plan["unchanged"],
+        missing=len(plan["missing"]),
+        seconds=round(elapsed, 3),
+    )
+    return 0
+
+
+def cmd_libraries(args, out: JsonLinesWriter) -> int:
+    processor = _build_processor(args)
+    evicted = processor.libraries.enforce_budget() if args.evict else []
+    libraries = processor.libraries.list()
+    active = processor.libraries.active_id()
+    for entry in libraries:
+        out.write(
+            "library",
+            library_id=entry["library_id"],
+            source_path=entry.get("source_path"),
+            active=entry["library_id"] == active,
+            face_count=entry.get("face_count"),
+            size_bytes=entry.get("size_bytes", 0),
+            last_used_at=entry.get("last_used_at"),
+        )
+    out.write(
+        "summary",
+        command="libraries",
+        libraries=len(libraries),
+        evicted=evicted,
+        size_bytes=sum(entry.get("size_bytes", 0) for entry in libraries),
+    )
+    return 0
+
+
+# ---------------------------------------------------------------------- #
+# Argument parsing
+# ---------------------------------------------------------------------- #
+def _quality_settings(args) -> QualitySettings:
+    quality = QualitySettings.for_mode(args.quality, keep_rejected=args.keep_rejected)
+    overrides = {
+        "min_face_px": args.min_face_px,
+        "min_det_score": args.min_det_score,
+        "min_sharpness": args.min_sharpness,
+        "max_yaw_deg": args.max_yaw,
+    }
+    thresholds = quality.describe()
+    thresholds.update({name: value for name, value in overrides.items() if value is not None})
+    return QualitySettings(keep_rejected=args.keep_rejected, **thresholds)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--output",
+        default="output_albums",
+        help="Output directory holding albums and the .cache (default: output_albums).",
+    )
+    common.add_argument("--jsonl", default="-", help="Write JSON lines here instead of stdout.")
+    common.add_argument("--quiet", action="store_true", help="Discard processing logs.")
+    common.add_argument(
+        "--cache-budget-mb",
+        type=float,
+        default=float(os.environ["CACHE_BUDGET_MB"]) if os.environ.get("CACHE_BUDGET_MB") else None,
+        help="Evict least recently used folder caches beyond this total size (default: unlimited).",
+    )
+
+    library = argparse.ArgumentParser(add_help=False)
+    library.add_argument(
+        "--library",
+        help="Photo folder whose cache to use (default: the most recently extracted one).",
+    )
+
+    parallel = argparse.ArgumentParser(add_help=False)
+    parallel.add_argument(
+        "--workers", type=int, default=1, help="Images analysed concurrently (default: 1)."
+    )
+    parallel.add_argument("--progress", action="store_true", help="Show progress on stderr.")
+    parallel.add_argument(
+        "--inference-socket",
+        default=os.environ.get("INFERENCE_SOCKET"),
+        help="Use a running inference_worker.py instead of loading the model here.",
+    )
+    parallel.add_argument(
+        "--model",
+        default=os.environ.get("INSIGHTFACE_MODEL"),
+        help="Model pack name or directory, e.g. an INT8 pack from model_quantization.py.",
+    )
+
+    parser = argparse.ArgumentParser(description="Batch face extraction, clustering and album export.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser(
+        "extract", parents=[common, parallel], help="Detect faces and cache crops and embeddings."
+    )
+    extract.add_argument("input", help="Folder or ZIP archive of photos.")
+    extract.add_argument(
+        "--detection",
+        choices=DETECTION_MODES,
+        default="fixed",
+        help="fixed: one detector pass at --det-size; adaptive: low-resolution pass first, "
+        "escalating for large images or small/uncertain faces.",
+    )
+    extract.add_argument(
+        "--det-size",
+        type=int,
+        default=DEFAULT_DET_SIZE,
+        help=f"Detector input size in pixels (default: {DEFAULT_DET_SIZE}).",
+    )
+    extract.add_argument(
+        "--recognition-batch",
+        type=int,
+        default=int(os.environ.get("RECOGNITION_BATCH") or 0),
+        help="Embed faces from many photos together, N per model call (default: 0, one call per face).",
+    )
+    extract.add_argument(
+        "--quality",
+        choices=QUALITY_MODES,
+        default="standard",
+        help="standard: skip tiny, low-score, side-on and blurry faces before embedding; "
+        "off: keep every detected face.",
+    )
+    extract.add_argument("--min-face-px", type=int, help="Override the minimum face box side.")
+    extract.add_argument("--min-det-score", type=float, help="Override the minimum detector score.")
+    extract.add_argument(
+        "--min-sharpness", type=float, help="Override the minimum Laplacian variance of the crop."
+    )
+    extract.add_argument("--max-yaw", type=float, help="Override the maximum head yaw in degrees.")
+    extract.add_argument(
+        "--keep-rejected",
+        action="store_true",
+        help="Record every rejected face in .cache/rejected_faces.json, not just the counts.",
+    )
+    extract.set_defaults(handler=cmd_extract)
+
+    cluster = subparsers.add_parser(
+        "cluster", parents=[common, library], help="Group cached faces into people."
+    )
+    cluster.add_argument("--eps", type=float, default=None, help="DBSCAN eps (default: 0.5).")
+    cluster.add_argument(
+        "--min-samples", type=int, default=None, help="DBSCAN min_samples (default: 2)."
+    )
+    cluster.add_argument(
+        "--mode",
+        choices=CLUSTER_MODES,
+        default="global",
+        help="global: DBSCAN over every face; events: cluster within time-bucketed events, "
+        "never joining two faces of one photo, then merge across events.",
+    )
+    cluster.set_defaults(handler=cmd_cluster, inference_socket=None)
+
+    search = subparsers.add_parser(
+        "search", parents=[common, parallel], help="Copy photos of one person into an album."
+    )
+    search.add_argument("input", help="Folder or ZIP archive of photos to search.")
+    search.add_argument("--samples", nargs="+", required=True, help="Sample photos of the person.")
+    search.add_argument("--album", required=True, help="Album folder name under --output.")
+    search.add_argument(
+        "--threshold", type=float, default=1.2, help="Maximum embedding distance for a match."
+    )
+    search.add_argument(
+        "--index",
+        choices=INDEX_KINDS,
+        default="exact",
+        help="How to search a folder's cached embeddings: exact (default), or compressed "
+        "ivf-sq8 / ivf-pq with exact re-ranking for very large folders.",
+    )
+    search.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Run the model on every photo even when the folder's faces are cached.",
+    )
+    search.set_defaults(handler=cmd_search)
+
+    export = subparsers.add_parser(
+        "export-albums", parents=[common, library], help="Write one folder per clustered person."
+    )
+    export.add_argument("--dest", help="Album destination (default: --output).")
+    export.set_defaults(handler=cmd_export_albums, inference_socket=None)
+
+    libraries = subparsers.add_parser(
+        "libraries",
+        parents=[common],
+        help="List cached photo folders, most recent first.",
+    )
+    libraries.add_argument(
+        "--evict",
+        action="store_true",
+        help="First delete least recently used folders until --cache-budget-mb is met.",
+    )
+    libraries.set_defaults(handler=cmd_libraries, inference_socket=None)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "workers", 1) < 1:
+        args.workers = 1
+    if args.command == "extract":
+        try:
+            args.detection_settings = DetectionSettings(
+                mode=args.detection, det_size=args.det_size
+            )
+            args.quality_settings = _quality_settings(args)
+            if not 0 <= args.recognition_batch <= MAX_RECOGNITION_BATCH:
+                raise ValueError(
+                    f"--recognition-batch must be between 0 and {MAX_RECOGNITION_BATCH}."
+                )
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    with contextlib.ExitStack() as stack:
+        if args.jsonl == "-":
+            stream = sys.stdout
+        else:
+            stream = stack.enter_context(open(args.jsonl, "w"))
+        log_target = (
+            stack.enter_context(open(os.devnull, "w")) if args.quiet else sys.stderr
+        )
+        out = JsonLinesWriter(stream)
+        # PhotoProcessor logs with print(); keep that off the JSON stream.
+        with contextlib.redirect_stdout(log_target):
+            return args.handler(args, out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,48 +1,419 @@
+import functools
+import hashlib
+import io
+import itertools
 import json
 import os
 import shutil
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
 
 import cv2
-import insightface
 import numpy as np
 from PIL import ExifTags, Image
-from insightface.app import FaceAnalysis
-from sklearn.cluster import DBSCAN
+
+import metrics
+from cluster_review import ClusterReview
+from cooccurrence import CooccurrenceIndex
+from embedding_index import INDEX_KINDS, ExactIndex, IVFIndex, build_index
+from event_clustering import CLUSTER_MODES, DEFAULT_EVENT_GAP_HOURS, cluster_by_events
+from face_detection import DetectionSettings, detect_faces
+from face_embedding import RecognitionBatcher, align_chip, recognition_model, supports_batching
+from face_pack import FacePack, render_sprite, sprite_key
+from face_table import FaceIdIndex, FaceTable, FaceTableBuilder
+from face_quality import FACES_REJECTED, QualitySettings, check_face
+from inference_scheduler import BULK, INTERACTIVE, InferenceScheduler
+from job_profiler import follow_job
+from library_cache import LibraryRegistry, library_id_for, source_fingerprint
+from model_quantization import resolve_model_dir
+from photo_sources import (
+    album_file_names,
+    copy_photo,
+    is_archive,
+    list_archive_images,
+    photo_stat,
+    read_photo,
+    split_archive_path,
+)
 
 
 EXIF_DATETIME_KEYS = ["DateTimeOriginal", "DateTimeDigitized", "DateTime"]
 EXIF_TAG_MAP = {v: k for k, v in ExifTags.TAGS.items() if isinstance(v, str)}
+FACE_CROP_DIGEST_LENGTH = 20
+TIMELINE_VIEWS_VERSION = 2
+# Photos sent to the inference worker per round trip.
+INFERENCE_BATCH_IMAGES = 8
+ALBUM_MANIFEST_FILENAME = ".albums_manifest.json"
+ALBUM_MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+EMBEDDING_INDEX_FILENAME = "embedding_index.npz"
+# Smaller libraries are searched exactly whatever index is configured.
+EMBEDDING_INDEX_MIN_FACES = 20000
+
+
+def _parse_iso_timestamp(value: str):
+    """Parse ISO strings generated by the processor into datetime objects."""
+    if not value:
+        return None
+    try:
+        normalized = value.replace("Z", "+00:00")
+        return datetime.fromisoformat(normalized)
+    except ValueError:
+        return None
+
+
+def _timeline_sort_key(dt: datetime) -> datetime:
+    # EXIF timestamps are naive while file times carry UTC; compare wall-clock.
+    return dt.replace(tzinfo=None)
+
+
+def _format_day_label(dt: datetime):
+    return dt.strftime("%B %d, %Y")
+
+
+def _format_time_label(dt: datetime):
+    return dt.strftime("%H:%M:%S")
+
+
+def _file_signature(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def list_image_files(directory: str) -> List[str]:
+    """
+    Paths of the supported images directly inside ``directory``, or of every
+    image in it when ``directory`` is a ZIP archive (see ``photo_sources``).
+    """
+    if is_archive(directory):
+        return list_archive_images(directory, IMAGE_EXTENSIONS)
+    return [
+        os.path.join(directory, f)
+        for f in os.listdir(directory)
+        if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+    ]
+
+
+def read_image(path: str) -> Optional[np.ndarray]:
+    """Decodes a photo from a folder or an archive; None when it cannot be read."""
+    if split_archive_path(path)[0] is None:
+        return cv2.imread(path)
+    try:
+        data = read_photo(path)
+    except OSError:
+        return None
+    return _decode_image(data)
+
+
+def _decode_image(data: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _map_in_order(func, items: List, workers: int = 1):
+    """
+    Yields ``func(item)`` for each item in order, running up to ``workers``
+    calls at once. Decoding and ONNX inference release the GIL, so threads
+    overlap the heavy parts. A profiled job also profiles the worker threads.
+    """
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="photo-worker") as executor:
+        yield from executor.map(follow_job(func), items)
+
+
+def create_face_analysis(
+    det_size: Tuple[int, int] = (640, 640), model: Optional[str] = None
+):
+    """
+    Builds and prepares the InsightFace pipeline used for detection and embedding.
+
+    ``model`` is a model pack name or directory, e.g. an INT8 pack written by
+    ``model_quantization.py``; the default pack is used when omitted.
+    """
+    # Imported here: insightface pulls in onnxruntime and friends, which
+    # alone add seconds to startup.
+    from insightface.app import FaceAnalysis
+
+    if model:
+        # InsightFace joins ``name`` onto its model root, so an existing pack
+        # directory is passed as an absolute path; a bare pack name is left
+        # as is so InsightFace can still download it.
+        model_dir = resolve_model_dir(model)
+        face_app = FaceAnalysis(
+            name=model_dir if os.path.isdir(model_dir) else model,
+            providers=["CPUExecutionProvider"],
+        )
+    else:
+        face_app = FaceAnalysis(providers=["CPUExecutionProvider"])
+    face_app.prepare(ctx_id=0, det_size=det_size)
+    return face_app
+
+
+class LibraryContext:
+    """
+    Cache paths, crop pack and in-memory caches of one library.
+
+    The processor only swaps which context is active. A job resolves its
+    context once and passes it along, so when another request switches
+    folders mid-job the job's crops and cache writes stay in its own library.
+    """
+
+    def __init__(self, library_id: Optional[str], library_path: str):
+        self.library_id = library_id
+        self.library_path = library_path
+        self.faces_cache_path = os.path.join(library_path, "faces")
+        self.faces_cache_file = os.path.join(library_path, "all_faces_data.json")
+        self.rejected_faces_file = os.path.join(library_path, "rejected_faces.json")
+        self.cluster_assignments_path = os.path.join(library_path, "cluster_assignments.json")
+        self.timeline_views_path = os.path.join(library_path, "timeline_views.json")
+        self.timeline_views_dir = os.path.join(library_path, "timeline_views")
+        self.cooccurrence_path = os.path.join(library_path, "cooccurrence_index.json")
+        self.sprites_path = os.path.join(library_path, "sprites")
+        os.makedirs(self.faces_cache_path, exist_ok=True)
+        self.face_pack = FacePack(library_path)
+        # Serialises read-modify-write of the cluster assignments and views.
+        self.assignments_lock = threading.RLock()
+        self.clear_caches()
+
+    def clear_caches(self) -> None:
+        self.face_table_cache = None
+        self.timeline_views_cache = None
+        # cluster view file name -> (file signature, view)
+        self.timeline_cluster_cache = {}
+        self.cooccurrence_cache = None
+        self.cluster_review_cache = None
+
+
+def _active_library_attribute(name: str):
+    return property(
+        lambda self: getattr(self.library, name), doc=f"The active library's ``{name}``."
+    )
 
 
 class PhotoProcessor:
     DEFAULT_CLUSTER_EPS = 0.5
     DEFAULT_CLUSTER_MIN_SAMPLES = 2
 
-    def __init__(self, output_path_base: str = "output_albums"):
+    def __init__(
+        self,
+        output_path_base: str = "output_albums",
+        inference_address: Optional[str] = None,
+        detection: Optional[DetectionSettings] = None,
+        model: Optional[str] = None,
+        quality: Optional[QualitySettings] = None,
+        cache_budget_mb: Optional[float] = None,
+        recognition_batch: int = 0,
+        embedding_index: str = "exact",
+        scheduler: Optional[InferenceScheduler] = None,
+    ):
         """
-        Initializes the PhotoProcessor, loading the InsightFace model and setting up cache paths.
+        Initializes the PhotoProcessor and sets up cache paths.
+
+        The InsightFace model is loaded on first use (see ``app``), so routes
+        that only read cached data never pay for it. When ``inference_address``
+        names an inference worker socket, detection and embedding run there
+        instead of in this process. ``detection`` is the default detector
+        policy for extraction jobs (fixed 640x640 when omitted). ``model``
+        selects a model pack other than the default, such as an INT8 copy.
+        ``quality`` holds the default face quality gates (standard thresholds
+        when omitted).
+
+        Face caches are kept per source folder (see ``library_cache``); the
+        paths below point at the active library, or at the pre-library
+        ``.cache`` layout until a folder is first processed.
+        ``cache_budget_mb`` caps the total size of all library caches.
+        ``recognition_batch`` is the default batch size for cross-image
+        recognition during extraction (0 embeds each face on its own).
+        ``embedding_index`` picks how cached embeddings are searched (see
+        ``embedding_index.INDEX_KINDS``). Every inference call takes a slot
+        from ``scheduler`` (see ``inference_scheduler``): searches run as
+        interactive work and extraction as bulk work.
         """
-        self.app = FaceAnalysis(providers=["CPUExecutionProvider"])
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        if embedding_index not in INDEX_KINDS:
+            raise ValueError(
+                f"Unknown embedding index: {embedding_index}. Choose from {', '.join(INDEX_KINDS)}."
+            )
+        self.inference_address = inference_address
+        self.model = model
+        self.detection = detection or DetectionSettings()
+        self.quality = quality or QualitySettings()
+        self.recognition_batch = recognition_batch
+        self.embedding_index = embedding_index
+        self._embedding_index_cache = None
+        self.scheduler = scheduler or InferenceScheduler()
+        self._app = None
+        self._app_lock = threading.Lock()
         self.output_path = output_path_base
         self.cache_path = os.path.join(self.output_path, ".cache")
-        self.faces_cache_path = os.path.join(self.cache_path, "faces")
-        self.faces_cache_file = os.path.join(self.cache_path, "all_faces_data.json")
-        self.cluster_assignments_path = os.path.join(
-            self.cache_path, "cluster_assignments.json"
+        self.profiles_path = os.path.join(self.cache_path, "profiles")
+        self.libraries = LibraryRegistry(
+            self.cache_path,
+            budget_bytes=None if cache_budget_mb is None else int(cache_budget_mb * 1024 * 1024),
         )
-        os.makedirs(self.faces_cache_path, exist_ok=True)
+        self._contexts = {}
+        self._contexts_lock = threading.Lock()
+        self.library = self._context(self.libraries.active_id())
+
+    # ------------------------------------------------------------------ #
+    # Library caches
+    # ------------------------------------------------------------------ #
+    library_id = _active_library_attribute("library_id")
+    library_path = _active_library_attribute("library_path")
+    faces_cache_path = _active_library_attribute("faces_cache_path")
+    faces_cache_file = _active_library_attribute("faces_cache_file")
+    rejected_faces_file = _active_library_attribute("rejected_faces_file")
+    cluster_assignments_path = _active_library_attribute("cluster_assignments_path")
+    timeline_views_path = _active_library_attribute("timeline_views_path")
+    cooccurrence_path = _active_library_attribute("cooccurrence_path")
+    sprites_path = _active_library_attribute("sprites_path")
+    face_pack = _active_library_attribute("face_pack")
+
+    def _context(self, library_id: Optional[str]) -> LibraryContext:
+        """
+        The context of ``library_id`` (the pre-library ``.cache`` layout when
+        None). One per library, so every job on it shares one crop pack.
+        """
+        with self._contexts_lock:
+            context = self._contexts.get(library_id)
+            # An evicted library gets a fresh context (and an empty crop pack).
+            if context is None or not os.path.isdir(context.faces_cache_path):
+                library_path = (
+                    self.libraries.library_dir(library_id) if library_id else self.cache_path
+                )
+                context = self._contexts[library_id] = LibraryContext(library_id, library_path)
+            return context
+
+    def _activate(self, library_id: Optional[str]) -> LibraryContext:
+        context = self._context(library_id)
+        previous, self.library = self.library, context
+        if previous is not context:
+            # Jobs still holding the old context reload whatever they need.
+            previous.clear_caches()
+        return context
+
+    def open_library(self, source_path: str) -> LibraryContext:
+        """Makes the cache of ``source_path`` the active one and returns its context."""
+        return self._activate(self.libraries.activate(source_path))
+
+    @contextmanager
+    def library_job(self, source_path: str):
+        """
+        Opens ``source_path``'s library for one job and keeps its cache from
+        being evicted (by this or another job's budget check) until the block
+        ends. Yields the ``LibraryContext``.
+        """
+        with self.libraries.holding(library_id_for(source_path)):
+            yield self.open_library(source_path)
+
+    def use_library(self, source_path: str) -> str:
+        """Makes the cache of ``source_path`` the active one and returns its id."""
+        return self.open_library(source_path).library_id
+
+    def sync_active_library(self) -> None:
+        """Follows a library switch made by another process sharing the cache."""
+        active = self.libraries.active_id()
+        if active and active != self.library.library_id:
+            self._activate(active)
+
+    def _extraction_settings(
+        self, detection: DetectionSettings, quality: QualitySettings
+    ) -> dict:
+        """Everything besides the photos that changes extraction output."""
+        return {
+            "detection": detection.describe(),
+            "quality": quality.describe(),
+            "model": self.model,
+        }
+
+    def _prune_unused_crops(self, all_faces: FaceTable, library: LibraryContext) -> None:
+        """
+        Drops crops of ``library`` that no face references any more, plus
+        loose crop files the pack now holds, and the library's sprites.
+        """
+        if not library.library_id:
+            return
+        referenced = all_faces.crop_name_set()
+        reclaimed = library.face_pack.compact(
+            filter(None, (self.face_crop_digest(name) for name in referenced))
+        )
+        if reclaimed:
+            print(f"Compacted face-crop pack, reclaimed {reclaimed / (1024 * 1024):.1f} MB.")
+        for entry in os.scandir(library.faces_cache_path):
+            if not entry.is_file():
+                continue
+            digest = self.face_crop_digest(entry.name)
+            if entry.name not in referenced or (digest and digest in library.face_pack):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        shutil.rmtree(library.sprites_path, ignore_errors=True)
+
+    # ------------------------------------------------------------------ #
+    # Model loading
+    # ------------------------------------------------------------------ #
+    @property
+    def app(self):
+        """The InsightFace FaceAnalysis instance, loaded on first access."""
+        return self.ensure_model_loaded()
+
+    def ensure_model_loaded(self):
+        if self._app is None:
+            with self._app_lock:
+                if self._app is None:
+                    self._app = self._load_model()
+        return self._app
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._app is not None
+
+    def _load_model(self):
+        if self.inference_address:
+            # Imported here so web workers that delegate inference stay small.
+            from inference_worker import RemoteFaceAnalysis
+
+            print(f"Using inference worker at {self.inference_address}")
+            return RemoteFaceAnalysis(self.inference_address)
+
+        print("Loading InsightFace model, this may take a moment...")
+        face_app = create_face_analysis(model=self.model)
+        metrics.instrument_face_analysis(face_app)
+        print("Model loaded successfully.")
+        return face_app
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """Loads the model ahead of the first inference, optionally in a daemon thread."""
+        if not background:
+            self.ensure_model_loaded()
+            return None
+        thread = threading.Thread(
+            target=self.ensure_model_loaded, name="insightface-warmup", daemon=True
+        )
+        thread.start()
+        return thread
 
     # ------------------------------------------------------------------ #
     # Timestamp helpers
     # ------------------------------------------------------------------ #
     @staticmethod
-    def _read_exif_timestamp(image_path: str) -> Optional[str]:
-        """Attempt to extract a timestamp from EXIF DateTime fields."""
+    def _read_exif_timestamp(image_path: str, data: Optional[bytes] = None) -> Optional[str]:
+        """
+        Attempt to extract a timestamp from EXIF DateTime fields. ``data``
+        holds the photo's bytes when they were already read from an archive.
+        """
         try:
-            with Image.open(image_path) as img:
+            with Image.open(io.BytesIO(data) if data is not None else image_path) as img:
                 exif_data = img._getexif() or {}
         except Exception:
             return None
@@ -69,15 +440,17 @@ class PhotoProcessor:
         return None
 
     @staticmethod
-    def _determine_photo_timestamp(image_path: str) -> Tuple[Optional[str], str]:
+    def _determine_photo_timestamp(
+        image_path: str, data: Optional[bytes] = None
+    ) -> Tuple[Optional[str], str]:
         """Determine the best available timestamp for a source photo."""
-        exif_timestamp = PhotoProcessor._read_exif_timestamp(image_path)
+        exif_timestamp = PhotoProcessor._read_exif_timestamp(image_path, data)
         if exif_timestamp:
             return exif_timestamp, "exif"
 
         try:
             modified_time = datetime.fromtimestamp(
-                os.path.getmtime(image_path), tz=timezone.utc
+                photo_stat(image_path)[1] / 1e9, tz=timezone.utc
             )
             return modified_time.isoformat(timespec="seconds"), "file_modified"
         except Exception:
@@ -86,211 +459,1596 @@ class PhotoProcessor:
     # ------------------------------------------------------------------ #
     # Core processing
     # ------------------------------------------------------------------ #
-    def extract_faces(self, input_path: str) -> List[dict]:
+    def extract_faces(
+        self,
+        input_path: str,
+        workers: int = 1,
+        progress=None,
+        detection: Optional[DetectionSettings] = None,
+        quality: Optional[QualitySettings] = None,
+        recognition_batch: Optional[int] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> FaceTable:
         """
         Extracts all faces from images in a directory, saves cropped faces, and returns face data.
+
+        ``workers`` > 1 decodes and analyses images on a thread pool; face ids
+        are still assigned in file order. ``progress(done, total)`` is called
+        after each image. ``detection`` and ``quality`` override the
+        processor's detector policy and face quality gates for this job;
+        rejected faces are counted in ``rejected_faces.json``.
+        ``recognition_batch`` > 0 embeds faces from many images together in
+        batches of that size instead of one model call per face (local
+        models only); None uses the processor's default.
+
+        Results go to the cache of ``input_path``'s library (``library``,
+        from ``library_job``, when the caller already resolved it). When the
+        photos and settings are unchanged since that cache was built, the
+        cached faces are returned without running the model.
         """
+        if library is None:
+            with self.library_job(input_path) as library:
+                return self.extract_faces(
+                    input_path,
+                    workers=workers,
+                    progress=progress,
+                    detection=detection,
+                    quality=quality,
+                    recognition_batch=recognition_batch,
+                    library=library,
+                )
+
         print(f"Starting face extraction for directory: {input_path}")
-        image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
-        all_faces = []
         try:
-            image_files = [
-                os.path.join(input_path, f)
-                for f in os.listdir(input_path)
-                if os.path.splitext(f)[1].lower() in image_extensions
-            ]
+            image_files = list_image_files(input_path)
         except FileNotFoundError:
             print(f"Error: Input directory not found at {input_path}")
-            return []
+            return FaceTable.empty()
 
         print(f"Found {len(image_files)} images to process.")
 
-        face_id_counter = 0
-        for image_path in image_files:
-            try:
-                taken_at, timestamp_source = self._determine_photo_timestamp(image_path)
-                img = cv2.imread(image_path)
-                if img is None:
-                    print(f"Could not read image: {image_path}")
-                    continue
+        detection = detection or self.detection
+        quality = quality or self.quality
+        if recognition_batch is None:
+            recognition_batch = self.recognition_batch
+        library_id = library.library_id
+        fingerprint = source_fingerprint(image_files)
+        settings = self._extraction_settings(detection, quality)
+        entry = self.libraries.get(library_id) or {}
+        if (
+            entry.get("fingerprint") == fingerprint
+            and entry.get("settings") == settings
+            and os.path.exists(library.faces_cache_file)
+        ):
+            metrics.record_cache("library", True)
+            all_faces = self.load_face_table(library)
+            print(f"Photos unchanged since the last run; reusing {len(all_faces)} cached faces.")
+            return all_faces
+        metrics.record_cache("library", False)
 
-                faces = self.app.get(img)
-                if not faces:
-                    continue
+        with metrics.track_job("extract"):
+            all_faces, rejected = self._extract_faces_from_files(
+                image_files,
+                workers=workers,
+                progress=progress,
+                detection=detection,
+                quality=quality,
+                recognition_batch=recognition_batch,
+                library=library,
+            )
 
-                print(
-                    f"Found {len(faces)} faces in: {os.path.basename(image_path)}"
+        print(f"Total faces extracted: {len(all_faces)} ({len(rejected)} rejected by quality gates)")
+        self.save_face_data(all_faces, library)
+        self.save_rejected_faces(rejected, quality, library)
+        self._prune_unused_crops(all_faces, library)
+        self.libraries.update(
+            library_id,
+            fingerprint=fingerprint,
+            settings=settings,
+            face_count=len(all_faces),
+            image_count=len(image_files),
+            extracted_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        self.libraries.record_size(library_id)
+        # Another job may have switched the active library meanwhile.
+        self.libraries.enforce_budget(protect=[library_id])
+        return all_faces
+
+    def _extract_faces_from_files(
+        self,
+        image_files: List[str],
+        workers: int = 1,
+        progress=None,
+        detection: Optional[DetectionSettings] = None,
+        quality: Optional[QualitySettings] = None,
+        recognition_batch: int = 0,
+        library: Optional[LibraryContext] = None,
+    ) -> Tuple[FaceTable, List[dict]]:
+        """
+        Returns ``(faces, rejected)``; rejected entries describe gated faces.
+        Crops go to ``library`` (the active one when omitted).
+        """
+        library = library or self.library
+        builder = FaceTableBuilder()
+        rejected = []
+        batcher = None
+        if recognition_batch > 0:
+            rec_model = recognition_model(self.app)
+            if supports_batching(rec_model):
+                batcher = RecognitionBatcher(
+                    rec_model, recognition_batch, slot=lambda: self.scheduler.slot(BULK)
                 )
-                for face in faces:
-                    bbox = face.bbox.astype(int)
-                    x1, y1, x2, y2 = bbox
-                    cropped_face = img[y1:y2, x1:x2]
+            else:
+                print("Batched recognition needs a local model with a dynamic batch size; embedding per face.")
+        started = time.perf_counter()
+        processed_images = 0
+        total = len(image_files)
+        metrics.QUEUE_DEPTH.set(total, queue="extract")
 
-                    face_filename = f"face_{face_id_counter}.jpg"
-                    face_filepath = os.path.join(self.faces_cache_path, face_filename)
-                    cv2.imwrite(face_filepath, cropped_face)
+        face_id_counter = 0
+        detection = detection or self.detection
+        quality = quality or self.quality
+        rec_model = batcher.rec_model if batcher else None
+        if self.inference_address:
+            batches = [
+                image_files[start : start + INFERENCE_BATCH_IMAGES]
+                for start in range(0, total, INFERENCE_BATCH_IMAGES)
+            ]
+            # At least two batches in flight, so the worker is never idle
+            # while the next batch is decoded.
+            results = itertools.chain.from_iterable(
+                _map_in_order(
+                    lambda batch: self._extract_batch(batch, detection, quality, library),
+                    batches,
+                    max(workers, 2),
+                )
+            )
+        else:
+            results = _map_in_order(
+                lambda image_path: self._extract_image(
+                    image_path, detection, quality, rec_model, library
+                ),
+                image_files,
+                workers,
+            )
+        for done, (image_path, result) in enumerate(zip(image_files, results), start=1):
+            metrics.QUEUE_DEPTH.set(total - done, queue="extract")
+            if progress is not None:
+                progress(done, total)
+            if result is None:
+                continue
 
-                    all_faces.append(
-                        {
-                            "face_id": face_id_counter,
-                            "embedding": face.embedding,
-                            "original_path": image_path,
-                            "face_image_path": face_filepath,
-                            "taken_at": taken_at,
-                            "timestamp_source": timestamp_source,
-                        }
+            taken_at, timestamp_source, faces, image_rejected = result
+            processed_images += 1
+            for entry in image_rejected:
+                rejected.append({"original_path": image_path, **entry})
+            for payload, face_filepath in faces:
+                row = builder.append(
+                    face_id_counter,
+                    image_path,
+                    face_filepath,
+                    taken_at,
+                    timestamp_source,
+                    embedding=None if batcher else payload,
+                )
+                if batcher:
+                    batcher.add(payload, functools.partial(builder.set_embedding, row))
+                face_id_counter += 1
+
+        if batcher:
+            batcher.flush()
+            print(
+                f"Embedded {batcher.embedded} faces in {batcher.calls} batched recognition calls."
+            )
+
+        elapsed = time.perf_counter() - started
+        if processed_images and elapsed > 0:
+            metrics.LAST_RUN_IMAGES_PER_SECOND.set(processed_images / elapsed)
+            metrics.LAST_RUN_FACES_PER_IMAGE.set(len(builder) / processed_images)
+        return builder.build(), rejected
+
+    def _extract_image(
+        self,
+        image_path: str,
+        detection: DetectionSettings,
+        quality: QualitySettings,
+        rec_model=None,
+        library: Optional[LibraryContext] = None,
+    ):
+        """
+        Detects faces in one image and writes crops for those passing the
+        quality gates into ``library`` (the active one when omitted).
+
+        Returns ``(taken_at, timestamp_source, [(embedding, crop_path), ...],
+        [rejected face, ...])``, or None when the image could not be read or
+        processed. With ``rec_model`` (batched recognition) faces are not
+        embedded here and each entry carries the aligned chip instead.
+        """
+        try:
+            loaded = self._read_image(image_path)
+            if loaded is None:
+                return None
+            taken_at, timestamp_source, img = loaded
+
+            rejected = []
+            gate = self._quality_gate(img, quality, rejected)
+            # One slot per image: waiting searches get in at the next image.
+            with self.scheduler.slot(BULK), metrics.time_stage("inference"):
+                if detection.is_default and gate is None and rec_model is None:
+                    faces = self.app.get(img)
+                else:
+                    faces = detect_faces(
+                        self.app, img, detection, gate=gate, embed=rec_model is None
                     )
-                    face_id_counter += 1
+            extracted = self._finish_image(image_path, img, faces, rejected, rec_model, library)
+            return taken_at, timestamp_source, extracted, rejected
+        except Exception as exc:
+            self._image_failed(image_path, exc)
+            return None
+
+    def _extract_batch(
+        self,
+        image_paths: List[str],
+        detection: DetectionSettings,
+        quality: QualitySettings,
+        library: Optional[LibraryContext] = None,
+    ) -> list:
+        """
+        ``_extract_image`` for several photos in one inference worker round
+        trip; the worker spreads the batch over its pool processes. Returns
+        one result (or None) per path.
+        """
+        results = [None] * len(image_paths)
+        loaded = []
+        for index, image_path in enumerate(image_paths):
+            try:
+                item = self._read_image(image_path)
             except Exception as exc:
-                print(f"An error occurred while processing {image_path}: {exc}")
+                self._image_failed(image_path, exc)
+                continue
+            if item is not None:
+                loaded.append((index, item))
+        if not loaded:
+            return results
 
-        print(f"Total faces extracted: {len(all_faces)}")
-        self.save_face_data(all_faces)
-        return all_faces
+        try:
+            # One slot per batch, so searches get in at the next batch.
+            with self.scheduler.slot(BULK), metrics.time_stage("inference"):
+                batch_faces = self.app.get_batch(
+                    [img for _index, (_taken_at, _source, img) in loaded], detection=detection
+                )
+        except Exception as exc:
+            for index, _item in loaded:
+                self._image_failed(image_paths[index], exc)
+            return results
+
+        for (index, (taken_at, timestamp_source, img)), faces in zip(loaded, batch_faces):
+            try:
+                rejected = []
+                gate = self._quality_gate(img, quality, rejected)
+                if gate is not None:
+                    faces = [face for face in faces if gate(face)]
+                extracted = self._finish_image(
+                    image_paths[index], img, faces, rejected, None, library
+                )
+                results[index] = (taken_at, timestamp_source, extracted, rejected)
+            except Exception as exc:
+                self._image_failed(image_paths[index], exc)
+        return results
+
+    def _read_image(self, image_path: str):
+        """``(taken_at, timestamp_source, img)``, or None when the photo cannot be decoded."""
+        data = None
+        if split_archive_path(image_path)[0] is not None:
+            # Archive members are read once and decoded from memory.
+            with metrics.time_stage("decode"):
+                data = read_photo(image_path)
+        with metrics.time_stage("exif"):
+            taken_at, timestamp_source = self._determine_photo_timestamp(image_path, data)
+        with metrics.time_stage("decode"):
+            img = cv2.imread(image_path) if data is None else _decode_image(data)
+        if img is None:
+            print(f"Could not read image: {image_path}")
+            metrics.IMAGES_TOTAL.inc(result="unreadable")
+            return None
+        return taken_at, timestamp_source, img
+
+    @staticmethod
+    def _quality_gate(img: np.ndarray, quality: QualitySettings, rejected: List[dict]):
+        """
+        The per-face check passed to ``detect_faces``, or None when the gates
+        are off. Rejected faces are appended to ``rejected``.
+        """
+        if not quality.enabled:
+            return None
+
+        def check_quality(face):
+            reason, measurements = check_face(face, img, quality)
+            if reason is None:
+                return True
+            FACES_REJECTED.inc(reason=reason)
+            rejected.append(
+                {
+                    "bbox": [round(float(value), 1) for value in face.bbox[:4]],
+                    "reason": reason,
+                    **measurements,
+                }
+            )
+            return False
+
+        return check_quality
+
+    def _finish_image(
+        self,
+        image_path: str,
+        img: np.ndarray,
+        faces: list,
+        rejected: List[dict],
+        rec_model=None,
+        library: Optional[LibraryContext] = None,
+    ) -> List[tuple]:
+        """Counts one image's faces and writes the crops of those kept."""
+        detected = len(faces) + len(rejected)
+        metrics.IMAGES_TOTAL.inc(result="processed")
+        metrics.FACES_PER_IMAGE.observe(detected)
+        metrics.FACES_TOTAL.inc(detected)
+        if detected:
+            print(
+                f"Found {detected} faces in: {os.path.basename(image_path)}"
+                + (f" ({len(rejected)} rejected)" if rejected else "")
+            )
+
+        extracted = []
+        for face in faces:
+            bbox = face.bbox.astype(int)
+            x1, y1, x2, y2 = bbox
+            cropped_face = img[y1:y2, x1:x2]
+
+            with metrics.time_stage("crop_write"):
+                face_filepath = self._write_face_crop(cropped_face, library)
+            if rec_model is not None:
+                extracted.append((align_chip(rec_model, img, face), face_filepath))
+            else:
+                extracted.append((face.embedding, face_filepath))
+        return extracted
+
+    @staticmethod
+    def _image_failed(image_path: str, exc: Exception) -> None:
+        metrics.IMAGES_TOTAL.inc(result="failed")
+        print(f"An error occurred while processing {image_path}: {exc}")
+
+    def _write_face_crop(
+        self, cropped_face: np.ndarray, library: Optional[LibraryContext] = None
+    ) -> str:
+        """
+        Encodes a face crop, appends it to ``library``'s crop pack (the active
+        library's when omitted) and returns its content-addressed path.
+
+        Names derive from the JPEG bytes, so a URL never points at different
+        content across runs and browsers may cache crops indefinitely. The
+        path is virtual: ``read_face_crop`` resolves it from the pack.
+        """
+        success, encoded = cv2.imencode(".jpg", cropped_face)
+        if not success:
+            raise ValueError("Could not encode face crop as JPEG.")
+        data = encoded.tobytes()
+        digest = hashlib.sha256(data).hexdigest()[:FACE_CROP_DIGEST_LENGTH]
+        library = library or self.library
+        written = library.face_pack.append(digest, data)
+        metrics.record_cache("face_crop", not written)
+        return os.path.join(library.faces_cache_path, f"face_{digest}.jpg")
+
+    def read_face_crops(self, face_image_paths: List[str]) -> List[Optional[bytes]]:
+        """
+        JPEG bytes of each crop, from the pack or else from a loose file
+        (caches written before crops were packed); None when missing.
+        """
+        library = self.library
+        digests = [self.face_crop_digest(path) for path in face_image_paths]
+        packed = library.face_pack.read_many(digest for digest in digests if digest)
+        crops = []
+        for path, digest in zip(face_image_paths, digests):
+            data = packed.get(digest) if digest else None
+            if data is None:
+                loose_path = os.path.join(library.faces_cache_path, os.path.basename(path))
+                for candidate in (loose_path, path):
+                    try:
+                        with open(candidate, "rb") as crop_file:
+                            data = crop_file.read()
+                        break
+                    except OSError:
+                        continue
+            crops.append(data)
+        return crops
+
+    def read_face_crop(self, face_image_path: str) -> Optional[bytes]:
+        return self.read_face_crops([face_image_path])[0]
+
+    def cluster_sprite(self, faces: List[dict]) -> Tuple[str, str]:
+        """
+        Returns ``(key, path)`` of a sprite sheet of ``faces`` (in order),
+        rendering it into the library's ``sprites/`` folder if needed.
+        """
+        paths = [face.get("face_image_path") or face.get("face_image_url") or "" for face in faces]
+        key = sprite_key([os.path.basename(path) for path in paths])
+        sprites_path = self.sprites_path
+        sprite_path = os.path.join(sprites_path, f"sprite_{key}.jpg")
+        if os.path.exists(sprite_path):
+            metrics.record_cache("sprite", True)
+            return key, sprite_path
+        metrics.record_cache("sprite", False)
+        data = render_sprite(self.read_face_crops(paths))
+        os.makedirs(sprites_path, exist_ok=True)
+        temp_path = f"{sprite_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as sprite_file:
+            sprite_file.write(data)
+        os.replace(temp_path, sprite_path)
+        return key, sprite_path
 
-    def save_face_data(self, all_faces: List[dict]) -> None:
+    @staticmethod
+    def face_crop_digest(filename: str) -> Optional[str]:
+        """Return the content digest embedded in a crop filename, if any."""
+        stem, ext = os.path.splitext(os.path.basename(filename))
+        if ext != ".jpg" or not stem.startswith("face_"):
+            return None
+        digest = stem[len("face_"):]
+        if len(digest) != FACE_CROP_DIGEST_LENGTH:
+            return None
+        if any(c not in "0123456789abcdef" for c in digest):
+            return None
+        return digest
+
+    def save_face_data(
+        self, all_faces: FaceTable, library: Optional[LibraryContext] = None
+    ) -> None:
         """Saves the extracted face data (including embeddings) to a JSON file in the cache."""
-        serializable_faces = [
-            {
-                "face_id": face["face_id"],
-                "embedding": face["embedding"].tolist(),
-                "original_path": face["original_path"],
-                "face_image_path": face["face_image_path"],
-                "face_image_url": f"/output_albums/.cache/faces/{os.path.basename(face['face_image_path'])}",
-                "taken_at": face.get("taken_at"),
-                "timestamp_source": face.get("timestamp_source"),
-            }
-            for face in all_faces
-        ]
-        os.makedirs(self.cache_path, exist_ok=True)
-        with open(self.faces_cache_file, "w") as cache_file:
-            json.dump(serializable_faces, cache_file)
+        library = library or self.library
+        all_faces.save(library.faces_cache_file)
+        library.face_table_cache = None
+
+    def save_rejected_faces(
+        self,
+        rejected: List[dict],
+        quality: QualitySettings,
+        library: Optional[LibraryContext] = None,
+    ) -> None:
+        """
+        Writes rejection counts per reason, plus every rejected face when
+        ``quality.keep_rejected`` is set, to the cache side table.
+        """
+        library = library or self.library
+        counts = defaultdict(int)
+        for entry in rejected:
+            counts[entry["reason"]] += 1
+        payload = {
+            "thresholds": quality.describe(),
+            "counts": dict(counts),
+            "total": len(rejected),
+            "faces": rejected if quality.keep_rejected else [],
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        os.makedirs(library.library_path, exist_ok=True)
+        with open(library.rejected_faces_file, "w") as rejected_file:
+            json.dump(payload, rejected_file)
+
+    def load_rejected_faces(self) -> dict:
+        try:
+            with open(self.rejected_faces_file, "r") as rejected_file:
+                return json.load(rejected_file)
+        except FileNotFoundError:
+            return {"counts": {}, "total": 0, "faces": []}
 
     def cluster_faces(
-        self, all_faces: List[dict], eps: float = None, min_samples: int = None
+        self,
+        all_faces: FaceTable,
+        eps: float = None,
+        min_samples: int = None,
+        embeddings: Optional[np.ndarray] = None,
+        mode: str = "global",
+        event_gap_hours: float = DEFAULT_EVENT_GAP_HOURS,
     ) -> np.ndarray:
-        """Clusters faces based on their embeddings and returns the labels."""
-        if not all_faces:
+        """
+        Clusters faces based on their embeddings and returns the labels.
+
+        ``embeddings`` overrides the table's embedding matrix (one row per
+        face). ``mode="events"`` clusters within time-bucketed events first,
+        never joining two faces of one photo (see ``event_clustering``).
+        """
+        if mode not in CLUSTER_MODES:
+            raise ValueError(f"Clustering mode must be one of {', '.join(CLUSTER_MODES)}.")
+        if not len(all_faces):
             return np.array([])
 
         eps = eps or self.DEFAULT_CLUSTER_EPS
         min_samples = min_samples or self.DEFAULT_CLUSTER_MIN_SAMPLES
 
-        embeddings = np.array([face["embedding"] for face in all_faces])
-        clusterer = DBSCAN(
-            metric="euclidean", eps=eps, min_samples=min_samples
-        )
-        clusterer.fit(embeddings)
-        cluster_count = len(set(clusterer.labels_)) - (
-            1 if -1 in clusterer.labels_ else 0
-        )
+        if embeddings is None:
+            embeddings = all_faces.embeddings
+        if mode == "events":
+            with metrics.track_job("cluster"), metrics.time_stage("clustering"):
+                labels, stats = cluster_by_events(
+                    embeddings,
+                    all_faces.photo_ids,
+                    all_faces.taken_at_us,
+                    eps,
+                    min_samples,
+                    event_gap_hours,
+                )
+            print(
+                f"Clustered {stats['events']} events into {stats['event_clusters']} "
+                f"event clusters; {stats['blocked_merges']} same-photo merges skipped."
+            )
+        else:
+            from sklearn.cluster import DBSCAN
+
+            clusterer = DBSCAN(
+                metric="euclidean", eps=eps, min_samples=min_samples
+            )
+            with metrics.track_job("cluster"), metrics.time_stage("clustering"):
+                clusterer.fit(embeddings)
+            labels = clusterer.labels_
+        cluster_count = len(set(labels)) - (1 if -1 in labels else 0)
         print(f"Clustering complete. Found {cluster_count} clusters.")
-        return clusterer.labels_
+        return labels
 
     def generate_cluster_ui_data(
-        self, all_faces: List[dict], labels: np.ndarray
+        self,
+        all_faces: FaceTable,
+        labels: np.ndarray,
+        library: Optional[LibraryContext] = None,
     ) -> List[dict]:
-        """Generates a data structure of the clusters suitable for a UI."""
-        clusters = {}
-        cluster_assignments = {}
-
-        for i, label in enumerate(labels):
-            label = int(label)
-            face_data = all_faces[i]
+        """
+        Generates a data structure of the clusters suitable for a UI.
 
-            if label not in clusters:
-                default_name = (
-                    f"Person {label + 1}" if label != -1 else "Unidentified"
+        Clusters are listed in order of their first face; each cluster's
+        ``faces`` are ``FaceRow`` views of ``all_faces``. The assignments are
+        saved to ``library``, the one ``all_faces`` came from (the active
+        library when omitted).
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        clusters = []
+        cluster_assignments = {}
+        if len(labels):
+            order = np.argsort(labels, kind="stable")
+            unique_labels, starts = np.unique(labels[order], return_index=True)
+            groups = np.split(order, starts[1:])
+            for index in np.argsort([group[0] for group in groups], kind="stable"):
+                label = int(unique_labels[index])
+                rows = groups[index]
+                default_name = f"Person {label + 1}" if label != -1 else "Unidentified"
+                clusters.append(
+                    {
+                        "cluster_id": label,
+                        "name": default_name,
+                        "faces": [all_faces[row] for row in rows.tolist()],
+                    }
                 )
-                clusters[label] = {
-                    "cluster_id": label,
-                    "name": default_name,
-                    "faces": [],
-                }
                 cluster_assignments[label] = {
                     "cluster_id": label,
                     "name": default_name,
-                    "face_ids": [],
+                    "face_ids": all_faces.face_ids[rows].tolist(),
                 }
 
-            clusters[label]["faces"].append(
-                {
-                    "face_id": face_data["face_id"],
-                    "face_image_url": face_data.get("face_image_url")
-                    or self._face_id_to_web_path(face_data),
-                    "taken_at": face_data.get("taken_at"),
-                    "timestamp_source": face_data.get("timestamp_source"),
-                }
-            )
-            cluster_assignments[label]["face_ids"].append(face_data["face_id"])
+        self._persist_cluster_assignments(cluster_assignments, library=library)
+        return clusters
 
-        self._persist_cluster_assignments(cluster_assignments)
-        return list(clusters.values())
+    def _persist_cluster_assignments(
+        self,
+        cluster_assignments: dict,
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> None:
+        """
+        Writes cluster assignments and refreshes the materialised timeline views.
 
-    def _face_id_to_web_path(self, face_data: dict) -> str:
-        return f"/output_albums/.cache/faces/{os.path.basename(face_data['face_image_path'])}"
+        When ``changed_cluster_ids`` is given only those clusters' views are
+        rebuilt; otherwise every view is rebuilt from scratch.
+        """
+        library = library or self.library
+        with library.assignments_lock:
+            os.makedirs(library.library_path, exist_ok=True)
+            payload = {
+                "clusters": list(cluster_assignments.values()),
+                "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            try:
+                temp_path = f"{library.cluster_assignments_path}.tmp"
+                with open(temp_path, "w") as assignments_file:
+                    json.dump(payload, assignments_file)
+                os.replace(temp_path, library.cluster_assignments_path)
+            except Exception as exc:
+                print(f"Failed to persist cluster assignments: {exc}")
+                return
 
-    def _persist_cluster_assignments(self, cluster_assignments: dict) -> None:
-        os.makedirs(self.cache_path, exist_ok=True)
-        payload = {
-            "clusters": list(cluster_assignments.values()),
-            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-        }
-        try:
-            with open(self.cluster_assignments_path, "w") as assignments_file:
-                json.dump(payload, assignments_file)
-        except Exception as exc:
-            print(f"Failed to persist cluster assignments: {exc}")
+            try:
+                self._refresh_timeline_views(payload["clusters"], changed_cluster_ids, library)
+            except Exception as exc:
+                print(f"Failed to refresh timeline views: {exc}")
+            try:
+                self._refresh_cooccurrence_index(payload["clusters"], changed_cluster_ids, library)
+            except Exception as exc:
+                print(f"Failed to refresh co-occurrence index: {exc}")
+            try:
+                self._refresh_cluster_review(payload["clusters"], changed_cluster_ids, library)
+            except Exception as exc:
+                print(f"Failed to refresh cluster suggestions: {exc}")
 
     # ------------------------------------------------------------------ #
     # Data helpers for downstream routes
     # ------------------------------------------------------------------ #
-    def load_all_faces_data(self) -> List[dict]:
-        try:
-            with open(self.faces_cache_file, "r") as cache_file:
-                return json.load(cache_file)
-        except FileNotFoundError:
-            return []
+    def load_face_table(self, library: Optional[LibraryContext] = None) -> FaceTable:
+        """
+        The faces of ``library`` (the active one by default), reloaded only
+        when the faces cache on disk has changed. Empty when nothing has been
+        extracted yet.
+        """
+        library = library or self.library
+        signature = _file_signature(library.faces_cache_file)
+        if signature is None:
+            return FaceTable.empty()
+        cached = library.face_table_cache
+        if cached and cached[0] == signature:
+            metrics.record_cache("face_lookup", True)
+            return cached[1]
+        metrics.record_cache("face_lookup", False)
+        table = FaceTable.load(library.faces_cache_file)
+        library.face_table_cache = (signature, table)
+        return table
 
-    def load_cluster_assignments(self) -> List[dict]:
+    def load_cluster_assignments(self, library: Optional[LibraryContext] = None) -> List[dict]:
+        library = library or self.library
         try:
-            with open(self.cluster_assignments_path, "r") as assignments_file:
+            with open(library.cluster_assignments_path, "r") as assignments_file:
                 data = json.load(assignments_file)
                 return data.get("clusters", [])
         except FileNotFoundError:
             return []
 
+    def get_face_lookup(self, library: Optional[LibraryContext] = None) -> FaceIdIndex:
+        """Returns face_id -> ``FaceRow`` for the active library's faces."""
+        return self.load_face_table(library).by_id
+
+    @staticmethod
+    def _edit_items(items, kind: str) -> List[dict]:
+        """
+        One kind of gallery edit from the request JSON, checked to be a list
+        of objects whose ids can be looked up.
+        """
+        if items is None:
+            return []
+        if not isinstance(items, list):
+            raise ValueError(f"{kind.capitalize()}s must be a list.")
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError(f"Each {kind} must be an object.")
+            for key in ("cluster_id", "face_id", "source_id", "target_id"):
+                if isinstance(item.get(key), (list, dict)):
+                    raise ValueError(f"Invalid {key} in {kind}: {item[key]!r}")
+        return items
+
+    def apply_cluster_changes(
+        self,
+        renames: Optional[List[dict]],
+        moves: Optional[List[dict]],
+        merges: Optional[List[dict]] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> Tuple[List[dict], set]:
+        """
+        Applies gallery edits (cluster renames, face moves and cluster merges)
+        to the persisted cluster assignments. Returns the updated clusters and
+        the ids of the clusters the edits changed.
+
+        A merge ``{"source_id", "target_id"}`` moves every face of the source
+        cluster into the target and removes the source.
+        """
+        renames = self._edit_items(renames, "rename")
+        moves = self._edit_items(moves, "move")
+        merges = self._edit_items(merges, "merge")
+        library = library or self.library
+        with library.assignments_lock:
+            assignments = self.load_cluster_assignments(library)
+            if not assignments:
+                raise ValueError("Cluster assignments not found. Please re-process images.")
+
+            assignments_by_id = {
+                item["cluster_id"]: item for item in assignments if "cluster_id" in item
+            }
+
+            changed_cluster_ids = set()
+            for rename in renames:
+                cluster_id = rename.get("cluster_id")
+                if cluster_id not in assignments_by_id:
+                    raise ValueError(f"Unknown cluster id: {cluster_id}")
+                name = rename.get("name") or ""
+                if not isinstance(name, str):
+                    raise ValueError(f"Invalid name for cluster {cluster_id}: {name!r}")
+                name = name.strip()
+                if name:
+                    assignments_by_id[cluster_id]["name"] = name
+                    changed_cluster_ids.add(cluster_id)
+
+            if moves:
+                owners = {
+                    face_id: cluster_id
+                    for cluster_id, item in assignments_by_id.items()
+                    for face_id in item.get("face_ids", [])
+                }
+                for move in moves:
+                    face_id = move.get("face_id")
+                    target_id = move.get("cluster_id")
+                    if target_id not in assignments_by_id:
+                        raise ValueError(f"Unknown cluster id: {target_id}")
+                    source_id = owners.get(face_id)
+                    if source_id is None:
+                        raise ValueError(f"Unknown face id: {face_id}")
+                    if source_id == target_id:
+                        continue
+                    assignments_by_id[source_id]["face_ids"].remove(face_id)
+                    assignments_by_id[target_id].setdefault("face_ids", []).append(face_id)
+                    owners[face_id] = target_id
+                    changed_cluster_ids.update((source_id, target_id))
+
+            for merge in merges:
+                source_id = merge.get("source_id")
+                target_id = merge.get("target_id")
+                for cluster_id in (source_id, target_id):
+                    if cluster_id not in assignments_by_id:
+                        raise ValueError(f"Unknown cluster id: {cluster_id}")
+                if source_id == target_id:
+                    continue
+                source = assignments_by_id.pop(source_id)
+                assignments_by_id[target_id].setdefault("face_ids", []).extend(
+                    source.get("face_ids", [])
+                )
+                changed_cluster_ids.update((source_id, target_id))
+
+            self._persist_cluster_assignments(assignments_by_id, changed_cluster_ids, library)
+            return list(assignments_by_id.values()), changed_cluster_ids
+
+    # ------------------------------------------------------------------ #
+    # Materialised timeline views
+    # ------------------------------------------------------------------ #
+    def load_timeline_views(self, library: Optional[LibraryContext] = None) -> dict:
+        """
+        Returns the timeline index (every cluster's name and counts), rebuilding
+        the views only when the faces cache or cluster assignments changed
+        behind our back. One cluster's view comes from ``load_cluster_timeline``.
+        """
+        library = library or self.library
+        views_signature = _file_signature(library.timeline_views_path)
+        views = None
+        if views_signature:
+            cached = library.timeline_views_cache
+            if cached and cached[0] == views_signature:
+                views = cached[1]
+            else:
+                try:
+                    with open(library.timeline_views_path, "r") as views_file:
+                        views = json.load(views_file)
+                except (OSError, json.JSONDecodeError):
+                    views = None
+                if views is not None:
+                    library.timeline_views_cache = (views_signature, views)
+
+        if (
+            views is None
+            or views.get("version") != TIMELINE_VIEWS_VERSION
+            or views.get("faces_signature") != _file_signature(library.faces_cache_file)
+            or views.get("assignments_signature")
+            != _file_signature(library.cluster_assignments_path)
+        ):
+            metrics.record_cache("timeline_views", False)
+            views = self._refresh_timeline_views(
+                self.load_cluster_assignments(library), library=library
+            )
+        else:
+            metrics.record_cache("timeline_views", True)
+        return views
+
+    def load_cluster_timeline(
+        self, cluster_id: int, library: Optional[LibraryContext] = None
+    ) -> Optional[dict]:
+        """The day-grouped timeline of one cluster; None for an unknown cluster."""
+        library = library or self.library
+        for attempt in range(2):
+            views = self.load_timeline_views(library)
+            file_name = views["clusters"].get(str(cluster_id))
+            if file_name is None:
+                return None
+            view_path = os.path.join(library.timeline_views_dir, file_name)
+            signature = _file_signature(view_path)
+            cached = library.timeline_cluster_cache.get(file_name)
+            if cached and cached[0] == signature:
+                return cached[1]
+            try:
+                with open(view_path, "r") as view_file:
+                    view = json.load(view_file)
+            except (OSError, json.JSONDecodeError):
+                # Removed or half-written by someone else; rebuild once.
+                if attempt == 0:
+                    self._refresh_timeline_views(
+                        self.load_cluster_assignments(library), library=library
+                    )
+                continue
+            library.timeline_cluster_cache[file_name] = (signature, view)
+            return view
+        return None
+
+    def _refresh_timeline_views(
+        self,
+        assignments: List[dict],
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> dict:
+        """
+        Writes one file per cluster view under ``timeline_views/`` plus the
+        small ``timeline_views.json`` index. With ``changed_cluster_ids``
+        and an up-to-date index, only those clusters' files are rewritten.
+        """
+        library = library or self.library
+        face_lookup = self.get_face_lookup(library)
+        faces_signature = _file_signature(library.faces_cache_file)
+
+        previous = None
+        if changed_cluster_ids is not None:
+            cached = library.timeline_views_cache
+            if cached and cached[0] == _file_signature(library.timeline_views_path):
+                previous = cached[1]
+            if previous and (
+                previous.get("version") != TIMELINE_VIEWS_VERSION
+                or previous.get("faces_signature") != faces_signature
+            ):
+                previous = None
+
+        if previous is None:
+            rebuild_ids = {item["cluster_id"] for item in assignments if "cluster_id" in item}
+            entries = {}
+        else:
+            rebuild_ids = set(changed_cluster_ids)
+            entries = {entry["cluster_id"]: entry for entry in previous["index"]}
+
+        os.makedirs(library.timeline_views_dir, exist_ok=True)
+        present_ids = set()
+        for cluster in assignments:
+            if "cluster_id" not in cluster:
+                continue
+            cluster_id = cluster["cluster_id"]
+            present_ids.add(cluster_id)
+            if cluster_id not in rebuild_ids and cluster_id in entries:
+                continue
+            view = self._build_cluster_timeline(cluster, face_lookup)
+            file_name = f"cluster_{cluster_id}.json"
+            view_path = os.path.join(library.timeline_views_dir, file_name)
+            temp_path = f"{view_path}.tmp"
+            with open(temp_path, "w") as view_file:
+                json.dump(view, view_file)
+            os.replace(temp_path, view_path)
+            library.timeline_cluster_cache[file_name] = (_file_signature(view_path), view)
+            entries[cluster_id] = {
+                "cluster_id": cluster_id,
+                "name": view["name"] or f"Person {cluster_id + 1}",
+                "photo_count": view["photo_count"],
+                "face_count": view["face_count"],
+            }
+        stale_files = [f"cluster_{stale_id}.json" for stale_id in set(entries) - present_ids]
+        for stale_id in set(entries) - present_ids:
+            del entries[stale_id]
+
+        index = sorted(entries.values(), key=lambda c: (c["cluster_id"] == -1, c["name"].lower()))
+        views = {
+            "version": TIMELINE_VIEWS_VERSION,
+            "faces_signature": faces_signature,
+            "assignments_signature": _file_signature(library.cluster_assignments_path),
+            "index": index,
+            "clusters": {str(cluster_id): f"cluster_{cluster_id}.json" for cluster_id in entries},
+        }
+        temp_path = f"{library.timeline_views_path}.tmp"
+        with open(temp_path, "w") as views_file:
+            json.dump(views, views_file)
+        os.replace(temp_path, library.timeline_views_path)
+        library.timeline_views_cache = (_file_signature(library.timeline_views_path), views)
+
+        if previous is None:
+            # A full rebuild also sweeps views left behind by older runs.
+            listed = set(views["clusters"].values())
+            stale_files = [
+                file_name
+                for file_name in os.listdir(library.timeline_views_dir)
+                if file_name.endswith(".json") and file_name not in listed
+            ]
+        for file_name in stale_files:
+            library.timeline_cluster_cache.pop(file_name, None)
+            try:
+                os.remove(os.path.join(library.timeline_views_dir, file_name))
+            except FileNotFoundError:
+                pass
+        return views
+
+    @staticmethod
+    def _build_cluster_timeline(cluster: dict, face_lookup: dict) -> dict:
+        """Computes the day-grouped timeline for one cluster."""
+        face_ids = cluster.get("face_ids", [])
+        return {
+            "cluster_id": cluster["cluster_id"],
+            "name": cluster.get("name"),
+            "face_count": len(face_ids),
+            **PhotoProcessor._build_photo_timeline(face_ids, face_lookup),
+        }
+
+    @staticmethod
+    def _build_photo_timeline(face_ids: Iterable[int], face_lookup: dict) -> dict:
+        """
+        Groups the photos of ``face_ids`` by day; each photo is shown through
+        its earliest face among ``face_ids``.
+        """
+        photos_by_path = {}
+        for face_id in face_ids:
+            face = face_lookup.get(face_id)
+            if not face:
+                continue
+            original_path = face.get("original_path")
+            if not original_path:
+                continue
+            key = os.path.abspath(original_path)
+            parsed_taken_at = _parse_iso_timestamp(face.get("taken_at"))
+            existing = photos_by_path.get(key)
+            if not existing:
+                photos_by_path[key] = {
+                    "representative_face_id": face["face_id"],
+                    "thumbnail_url": face.get("face_image_url"),
+                    "taken_at": face.get("taken_at"),
+                    "timestamp_source": face.get("timestamp_source") or "unknown",
+                    "parsed_taken_at": parsed_taken_at,
+                    "filename": os.path.basename(original_path),
+                }
+            else:
+                current_dt = existing.get("parsed_taken_at")
+                if (parsed_taken_at and not current_dt) or (
+                    parsed_taken_at
+                    and current_dt
+                    and _timeline_sort_key(parsed_taken_at) < _timeline_sort_key(current_dt)
+                ):
+                    existing.update(
+                        {
+                            "representative_face_id": face["face_id"],
+                            "taken_at": face.get("taken_at"),
+                            "timestamp_source": face.get("timestamp_source") or "unknown",
+                            "parsed_taken_at": parsed_taken_at,
+                        }
+                    )
+
+        photos = list(photos_by_path.values())
+        grouped = defaultdict(list)
+        unknown_group = []
+        timestamps = []
+        for photo in photos:
+            dt = photo.get("parsed_taken_at")
+            if dt:
+                grouped[dt.date()].append(photo)
+                timestamps.append(dt)
+            else:
+                unknown_group.append(photo)
+
+        def timeline_item(photo, time_label):
+            return {
+                "face_id": photo["representative_face_id"],
+                "thumbnail_url": photo["thumbnail_url"],
+                "taken_at": photo.get("taken_at"),
+                "time_label": time_label,
+                "timestamp_source": photo.get("timestamp_source"),
+                "filename": photo.get("filename"),
+            }
+
+        timeline_groups = []
+        for day in sorted(grouped.keys()):
+            day_items = grouped[day]
+            day_items.sort(
+                key=lambda item: (
+                    _timeline_sort_key(item["parsed_taken_at"]),
+                    item.get("filename"),
+                )
+            )
+            timeline_groups.append(
+                {
+                    "day_label": _format_day_label(day_items[0]["parsed_taken_at"]),
+                    "items": [
+                        timeline_item(item, _format_time_label(item["parsed_taken_at"]))
+                        for item in day_items
+                    ],
+                }
+            )
+
+        if unknown_group:
+            unknown_group.sort(key=lambda item: item.get("filename"))
+            timeline_groups.append(
+                {
+                    "day_label": "Unknown Date",
+                    "items": [timeline_item(item, "Unknown time") for item in unknown_group],
+                }
+            )
+
+        date_range = None
+        if timestamps:
+            timestamps.sort(key=_timeline_sort_key)
+            start_label = _format_day_label(timestamps[0])
+            end_label = _format_day_label(timestamps[-1])
+            if start_label == end_label:
+                date_range = {"start": start_label, "end": None}
+            else:
+                date_range = {"start": start_label, "end": end_label}
+
+        return {
+            "photo_count": len(photos),
+            "timeline_groups": timeline_groups,
+            "date_range": date_range,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Co-occurrence index
+    # ------------------------------------------------------------------ #
+    def load_cooccurrence_index(
+        self, library: Optional[LibraryContext] = None
+    ) -> CooccurrenceIndex:
+        """
+        Returns the photo/person index, rebuilding it only when the faces
+        cache or cluster assignments changed behind our back.
+        """
+        library = library or self.library
+        cached = library.cooccurrence_cache
+        if (
+            cached
+            and cached[0] == _file_signature(library.cooccurrence_path)
+            and cached[1] == _file_signature(library.faces_cache_file)
+            and cached[2] == _file_signature(library.cluster_assignments_path)
+        ):
+            metrics.record_cache("cooccurrence", True)
+            return cached[3]
+
+        index = None
+        try:
+            with open(library.cooccurrence_path, "r") as index_file:
+                data = json.load(index_file)
+        except (OSError, json.JSONDecodeError):
+            data = None
+        if (
+            data
+            and data.get("faces_signature") == _file_signature(library.faces_cache_file)
+            and data.get("assignments_signature")
+            == _file_signature(library.cluster_assignments_path)
+        ):
+            index = CooccurrenceIndex.from_dict(data)
+        if index is None:
+            metrics.record_cache("cooccurrence", False)
+            return self._refresh_cooccurrence_index(
+                self.load_cluster_assignments(library), library=library
+            )
+        metrics.record_cache("cooccurrence", True)
+        self._remember_cooccurrence_index(index, library)
+        return index
+
+    @staticmethod
+    def _remember_cooccurrence_index(index: CooccurrenceIndex, library: LibraryContext) -> None:
+        library.cooccurrence_cache = (
+            _file_signature(library.cooccurrence_path),
+            _file_signature(library.faces_cache_file),
+            _file_signature(library.cluster_assignments_path),
+            index,
+        )
+
+    def _refresh_cooccurrence_index(
+        self,
+        assignments: List[dict],
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> CooccurrenceIndex:
+        """
+        Updates only ``changed_cluster_ids`` when the in-memory index still
+        matches the faces cache; otherwise rebuilds it.
+        """
+        library = library or self.library
+        faces_signature = _file_signature(library.faces_cache_file)
+        cached = library.cooccurrence_cache
+        if (
+            changed_cluster_ids is not None
+            and cached
+            and cached[0] == _file_signature(library.cooccurrence_path)
+            and cached[1] == faces_signature
+        ):
+            index = cached[3]
+            index.update_clusters(assignments, changed_cluster_ids)
+        else:
+            index = CooccurrenceIndex.build(
+                self.load_face_table(library), assignments, _parse_iso_timestamp
+            )
+
+        payload = index.to_dict()
+        payload["faces_signature"] = faces_signature
+        payload["assignments_signature"] = _file_signature(library.cluster_assignments_path)
+        os.makedirs(library.library_path, exist_ok=True)
+        temp_path = f"{library.cooccurrence_path}.tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(payload, index_file)
+        os.replace(temp_path, library.cooccurrence_path)
+        self._remember_cooccurrence_index(index, library)
+        return index
+
+    # ------------------------------------------------------------------ #
+    # Merge / outlier suggestions
+    # ------------------------------------------------------------------ #
+    def load_cluster_review(self, library: Optional[LibraryContext] = None) -> ClusterReview:
+        """
+        Centroid similarities and per-face distances for the gallery's
+        suggestions. Kept in memory only: rebuilding is one pass over the
+        embeddings, done when the faces cache or assignments changed behind
+        our back.
+        """
+        library = library or self.library
+        cached = library.cluster_review_cache
+        if (
+            cached
+            and cached[0] == _file_signature(library.faces_cache_file)
+            and cached[1] == _file_signature(library.cluster_assignments_path)
+        ):
+            metrics.record_cache("cluster_review", True)
+            return cached[2]
+        metrics.record_cache("cluster_review", False)
+        return self._refresh_cluster_review(
+            self.load_cluster_assignments(library), library=library
+        )
+
+    def _refresh_cluster_review(
+        self,
+        assignments: List[dict],
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+        library: Optional[LibraryContext] = None,
+    ) -> ClusterReview:
+        """
+        Updates only ``changed_cluster_ids`` when the in-memory state still
+        matches the faces cache; otherwise rebuilds it.
+        """
+        library = library or self.library
+        faces_signature = _file_signature(library.faces_cache_file)
+        cached = library.cluster_review_cache
+        if changed_cluster_ids is not None and cached and cached[0] == faces_signature:
+            review = cached[2]
+            review.update_clusters(assignments, changed_cluster_ids)
+        else:
+            review = ClusterReview.build(self.load_face_table(library), assignments)
+        library.cluster_review_cache = (
+            faces_signature,
+            _file_signature(library.cluster_assignments_path),
+            review,
+        )
+        return review
+
+    def cluster_suggestions(
+        self, merge_limit: int = 20, outlier_limit: int = 50, cluster_id: Optional[int] = None
+    ) -> dict:
+        """
+        Ranked merge candidates and likely outlier faces (see
+        ``ClusterReview``), with cluster names filled in. ``cluster_id``
+        limits both lists to one cluster.
+        """
+        library = self.library
+        review = self.load_cluster_review(library)
+        names = {
+            item["cluster_id"]: item.get("name") or f"Person {item['cluster_id'] + 1}"
+            for item in self.load_cluster_assignments(library)
+            if "cluster_id" in item
+        }
+        merges = review.merge_candidates(
+            limit=merge_limit if cluster_id is None else len(review.cluster_ids)
+        )
+        if cluster_id is not None:
+            merges = [pair for pair in merges if cluster_id in pair["cluster_ids"]][:merge_limit]
+        for pair in merges:
+            pair["names"] = [names.get(item) for item in pair["cluster_ids"]]
+        outliers = review.outliers(limit=outlier_limit, cluster_id=cluster_id)
+        for face in outliers:
+            face["cluster_name"] = names.get(face["cluster_id"])
+            face["nearest_cluster_name"] = names.get(face["nearest_cluster_id"])
+        return {"merges": merges, "outliers": outliers, "has_unidentified": -1 in names}
+
+    def query_photos(
+        self,
+        all_of: Iterable[int] = (),
+        any_of: Iterable[int] = (),
+        none_of: Iterable[int] = (),
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> dict:
+        """
+        Timeline of the photos matching a co-occurrence query (see
+        ``CooccurrenceIndex.query``). Each photo is shown through a face of
+        one of the requested people.
+        """
+        all_of, any_of = list(all_of), list(any_of)
+        library = self.library
+        index = self.load_cooccurrence_index(library)
+        photo_ids = index.query(all_of, any_of, none_of, start, end)
+
+        shown = set(all_of) | set(any_of)
+        face_owner = {}
+        if shown:
+            for cluster in self.load_cluster_assignments(library):
+                if cluster.get("cluster_id") in shown:
+                    for face_id in cluster.get("face_ids", []):
+                        face_owner[face_id] = cluster["cluster_id"]
+        face_ids = []
+        for photo_id in photo_ids:
+            face_ids.extend(index.faces_of(photo_id, shown, face_owner))
+        return self._build_photo_timeline(face_ids, self.get_face_lookup(library))
+
     # ------------------------------------------------------------------ #
-    # Album persistence & search (unchanged behaviour)
+    # Album persistence & search
     # ------------------------------------------------------------------ #
     @staticmethod
-    def save_final_albums(cluster_data, all_faces_data, output_path_base):
-        """Saves the final photo albums based on the (potentially corrected) cluster data."""
+    def save_final_albums(
+        cluster_data,
+        faces: FaceTable,
+        output_path_base,
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+    ):
+        """
+        Saves the final photo albums based on the (potentially corrected) cluster data.
+
+        Only the difference against what a previous save wrote is applied: new
+        photos are copied, photos that left an album are removed and renamed
+        clusters move their directory. With ``changed_cluster_ids`` only the
+        albums of those clusters are checked on disk.
+        """
         print("Saving final albums...")
-        face_map = {face["face_id"]: face for face in all_faces_data}
+        with metrics.track_job("album_sync"):
+            plan = PhotoProcessor.plan_album_sync(
+                cluster_data, faces, output_path_base, changed_cluster_ids
+            )
+            PhotoProcessor.apply_album_sync(plan, output_path_base)
+        metrics.record_cache("album_file", True, plan["unchanged"])
+        metrics.record_cache("album_file", False, len(plan["copies"]))
+        return plan
+
+    @staticmethod
+    def album_clusters_from_assignments(assignments: List[dict]) -> List[dict]:
+        """Convert persisted cluster assignments into save_final_albums input."""
+        return [
+            {
+                "cluster_id": item["cluster_id"],
+                "name": item.get("name"),
+                "faces": [{"face_id": face_id} for face_id in item.get("face_ids", [])],
+            }
+            for item in assignments
+            if "cluster_id" in item
+        ]
+
+    @staticmethod
+    def _album_directory_name(cluster: dict) -> str:
+        cluster_name = cluster.get("name") or f"cluster_{cluster['cluster_id']}"
+        # Sanitize cluster name for directory creation
+        safe_cluster_name = "".join(
+            c for c in cluster_name if c.isalnum() or c in (" ", "_")
+        ).rstrip()
+        return safe_cluster_name or f"cluster_{cluster['cluster_id']}"
+
+    @staticmethod
+    def _load_album_manifest(output_path_base: str) -> dict:
+        manifest_path = os.path.join(output_path_base, ALBUM_MANIFEST_FILENAME)
+        try:
+            with open(manifest_path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, json.JSONDecodeError):
+            manifest = None
+        if not manifest or manifest.get("version") != ALBUM_MANIFEST_VERSION:
+            return {"version": ALBUM_MANIFEST_VERSION, "clusters": {}, "albums": {}}
+        return manifest
+
+    @staticmethod
+    def plan_album_sync(
+        cluster_data,
+        faces: FaceTable,
+        output_path_base,
+        changed_cluster_ids: Optional[Iterable[int]] = None,
+    ) -> dict:
+        """
+        Compares the desired albums with the manifest of previously written
+        files and returns the directory moves, copies and removals needed.
+
+        When ``changed_cluster_ids`` is given, an album holding none of those
+        clusters whose photos match the manifest keeps its manifest entries
+        without statting its sources or listing its directory.
+        """
+        face_map = faces.by_id
+        manifest = PhotoProcessor._load_album_manifest(output_path_base)
 
+        cluster_dirs = {}
+        album_sources = {}
         for cluster in cluster_data:
-            cluster_name = cluster.get("name", f"cluster_{cluster['cluster_id']}")
-            # Sanitize cluster name for directory creation
-            safe_cluster_name = "".join(
-                c for c in cluster_name if c.isalnum() or c in (" ", "_")
-            ).rstrip()
-            cluster_dir = os.path.join(output_path_base, safe_cluster_name)
-            os.makedirs(cluster_dir, exist_ok=True)
+            directory = PhotoProcessor._album_directory_name(cluster)
+            cluster_dirs[str(cluster["cluster_id"])] = directory
+            face_ids = [face["face_id"] for face in cluster["faces"]]
+            rows = face_map.rows(face_ids)
+            if (rows < 0).any():
+                raise KeyError(face_ids[int(np.argmax(rows < 0))])
+            album_sources.setdefault(directory, []).extend(
+                faces.original_path(row) for row in rows.tolist()
+            )
+        desired = {
+            directory: {name: source for source, name in album_file_names(sources).items()}
+            for directory, sources in album_sources.items()
+        }
+
+        touched_dirs = None
+        if changed_cluster_ids is not None:
+            touched_dirs = {
+                cluster_dirs[str(cluster_id)]
+                for cluster_id in changed_cluster_ids
+                if str(cluster_id) in cluster_dirs
+            }
+
+        # Tracked album contents, updated as if the renames below had happened.
+        albums = {name: dict(files) for name, files in manifest["albums"].items()}
+        listing_dirs = {name: name for name in desired}
+        renames = []
+        for cluster_id, new_dir in cluster_dirs.items():
+            old_dir = manifest["clusters"].get(cluster_id)
+            if (
+                not old_dir
+                or old_dir == new_dir
+                or old_dir in desired
+                or old_dir not in albums
+                or new_dir in albums
+                or os.path.exists(os.path.join(output_path_base, new_dir))
+            ):
+                continue
+            renames.append((old_dir, new_dir))
+            albums[new_dir] = albums.pop(old_dir)
+            listing_dirs[new_dir] = old_dir
 
-            image_paths_for_cluster = set()
-            for face in cluster["faces"]:
-                original_path = face_map[face["face_id"]]["original_path"]
-                image_paths_for_cluster.add(original_path)
+        copies = []
+        removals = []
+        missing = []
+        unchanged = 0
+        new_albums = {}
+        for directory, files in desired.items():
+            tracked = albums.get(directory, {})
+            if (
+                touched_dirs is not None
+                and directory not in touched_dirs
+                and listing_dirs[directory] == directory
+                and {basename: entry["source"] for basename, entry in tracked.items()} == files
+            ):
+                new_albums[directory] = tracked
+                unchanged += len(tracked)
+                continue
+            listing_path = os.path.join(output_path_base, listing_dirs[directory])
+            try:
+                on_disk = set(os.listdir(listing_path))
+            except FileNotFoundError:
+                on_disk = set()
 
-            print(f"Copying {len(image_paths_for_cluster)} photos to album: {safe_cluster_name}")
-            for img_path in image_paths_for_cluster:
-                shutil.copy(img_path, cluster_dir)
+            entries = {}
+            for basename, source in files.items():
+                source_stat = photo_stat(source)
+                if source_stat is None:
+                    missing.append(source)
+                    continue
+                entry = {
+                    "source": source,
+                    "size": source_stat[0],
+                    "mtime_ns": source_stat[1],
+                }
+                entries[basename] = entry
+                if basename in on_disk:
+                    if tracked.get(basename) == entry:
+                        unchanged += 1
+                        continue
+                    if basename not in tracked:
+                        # Written by an older version without a manifest.
+                        dest_size = os.path.getsize(os.path.join(listing_path, basename))
+                        if dest_size == source_stat[0]:
+                            unchanged += 1
+                            continue
+                copies.append((source, os.path.join(output_path_base, directory, basename)))
 
-    def search_for_person(self, sample_paths, search_path, album_name, threshold=1.2):
+            for basename in set(tracked) - set(files):
+                removals.append(os.path.join(output_path_base, directory, basename))
+            new_albums[directory] = entries
+
+        prune_dirs = []
+        for directory in set(albums) - set(desired):
+            for basename in albums[directory]:
+                removals.append(os.path.join(output_path_base, directory, basename))
+            prune_dirs.append(directory)
+
+        return {
+            "directories": sorted(desired),
+            "renames": renames,
+            "copies": copies,
+            "removals": removals,
+            "prune_dirs": prune_dirs,
+            "missing": missing,
+            "unchanged": unchanged,
+            "manifest": {
+                "version": ALBUM_MANIFEST_VERSION,
+                "clusters": cluster_dirs,
+                "albums": new_albums,
+            },
+        }
+
+    @staticmethod
+    def apply_album_sync(plan: dict, output_path_base: str) -> None:
+        """Applies a plan from ``plan_album_sync`` and records the new manifest."""
+        os.makedirs(output_path_base, exist_ok=True)
+        for old_dir, new_dir in plan["renames"]:
+            print(f"Renaming album: {old_dir} -> {new_dir}")
+            os.rename(
+                os.path.join(output_path_base, old_dir),
+                os.path.join(output_path_base, new_dir),
+            )
+        for directory in plan["directories"]:
+            os.makedirs(os.path.join(output_path_base, directory), exist_ok=True)
+        for source, destination in plan["copies"]:
+            with metrics.time_stage("album_copy"):
+                copy_photo(source, destination)
+        for path in plan["removals"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        for directory in plan["prune_dirs"]:
+            try:
+                os.rmdir(os.path.join(output_path_base, directory))
+            except OSError:
+                # Keep directories that still hold files we did not write.
+                pass
+
+        manifest_path = os.path.join(output_path_base, ALBUM_MANIFEST_FILENAME)
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            # dumps() uses the C encoder; dump() streams through the Python one.
+            manifest_file.write(json.dumps(plan["manifest"]))
+        os.replace(temp_path, manifest_path)
+
+        for source in plan["missing"]:
+            print(f"Warning: Original photo not found, skipped: {source}")
+        print(
+            f"Album sync complete: {len(plan['copies'])} copied, "
+            f"{len(plan['removals'])} removed, {len(plan['renames'])} renamed, "
+            f"{plan['unchanged']} unchanged."
+        )
+
+    def load_embedding_index(
+        self, library_path: Optional[str] = None, faces: Optional[FaceTable] = None
+    ):
         """
-        Searches for a specific person in a directory of photos using sample images.
+        Search index over a library's cached embeddings (the active library
+        by default), of the processor's ``embedding_index`` kind. Compressed
+        indexes are built once per faces cache and kept in the library as
+        ``embedding_index.npz``; libraries with fewer than
+        ``EMBEDDING_INDEX_MIN_FACES`` faces are searched exactly.
         """
+        active = self.library
+        library_path = library_path or active.library_path
+        faces_file = os.path.join(library_path, "all_faces_data.json")
+        if faces is None:
+            faces = (
+                self.load_face_table(active)
+                if library_path == active.library_path
+                else FaceTable.load(faces_file)
+            )
+        kind = self.embedding_index if len(faces) >= EMBEDDING_INDEX_MIN_FACES else "exact"
+        if kind == "exact":
+            return ExactIndex(faces.embeddings)
+
+        signature = _file_signature(faces_file)
+        key = (library_path, signature, kind)
+        cached = self._embedding_index_cache
+        if cached and cached[0] == key:
+            metrics.record_cache("embedding_index", True)
+            return cached[1]
+        metrics.record_cache("embedding_index", False)
+        index_path = os.path.join(library_path, EMBEDDING_INDEX_FILENAME)
+        index = IVFIndex.load(index_path, signature, faces.embeddings)
+        if index is None or index.kind != kind:
+            print(f"Building {kind} embedding index over {len(faces)} faces...")
+            with metrics.time_stage("index_build"):
+                index = build_index(faces.embeddings, kind)
+            index.save(index_path, signature)
+        self._embedding_index_cache = (key, index)
+        return index
+
+    def _cached_library_faces(
+        self, search_path: str, image_files: List[str]
+    ) -> Optional[Tuple[str, FaceTable]]:
+        """
+        ``(library_path, faces)`` of ``search_path``'s cache when it was
+        extracted from exactly ``image_files`` with this processor's model
+        and the quality gates off. Gated faces (small, blurry, turned away)
+        are not in the cache, so a gated cache could miss the person.
+        """
+        library_id = library_id_for(search_path)
+        library = self.libraries.get(library_id) or {}
+        settings = library.get("settings") or {}
+        if (
+            library.get("fingerprint") != source_fingerprint(image_files)
+            or settings.get("model") != self.model
+            or any((settings.get("quality") or {}).values())
+        ):
+            return None
+        library_path = self.libraries.library_dir(library_id)
+        faces_file = os.path.join(library_path, "all_faces_data.json")
+        if not os.path.exists(faces_file):
+            return None
+        active = self.library
+        if library_path == active.library_path:
+            return library_path, self.load_face_table(active)
+        return library_path, FaceTable.load(faces_file)
+
+    def _match_cached_faces(
+        self, library_path, faces: FaceTable, reference_embedding, threshold, image_files
+    ) -> List[str]:
+        """Photos in ``image_files`` with a cached face closer than ``threshold``."""
+        print(f"Photos unchanged since they were extracted; searching {len(faces)} cached faces.")
+        index = self.load_embedding_index(library_path, faces)
+        with metrics.time_stage("index_search"):
+            rows, distances = index.range_search(
+                np.asarray(reference_embedding, dtype=np.float32), threshold
+            )
+        # Nearest first, so the first distance seen per photo is its best.
+        best = {}
+        for row, distance in zip(rows.tolist(), distances.tolist()):
+            best.setdefault(os.path.realpath(faces.original_path(row)), distance)
+        matched = []
+        for image_path in image_files:
+            distance = best.get(os.path.realpath(image_path))
+            if distance is not None:
+                print(f"Found a match in {os.path.basename(image_path)} (distance: {distance:.2f})")
+                matched.append(image_path)
+        return matched
+
+    def _scan_for_person(
+        self, image_files, reference_embedding, threshold, workers: int = 1, progress=None
+    ) -> List[str]:
+        """Runs the model on every photo and returns those with a face closer than ``threshold``."""
+
+        def match_image(image_path):
+            try:
+                with metrics.time_stage("decode"):
+                    img = read_image(image_path)
+                if img is None:
+                    metrics.IMAGES_TOTAL.inc(result="unreadable")
+                    return False
+
+                with self.scheduler.slot(INTERACTIVE), metrics.time_stage("inference"):
+                    faces = self.app.get(img)
+                metrics.IMAGES_TOTAL.inc(result="searched")
+
+                for face in faces:
+                    distance = np.linalg.norm(face.embedding - reference_embedding)
+                    if distance < threshold:
+                        print(
+                            f"Found a match in {os.path.basename(image_path)} (distance: {distance:.2f})"
+                        )
+                        # Once a match is found in a photo, no need to check other faces in it
+                        return True
+            except Exception as exc:
+                metrics.IMAGES_TOTAL.inc(result="failed")
+                print(f"An error occurred while processing {image_path}: {exc}")
+            return False
+
+        matched_image_paths = []
+        total = len(image_files)
+        metrics.QUEUE_DEPTH.set(total, queue="search")
+        results = _map_in_order(match_image, image_files, workers)
+        for done, (image_path, matched) in enumerate(zip(image_files, results), start=1):
+            metrics.QUEUE_DEPTH.set(total - done, queue="search")
+            if progress is not None:
+                progress(done, total)
+            if matched:
+                matched_image_paths.append(image_path)
+        return matched_image_paths
+
+    def _reference_embedding(self, sample_paths) -> Optional[np.ndarray]:
+        """The mean embedding of the first face in each sample photo, or None."""
         print("Step 1: Creating reference embedding from sample images...")
         reference_embeddings = []
         for sample_path in sample_paths:
@@ -299,7 +2057,8 @@ class PhotoProcessor:
                 if img is None:
                     print(f"Warning: Could not read sample image {sample_path}")
                     continue
-                faces = self.app.get(img)
+                with self.scheduler.slot(INTERACTIVE):
+                    faces = self.app.get(img)
                 if not faces:
                     print(f"Warning: No faces found in sample image {sample_path}")
                     continue
@@ -312,56 +2071,70 @@ class PhotoProcessor:
             print(
                 "Error: Could not create a reference embedding. No faces found in sample images."
             )
-            return
+            return None
 
         # Average the embeddings to get a robust reference
         reference_embedding = np.mean(reference_embeddings, axis=0)
         print("Reference embedding created successfully.")
+        return reference_embedding
 
-        print("\nStep 2: Searching for matches in the target directory...")
-        image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
-        matched_image_paths = set()
+    def search_for_person(
+        self,
+        sample_paths,
+        search_path,
+        album_name,
+        threshold=1.2,
+        workers: int = 1,
+        progress=None,
+        rescan: bool = False,
+    ) -> List[str]:
+        """
+        Searches for a specific person in a directory of photos using sample images.
 
-        try:
-            image_files = [
-                os.path.join(search_path, f)
-                for f in os.listdir(search_path)
-                if os.path.splitext(f)[1].lower() in image_extensions
-            ]
-        except FileNotFoundError:
-            print(f"Error: Search directory not found at {search_path}")
-            return
+        Returns the matched photo paths (empty when nothing matched or the
+        search could not run). ``workers`` and ``progress`` behave as in
+        ``extract_faces``. When the folder's photos are unchanged since they
+        were extracted with this model and without quality gates, the cached
+        embeddings are searched through ``load_embedding_index`` instead of
+        running the model on every photo; ``rescan`` always runs the model.
+        """
+        # Sample photos and any rescan are interactive: while this search is
+        # open, bulk extraction leaves its share of inference slots free.
+        with self.scheduler.session(INTERACTIVE):
+            reference_embedding = self._reference_embedding(sample_paths)
+            if reference_embedding is None:
+                return []
 
-        for image_path in image_files:
+            print("\nStep 2: Searching for matches in the target directory...")
             try:
-                img = cv2.imread(image_path)
-                if img is None:
-                    continue
-
-                faces = self.app.get(img)
-                if not faces:
-                    continue
+                image_files = list_image_files(search_path)
+            except FileNotFoundError:
+                print(f"Error: Search directory not found at {search_path}")
+                return []
 
-                for face in faces:
-                    distance = np.linalg.norm(face.embedding - reference_embedding)
-                    if distance < threshold:
-                        print(
-                            f"Found a match in {os.path.basename(image_path)} (distance: {distance:.2f})"
-                        )
-                        matched_image_paths.add(image_path)
-                        # Once a match is found in a photo, no need to check other faces in it
-                        break
-            except Exception as exc:
-                print(f"An error occurred while processing {image_path}: {exc}")
+            cached = None if rescan else self._cached_library_faces(search_path, image_files)
+            if cached is not None:
+                matched_image_paths = self._match_cached_faces(
+                    *cached, reference_embedding, threshold, image_files
+                )
+                if progress is not None:
+                    progress(len(image_files), len(image_files))
+            else:
+                matched_image_paths = self._scan_for_person(
+                    image_files, reference_embedding, threshold, workers, progress
+                )
 
         if not matched_image_paths:
             print("No matching photos were found.")
-            return
+            return []
 
         album_dir = os.path.join(self.output_path, album_name)
         os.makedirs(album_dir, exist_ok=True)
 
         print(f"\nStep 3: Saving matched photos to album '{album_name}'...")
+        file_names = album_file_names(matched_image_paths)
         for img_path in matched_image_paths:
-            shutil.copy(img_path, album_dir)
+            with metrics.time_stage("album_copy"):
+                copy_photo(img_path, os.path.join(album_dir, file_names[img_path]))
             print(f"Copied: {img_path}")
+        return matched_image_paths
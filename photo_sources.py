@@ -0,0 +1,189 @@
+"""
+Photo sources: folders of images and ZIP archives read in place.
+
+Zalo group media downloads arrive as ZIP files. Instead of unpacking them,
+an archive can be given wherever a photo folder is expected. A photo inside
+an archive is addressed as ``<archive path>!/<member name>``, e.g.
+``/data/export.zip!/Photos/IMG_0001.jpg``; that string is the photo's
+``original_path`` in the faces cache. The helpers below read, stat and copy
+either kind of path, so callers never unpack anything to disk.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+ARCHIVE_EXTENSIONS = {".zip"}
+ARCHIVE_SEPARATOR = "!/"
+# Open archive handles kept for reuse; each holds its central directory.
+MAX_OPEN_ARCHIVES = 8
+_IGNORED_PREFIXES = ("__MACOSX/",)
+
+_archives: "OrderedDict[str, Tuple[tuple, zipfile.ZipFile]]" = OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def is_archive(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in ARCHIVE_EXTENSIONS and os.path.isfile(path)
+
+
+def is_photo_source(path: str) -> bool:
+    """True for a folder or a ZIP archive of photos."""
+    return bool(path) and (os.path.isdir(path) or is_archive(path))
+
+
+def split_archive_path(path: str) -> Tuple[Optional[str], str]:
+    """``(archive, member)`` for a photo inside an archive, else ``(None, path)``."""
+    lowered = path.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        index = lowered.find(extension + ARCHIVE_SEPARATOR)
+        if index != -1:
+            cut = index + len(extension)
+            return path[:cut], path[cut + len(ARCHIVE_SEPARATOR) :]
+    return None, path
+
+
+def archive_member_path(archive: str, member: str) -> str:
+    return f"{archive}{ARCHIVE_SEPARATOR}{member}"
+
+
+def source_root(path: str) -> str:
+    """The file that holds a photo on disk: the archive for archive members."""
+    archive, _member = split_archive_path(path)
+    return archive or path
+
+
+def photo_name(path: str) -> str:
+    """File name of a photo, without its folder or archive."""
+    return os.path.basename(split_archive_path(path)[1])
+
+
+def album_file_names(paths: Iterable[str]) -> Dict[str, str]:
+    """
+    File name of each photo when copied into one album. Members from
+    different folders of an archive can share a name (``2023/IMG_0001.jpg``
+    and ``2024/IMG_0001.jpg``); those get a short hash of their member path
+    appended, so neither overwrites the other.
+    """
+    paths = sorted(set(paths))
+    base_names = [photo_name(path) for path in paths]
+    counts = Counter(base_names)
+    names = {}
+    for path, name in zip(paths, base_names):
+        if counts[name] > 1:
+            stem, extension = os.path.splitext(name)
+            member = split_archive_path(path)[1]
+            name = f"{stem}_{hashlib.sha1(member.encode('utf-8')).hexdigest()[:8]}{extension}"
+        names[path] = name
+    return names
+
+
+# ---------------------------------------------------------------------- #
+# Archives
+# ---------------------------------------------------------------------- #
+def open_archive(archive: str) -> zipfile.ZipFile:
+    """
+    A shared, open handle for ``archive``, reopened when the file changes.
+    ``ZipFile`` serialises reads of its underlying file, so threads can read
+    members through the same handle.
+    """
+    key = os.path.realpath(archive)
+    stat = os.stat(key)
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _archives_lock:
+        cached = _archives.get(key)
+        if cached and cached[0] == signature:
+            _archives.move_to_end(key)
+            return cached[1]
+        handle = zipfile.ZipFile(key)
+        _archives[key] = (signature, handle)
+        _archives.move_to_end(key)
+        while len(_archives) > MAX_OPEN_ARCHIVES:
+            _archives.popitem(last=False)
+        # Replaced or evicted handles close once nothing references them.
+        return handle
+
+
+def list_archive_images(archive: str, extensions) -> List[str]:
+    """Paths of the members of ``archive`` with one of ``extensions``, in archive order."""
+    paths = []
+    for info in open_archive(archive).infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith(_IGNORED_PREFIXES) or os.path.basename(name).startswith("._"):
+            continue
+        if os.path.splitext(name)[1].lower() in extensions:
+            paths.append(archive_member_path(archive, name))
+    return paths
+
+
+def _member_info(path: str) -> Tuple[Optional[zipfile.ZipFile], Optional[zipfile.ZipInfo]]:
+    archive, member = split_archive_path(path)
+    try:
+        handle = open_archive(archive)
+        return handle, handle.getinfo(member)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None, None
+
+
+# ---------------------------------------------------------------------- #
+# Reading photos from either kind of source
+# ---------------------------------------------------------------------- #
+def photo_stat(path: str) -> Optional[Tuple[int, int]]:
+    """``(size, mtime_ns)`` of a photo, or None when it does not exist."""
+    if split_archive_path(path)[0] is None:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    _handle, info = _member_info(path)
+    if info is None:
+        return None
+    # ZIP times are local wall-clock times with two-second resolution.
+    modified = datetime(*info.date_time).timestamp()
+    return info.file_size, int(modified * 1_000_000_000)
+
+
+def photo_exists(path: str) -> bool:
+    return photo_stat(path) is not None
+
+
+def read_photo(path: str) -> bytes:
+    """The bytes of a photo. Raises FileNotFoundError when it does not exist."""
+    archive, member = split_archive_path(path)
+    if archive is None:
+        with open(path, "rb") as photo_file:
+            return photo_file.read()
+    handle, info = _member_info(path)
+    if info is None:
+        raise FileNotFoundError(path)
+    return handle.read(info)
+
+
+def open_photo(path: str):
+    """A binary file object for a photo: the file itself, or the member's bytes in memory."""
+    if split_archive_path(path)[0] is None:
+        return open(path, "rb")
+    return io.BytesIO(read_photo(path))
+
+
+def copy_photo(source: str, destination: str) -> None:
+    """Copies a photo to ``destination`` keeping its modification time, like ``shutil.copy2``."""
+    archive, _member = split_archive_path(source)
+    if archive is None:
+        shutil.copy2(source, destination)
+        return
+    handle, info = _member_info(source)
+    if info is None:
+        raise FileNotFoundError(source)
+    with handle.open(info) as member_file, open(destination, "wb") as target:
+        shutil.copyfileobj(member_file, target)
+    modified = datetime(*info.date_time).timestamp()
+    os.utime(destination, (modified, modified))